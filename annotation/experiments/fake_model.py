@@ -0,0 +1,112 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from common.models.folktale import AnnotatedFolktale
+from typing import Any, Optional
+import asyncio
+import random
+import time
+import re
+
+class FakeAnnotationModel(BaseChatModel):
+	"""
+	Modelo de chat local que imita al de anotación sin conexión, para medir rendimiento.
+
+	Responde tras `latency` segundos con la anotación de un cuento de ejemplo: las llamadas con
+	salida estructurada reciben los campos correspondientes del cuento y las de relaciones, la
+	frase final que espera relationship_regex. En la clasificación de eventos elige la primera
+	opción con probabilidad `agreement` y una opción al azar en otro caso.
+
+	Para simular un servidor, `parallel` limita las peticiones que atiende a la vez (como
+	OLLAMA_NUM_PARALLEL) y, si `available` es falso, todas las peticiones fallan.
+	"""
+	folktale: AnnotatedFolktale
+	latency: float = 0.5
+	agreement: float = 0.8
+	seed: int = 0
+	model_name: str = "fake-annotation"
+	temperature: float = 0.5
+	parallel: Optional[int] = None
+	available: bool = True
+	calls: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return "fake-annotation"
+
+	def model_post_init(self, context: Any):
+		self._random = random.Random(self.seed)
+		self._parallel = asyncio.Semaphore(self.parallel) if self.parallel else None
+
+	def bind_tools(self, tools, tool_choice: Optional[str] = None, **kwargs):
+		return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+	def _event(self, text: str):
+		for event in self.folktale.events:
+			if event.description and event.description in text:
+				return event
+		return self.folktale.events[0]
+
+	def _choose(self, messages: list[BaseMessage]) -> int:
+		n_options = len(re.findall(r"^\d+\. ", str(messages[0].content), flags=re.MULTILINE))
+		return 0 if self._random.random() < self.agreement else self._random.randrange(max(n_options, 1))
+
+	def _args(self, name: str, messages: list[BaseMessage]) -> dict:
+		text = messages[-1].content if messages else ""
+		folktale = self.folktale
+
+		if name == "Genre":
+			return {"genre": folktale.has_genre}
+		if name == "Objects":
+			return {"objects": [item.model_dump(mode="json") for item in folktale.objects]}
+		if name == "Places":
+			return {"places": [item.model_dump(mode="json") for item in folktale.places]}
+		if name == "Agents":
+			return {"agents": [item.model_dump(mode="json", exclude_none=True) for item in folktale.agents]}
+		if name == "StorySegments":
+			return {"segments": [event.description for event in folktale.events if event.description]}
+		if name == "EventElements":
+			event = self._event("\n".join(str(message.content) for message in messages))
+			return {"agents": event.agents, "objects": event.objects, "place": event.place}
+		if name == "Response":
+			return {"thinking": "The text matches this option.", "response": self._choose(messages)}
+		if name == "BatchResponse":
+			n_texts = len(re.findall(r"^Text \d+:", text, flags=re.MULTILINE))
+			return {"responses": [
+				{"segment": i, "thinking": "The text matches this option.", "response": self._choose(messages)}
+				for i in range(n_texts)
+			]}
+		if name == "Relationships":
+			indices = [int(i) for i in re.findall(r"^- (\d+)\. ", text, flags=re.MULTILINE)]
+			return {"relationships": [
+				{"agent": agent, "other": other, "relationship": self._random.choice(["knows", "friend", "enemy", "family_member", "none"])}
+				for n, agent in enumerate(indices) for other in indices[n + 1:]
+			]}
+		if name == "EventInstanceName":
+			return {"instance_name": "generic_event"}
+		raise ValueError(f"Unknown schema '{name}'.")
+
+	def _result(self, messages: list[BaseMessage], tools: Optional[list[dict]] = None) -> ChatResult:
+		if not self.available:
+			raise ConnectionError(f"{self.model_name} is not available.")
+		self.calls += 1
+		if tools:
+			name = tools[0]["function"]["name"]
+			message = AIMessage("", tool_calls=[{"name": name, "args": self._args(name, messages), "id": str(self.calls)}])
+		else:
+			relationship = self._random.choice(["knows", "friend", "enemy", "family_member", "none"])
+			message = AIMessage(f"They meet in the story. Therefore, their relationship is: {relationship}.")
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		time.sleep(self.latency)
+		return self._result(messages, kwargs.get("tools"))
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		if self._parallel is None:
+			await asyncio.sleep(self.latency)
+		else:
+			async with self._parallel:
+				await asyncio.sleep(self.latency)
+		return self._result(messages, kwargs.get("tools"))
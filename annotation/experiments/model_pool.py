@@ -0,0 +1,52 @@
+from annotation.experiments.fake_model import FakeAnnotationModel
+from annotation.experiments.throughput import fake_folktales_df
+from annotation.pipeline import load_annotation_resources, annotate_folktales, AnnotationOptions
+from annotation.tools.llm import ModelPool
+from common.models.folktale import AnnotatedFolktale
+from common.utils.loader import load_json, out_dir
+from loguru import logger
+import tempfile
+import asyncio
+import time
+import sys
+
+# Mide cómo escala la anotación con el número de endpoints de un ModelPool, con modelos falsos
+# que hacen de servidores: cada uno tarda `LATENCY` segundos por petición y atiende `PARALLEL`
+# peticiones a la vez, así que un solo servidor limita el rendimiento.
+LATENCY = 0.05
+PARALLEL = 2
+N_FOLKTALES = 16
+
+def main():
+	logger.remove()
+	logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] == "__main__")
+
+	folktale = AnnotatedFolktale(**load_json(f"{out_dir}/11_father_frost.json"))
+	resources = load_annotation_resources()
+	folktales_df = fake_folktales_df(folktale, N_FOLKTALES)
+	options = AnnotationOptions(early_stop=True, batch_classification=True, relationship_mode="matrix")
+
+	baseline = None
+	# El último caso tiene un endpoint caído: sus peticiones se repiten en los demás
+	for n_endpoints, n_down in ((1, 0), (2, 0), (4, 0), (8, 0), (4, 1)):
+		models = [
+			FakeAnnotationModel(folktale=folktale, latency=LATENCY, parallel=PARALLEL, seed=i, available=i >= n_down)
+			for i in range(n_endpoints)
+		]
+		pool = ModelPool(models)
+		# Suficientes cuentos y peticiones en vuelo para ocupar todos los endpoints
+		concurrency = 4 * n_endpoints
+		max_requests = 2 * PARALLEL * n_endpoints
+
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			start = time.perf_counter()
+			n_annotated = asyncio.run(annotate_folktales(pool, folktales_df, resources, tmp_dir, concurrency, max_requests, options, annotated_dir=tmp_dir, checkpoint_dir=None))
+			elapsed = time.perf_counter() - start
+
+		throughput = n_annotated / elapsed * 60
+		if baseline is None:
+			baseline = throughput
+		logger.info(f"{n_endpoints} endpoints ({n_down} down): {n_annotated} folktales in {elapsed:.1f}s ({throughput:.1f} folktales/min, x{throughput / baseline:.2f}). {pool.summary()}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,45 @@
+from annotation.experiments.fake_model import FakeAnnotationModel
+from annotation.pipeline import load_annotation_resources, annotate_folktales, AnnotationOptions
+from common.models.folktale import AnnotatedFolktale
+from common.utils.loader import load_json, out_dir
+from pandas import DataFrame
+from loguru import logger
+import tempfile
+import asyncio
+import time
+import sys
+
+# Mide el rendimiento de la anotación sin conexión, con un modelo falso que tarda `LATENCY`
+# segundos en responder a cada petición.
+LATENCY = 0.05
+N_FOLKTALES = 8
+
+def fake_folktales_df(folktale: AnnotatedFolktale, n_folktales: int) -> DataFrame:
+	text = "\n".join(event.description for event in folktale.events if event.description)
+	return DataFrame([
+		{"title": f"{folktale.title} {i}", "text": text, "source": f"http://example.org/{i}/", "nation": "english"}
+		for i in range(n_folktales)
+	])
+
+def main():
+	logger.remove()
+	# Solo los resultados: los extractores registran cada prompt con nivel INFO
+	logger.add(sys.stderr, level="DEBUG", filter=lambda record: record["name"] == "__main__" or (record["name"] == "annotation.pipeline" and record["function"] in ("annotate_folktale", "classify_segments")))
+
+	# Cuento ya anotado con la descripción de sus 15 eventos, que hacen de segmentos
+	folktale = AnnotatedFolktale(**load_json(f"{out_dir}/11_father_frost.json"))
+	resources = load_annotation_resources()
+	folktales_df = fake_folktales_df(folktale, N_FOLKTALES)
+
+	for batch_classification in (False, True):
+		options = AnnotationOptions(early_stop=True, batch_classification=batch_classification)
+		for concurrency, max_requests in ((1, 1), (1, 16), (4, 16), (8, 16)):
+			model = FakeAnnotationModel(folktale=folktale, latency=LATENCY)
+			with tempfile.TemporaryDirectory() as tmp_dir:
+				start = time.perf_counter()
+				n_annotated = asyncio.run(annotate_folktales(model, folktales_df, resources, tmp_dir, concurrency, max_requests, options, annotated_dir=tmp_dir, checkpoint_dir=None))
+				elapsed = time.perf_counter() - start
+			logger.info(f"Batch classification {batch_classification}, concurrency {concurrency}, {max_requests} requests: {n_annotated} folktales, {model.calls} calls in {elapsed:.1f}s ({n_annotated / elapsed * 60:.1f} folktales/min)")
+
+if __name__ == "__main__":
+	main()
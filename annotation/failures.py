@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from loguru import logger
+import time
+import os
+
+class FailedIndexes:
+	"""
+	Registro de los índices de los cuentos cuya anotación ha fallado (un índice por línea).
+
+	Lo comparten todos los procesos que anotan el mismo CSV (por ejemplo, varios fragmentos con
+	--shard), así que cada modificación se hace con un fichero de bloqueo. Un índice se añade
+	cuando su cuento falla y se quita solo cuando se anota correctamente: si una ejecución se
+	interrumpe, los índices que no llegó a reintentar siguen en el registro.
+	"""
+	path: str
+	# Un bloqueo más antiguo que esto se considera abandonado por un proceso terminado
+	stale_lock: float = 60.0
+
+	def __init__(self, path: str):
+		self.path = path
+		self._lock_path = f"{path}.lock"
+
+	@contextmanager
+	def _lock(self):
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		while True:
+			try:
+				fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+				break
+			except FileExistsError:
+				try:
+					if time.time() - os.path.getmtime(self._lock_path) > self.stale_lock:
+						logger.warning(f"Removing stale lock {self._lock_path}.")
+						os.remove(self._lock_path)
+						continue
+				except FileNotFoundError:
+					continue
+				time.sleep(0.01)
+		try:
+			yield
+		finally:
+			os.close(fd)
+			os.remove(self._lock_path)
+
+	def _read(self) -> list[int]:
+		if not os.path.exists(self.path):
+			return []
+		with open(self.path, "r", encoding="utf-8") as f:
+			return list(dict.fromkeys(int(line) for line in f if line.strip()))
+
+	def _write(self, indexes: list[int]):
+		tmp_path = f"{self.path}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			f.writelines(f"{idx}\n" for idx in indexes)
+		os.replace(tmp_path, self.path)
+
+	def read(self) -> list[int]:
+		with self._lock():
+			return self._read()
+
+	def add(self, idx: int):
+		with self._lock():
+			if idx not in self._read():
+				with open(self.path, "a", encoding="utf-8") as f:
+					f.write(f"{idx}\n")
+
+	def remove(self, idx: int):
+		with self._lock():
+			indexes = self._read()
+			if idx in indexes:
+				indexes.remove(idx)
+				self._write(indexes)
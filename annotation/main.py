@@ -1,26 +1,21 @@
 from dotenv import load_dotenv
 from langchain_ollama import ChatOllama
 from langchain_core.language_models.chat_models import BaseChatModel
-from common.models.event import EventElements, EventMetadata, EventExample, Event, EventClass
-from common.utils.loader import load_folktale_csv, load_json_folder, save_annotated_folktale, data_dir
-from common.utils.regex_utils import title_case_to_snake_case, clean_regex
-from annotation.tools.place_extractor import extract_places
-from annotation.tools.agent_extractor import extract_agents
-from annotation.tools.genre_extractor import extract_genre
-from annotation.tools.event_extractor import extract_story_segments, extract_event_elements
-from annotation.tools.event_classifier import hierarchical_event_classification, extract_event_instance_name
-from annotation.tools.object_extractor import extract_objects
-from annotation.tools.relationship_extractor import extract_relationships
-from common.models.folktale import AnnotatedFolktale
+from common.utils.loader import load_folktale_csv, out_dir
+from annotation.pipeline import load_annotation_resources, annotate_folktales, AnnotationOptions
+from annotation.failures import FailedIndexes
+from annotation.tools.llm import LLMCache, ModelPool, STAGES
 from pandas import DataFrame
+from typing import Optional, Union
 from loguru import logger
+import argparse
+import asyncio
 import uuid
 import os
-import re
 
-def get_model(temperature: float) -> BaseChatModel:
+def get_model(temperature: float, base_url: Optional[str] = None) -> BaseChatModel:
 	model = ChatOllama(
-		base_url=os.environ.get("OLLAMA_HOST"),
+		base_url=base_url or os.environ.get("OLLAMA_HOST"),
 		model="llama3.1:8b",
 		num_gpu=-1,
 		validate_model_on_init=True,
@@ -28,26 +23,30 @@ def get_model(temperature: float) -> BaseChatModel:
 	)
 	return model
 
-def get_event_example(folktale: AnnotatedFolktale, event_index: int):
-	n_events = len(folktale.events)
-
-	if event_index < n_events:
-		event = folktale.events[event_index]
-		if event.description:
-			example = EventExample(
-				title=folktale.title,
-				agents=folktale.agents,
-				objects=folktale.objects,
-				places=folktale.places,
-				story_segment=event.description,
-				output=EventElements(
-					agents=event.agents,
-					objects=event.objects,
-					place=event.place
-				)
-			)
-			return example
-	return None
+def get_model_pool(temperature: float) -> Union[BaseChatModel, ModelPool]:
+	"""
+	Modelo de cada endpoint de OLLAMA_HOSTS, una lista separada por comas (OLLAMA_HOST no
+	admite listas: el cliente de Ollama la interpreta al importarse). Sin OLLAMA_HOSTS o con un
+	solo endpoint se devuelve el modelo directamente. Los endpoints que no responden al empezar
+	se descartan; solo se produce un error si no responde ninguno.
+	"""
+	hosts = [host.strip() for host in os.environ.get("OLLAMA_HOSTS", "").split(",") if host.strip()]
+	if len(hosts) <= 1:
+		return get_model(temperature, hosts[0] if hosts else None)
+
+	models = []
+	for host in hosts:
+		try:
+			models.append(get_model(temperature, host))
+		except Exception as e:
+			logger.warning(f"Skipping endpoint {host}: {type(e).__name__}: {e}")
+	if not models:
+		raise ConnectionError(f"None of the endpoints in OLLAMA_HOSTS is available: {', '.join(hosts)}.")
+	if len(models) == 1:
+		return models[0]
+
+	logger.info(f"Model pool with {len(models)} endpoints: {', '.join(model.base_url for model in models)}.")
+	return ModelPool(models)
 
 def get_folktales_by_count(folktales_df: DataFrame, start_index: int, n_folktales: int):
 	n_folktales_df = len(folktales_df)
@@ -57,6 +56,33 @@ def get_folktales_by_count(folktales_df: DataFrame, start_index: int, n_folktale
 
 	return selected_folktales_df
 
+def get_shard(folktales_df: DataFrame, shard: int, n_shards: int):
+	"""
+	Cuentos del fragmento `shard` de `n_shards`, según su índice en el CSV: varios procesos con
+	el mismo `n_shards` y distinto `shard` se reparten los cuentos sin solaparse.
+	"""
+	return folktales_df[folktales_df.index % n_shards == shard]
+
+def get_failed_folktales(folktales_df: DataFrame, log_dir: str):
+	"""
+	Cuentos de `folktales_df` cuyos índices están en failed_indexes.log. El registro no se
+	modifica aquí: cada índice se quita cuando su cuento se anota correctamente.
+	"""
+	failed_indexes = [idx for idx in FailedIndexes(f"{log_dir}/failed_indexes.log").read() if idx in folktales_df.index]
+
+	logger.info(f"Retrying {len(failed_indexes)} failed folktales.")
+
+	return folktales_df.loc[failed_indexes]
+
+def parse_shard(value: str) -> tuple[int, int]:
+	try:
+		shard, n_shards = (int(part) for part in value.split("/"))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected i/N.")
+	if n_shards < 1 or not 0 <= shard < n_shards:
+		raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected 0 <= i < N.")
+	return shard, n_shards
+
 def setup_logging(log_dir: str):
 	os.makedirs(log_dir, exist_ok=True)
 
@@ -78,114 +104,62 @@ def setup_logging(log_dir: str):
         encoding="utf-8",
     )
 
+def parse_args():
+	parser = argparse.ArgumentParser(description="Anota cuentos del CSV con un modelo de lenguaje.")
+	parser.add_argument("--start", type=int, default=5, help="Índice del primer cuento.")
+	parser.add_argument("--count", type=int, default=300, help="Número de cuentos a anotar.")
+	parser.add_argument("--concurrency", type=int, default=4, help="Cuentos anotados a la vez.")
+	parser.add_argument("--max-requests", type=int, default=8, help="Peticiones al modelo en vuelo como máximo.")
+	parser.add_argument("--early-stop", action="store_true", help="Deja de pedir rondas de votación en cuanto la mayoría de un nivel está decidida.")
+	parser.add_argument("--batch-classification", action="store_true", help="Clasifica los segmentos de cada cuento nivel a nivel, en lotes por nodo de la taxonomía.")
+	parser.add_argument("--relationships", choices=["pairwise", "matrix"], default="pairwise", help="Una llamada por pareja de personajes o todas las relaciones en una llamada estructurada.")
+	parser.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="i/N", help="Anota solo los cuentos cuyo índice módulo N es i, para repartir el CSV entre N procesos.")
+	parser.add_argument("--retry-failed", action="store_true", help="Anota solo los cuentos de logs/failed_indexes.log en lugar de --start y --count.")
+	parser.add_argument("--overwrite", action="store_true", help="Vuelve a anotar los cuentos que ya están en out/annotated.")
+	parser.add_argument("--no-checkpoints", action="store_true", help="No guarda las etapas de cada cuento para reanudarlo si falla.")
+	parser.add_argument("--no-cache", action="store_true", help="Llama siempre al modelo, sin la caché de respuestas.")
+	parser.add_argument("--invalidate", nargs="+", choices=STAGES, default=[], metavar="STAGE", help=f"Borra de la caché las respuestas de estas etapas antes de anotar ({', '.join(STAGES)}).")
+	return parser.parse_args()
+
 def main():
+	args = parse_args()
+
 	log_dir = "./logs"
 	setup_logging(log_dir)
 
 	load_dotenv()
 
-	model = get_model(0.5)
+	model = get_model_pool(0.5)
 
-	hierarchies = load_json_folder(f"{data_dir}/hierarchies")
+	resources = load_annotation_resources()
 
-	examples = load_json_folder(f"{data_dir}/examples/annotated")
-	cinderella = AnnotatedFolktale(**examples["cinderella"])
+	folktales_df = load_folktale_csv()
+	shard, n_shards = args.shard
+	if args.retry_failed:
+		selected_folktales_df = get_failed_folktales(get_shard(folktales_df, shard, n_shards), log_dir)
+	else:
+		selected_folktales_df = get_shard(get_folktales_by_count(folktales_df, args.start, args.count), shard, n_shards)
 
-	event_examples = []
-	cinderella_hero_works_hard = get_event_example(cinderella, 0)
-	event_examples.append(cinderella_hero_works_hard)	
+	options = AnnotationOptions(early_stop=args.early_stop, batch_classification=args.batch_classification, relationship_mode=args.relationships)
 
-	event_hierarchy = hierarchies["event"]
-	place_hierarchy = hierarchies["place"]
-	role_hierarchy = hierarchies["role"]
-	object_hierarchy = hierarchies["object"]
+	cache = None
+	if not args.no_cache:
+		cache = LLMCache()
+		if args.invalidate:
+			cache.invalidate(args.invalidate)
 
-	folktales_df = load_folktale_csv()
-	selected_folktales_df = get_folktales_by_count(folktales_df, 5, 300)
-
-	for idx, row in selected_folktales_df.iterrows():
-		text = row["text"]
-		uri = row["source"].rstrip('/')
-		nation = row["nation"]
-		if isinstance(nation, str):
-			nation = nation.lower()
-		else:
-			nation = None
-		title = row["title"]
-		
-		logger.debug(f"Starting annotation for title '{title}' (index {idx})...")
+	asyncio.run(annotate_folktales(model, selected_folktales_df, resources, log_dir, args.concurrency, args.max_requests, options,
+		checkpoint_dir=None if args.no_checkpoints else os.path.join(out_dir, "checkpoints"),
+		overwrite=args.overwrite,
+		cache=cache
+	))
 
-		try:
-			genre = extract_genre(model, text)
-
-			objects = extract_objects(model, text, object_hierarchy)
-
-			places = extract_places(model, text, place_hierarchy)
-
-			agents = extract_agents(model, text, cinderella.agents, places, role_hierarchy)
-
-			relationships = extract_relationships(model, text, agents)
-
-			story_segments = extract_story_segments(model, text)
-
-			events = []
-			for segment in story_segments:
-				event_metada = EventMetadata(
-					title=title,
-					agents=agents,
-					objects=objects,
-					places=places,
-					story_segment=segment
-				)
-
-				elements = extract_event_elements(model, event_metada, event_examples)
-
-				event_type, thinking = hierarchical_event_classification(
-					model=model,
-					folktale_event=segment,
-					taxonomy_tree=event_hierarchy,
-					n_rounds=3,
-					verbose=False
-				)
-				
-				if event_type is None:
-					event_type = EventClass.EVENT
-				instance_name = extract_event_instance_name(model, event_type, segment, "\n".join(thinking))
-				
-				event = Event(
-					class_name=EventClass(event_type),
-					instance_name=instance_name,
-					description=segment,
-					agents=elements.agents,
-					objects=elements.objects,
-					place=elements.place
-				)
-
-				events.append(event)
-
-			folktale = AnnotatedFolktale(
-				uri=uri,
-				nation=nation,
-				has_genre=genre,
-				title=title,
-				relationships=relationships,
-				agents=agents,
-				places=places,
-				objects=objects,
-				events=events
-			)
-			filename = re.sub(clean_regex, "", title)
-			filename = title_case_to_snake_case(filename)
-			save_annotated_folktale(folktale, f"{idx}_{filename}")
-
-		except Exception:
-			logger.exception(
-        		"Error processing folktale | title={} | index={}",
-        		title,
-				idx
-    		)
-			with open(f"{log_dir}/failed_indexes.log", "a", encoding="utf-8") as f:
-				f.write(f"{idx}\n")
+	if isinstance(model, ModelPool):
+		logger.info(f"Model pool: {model.summary()}")
+
+	if cache is not None:
+		logger.info(f"LLM cache: {cache.summary()}")
+		cache.close()
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	main()
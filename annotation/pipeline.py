@@ -0,0 +1,342 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from common.models.event import EventElements, EventMetadata, EventExample, Event, EventClass
+from common.models.agent import Agent
+from common.models.object import Object
+from common.models.place import Place
+from common.models.folktale import AnnotatedFolktale
+from common.utils.loader import load_json_folder, save_structured_folktale, data_dir, out_dir
+from common.utils.regex_utils import title_case_to_snake_case, clean_regex
+from annotation.tools.place_extractor import extract_places
+from annotation.tools.agent_extractor import extract_agents
+from annotation.tools.genre_extractor import extract_genre
+from annotation.tools.event_extractor import extract_story_segments, extract_event_elements
+from annotation.tools.event_classifier import hierarchical_event_classification, level_synchronous_classification, extract_event_instance_name, VotingStats
+from annotation.tools.object_extractor import extract_objects
+from annotation.tools.relationship_extractor import extract_relationships, extract_relationships_matrix
+from annotation.tools.llm import LLMClient, LLMCache
+from annotation.stages import Stage, StageCheckpoints, run_stages, critical_path
+from annotation.failures import FailedIndexes
+from pydantic import BaseModel
+from pandas import DataFrame
+from typing import Literal, Optional
+from loguru import logger
+import asyncio
+import hashlib
+import time
+import os
+import re
+
+class AnnotationResources(BaseModel):
+	"""
+	Jerarquías y ejemplos few-shot compartidos por todas las anotaciones.
+	"""
+	event_hierarchy: dict
+	place_hierarchy: dict
+	role_hierarchy: dict
+	object_hierarchy: dict
+	example_agents: list[Agent]
+	event_examples: list[EventExample]
+
+def get_event_example(folktale: AnnotatedFolktale, event_index: int):
+	n_events = len(folktale.events)
+
+	if event_index < n_events:
+		event = folktale.events[event_index]
+		if event.description:
+			example = EventExample(
+				title=folktale.title,
+				agents=folktale.agents,
+				objects=folktale.objects,
+				places=folktale.places,
+				story_segment=event.description,
+				output=EventElements(
+					agents=event.agents,
+					objects=event.objects,
+					place=event.place
+				)
+			)
+			return example
+	return None
+
+def load_annotation_resources() -> AnnotationResources:
+	hierarchies = load_json_folder(f"{data_dir}/hierarchies")
+
+	examples = load_json_folder(f"{data_dir}/examples/annotated")
+	cinderella = AnnotatedFolktale(**examples["cinderella"])
+
+	event_examples = []
+	cinderella_hero_works_hard = get_event_example(cinderella, 0)
+	event_examples.append(cinderella_hero_works_hard)
+
+	return AnnotationResources(
+		event_hierarchy=hierarchies["event"],
+		place_hierarchy=hierarchies["place"],
+		role_hierarchy=hierarchies["role"],
+		object_hierarchy=hierarchies["object"],
+		example_agents=cinderella.agents,
+		event_examples=event_examples
+	)
+
+class AnnotationOptions(BaseModel):
+	"""
+	Opciones de la anotación de cada cuento.
+	"""
+	# Rondas de votación por nivel de la taxonomía de eventos
+	n_rounds: int = 3
+	# Deja de votar en cuanto la mayoría está decidida
+	early_stop: bool = False
+	# Clasifica todos los segmentos del cuento nivel a nivel, agrupando en cada llamada los que están en el mismo nodo
+	batch_classification: bool = False
+	# Máximo de segmentos por llamada en la clasificación por lotes
+	max_batch: int = 8
+	# Relaciones: una llamada por pareja de personajes ("pairwise") o todas en una llamada estructurada ("matrix")
+	relationship_mode: Literal["pairwise", "matrix"] = "pairwise"
+	# Máximo de personajes por grupo en el modo "matrix"
+	relationship_group_size: int = 12
+
+class SegmentClass(BaseModel):
+	"""
+	Clasificación de un segmento: tipo de evento, nombre de instancia y razonamiento del modelo.
+	"""
+	class_name: EventClass
+	instance_name: str
+	thinking: list[str]
+
+async def _segment_class(model: BaseChatModel, segment: str, event_type: Optional[str], thinking: list[str]) -> SegmentClass:
+	if event_type is None:
+		event_type = EventClass.EVENT
+	instance_name = await extract_event_instance_name(model, event_type, segment, "\n".join(thinking))
+
+	return SegmentClass(class_name=EventClass(event_type), instance_name=instance_name, thinking=thinking)
+
+async def classify_segments(model: BaseChatModel, segments: list[str], resources: AnnotationResources, options: AnnotationOptions) -> list[SegmentClass]:
+	"""
+	Clasifica los segmentos de un cuento en la taxonomía de eventos y les da nombre de instancia.
+
+	Por defecto cada segmento recorre la taxonomía por su cuenta y todos se clasifican a la vez.
+	Con `batch_classification`, los segmentos avanzan juntos nivel a nivel y los que están en el
+	mismo nodo se clasifican en una misma llamada.
+	"""
+	stats = VotingStats()
+	segment_stats = [VotingStats() for _ in segments]
+
+	if options.batch_classification:
+		results = await level_synchronous_classification(
+			model=model,
+			folktale_events=segments,
+			taxonomy_tree=resources.event_hierarchy,
+			n_rounds=options.n_rounds,
+			early_stop=options.early_stop,
+			max_batch=options.max_batch,
+			stats=stats,
+			segment_stats=segment_stats
+		)
+	else:
+		results = await asyncio.gather(*(
+			hierarchical_event_classification(
+				model=model,
+				folktale_event=segment,
+				taxonomy_tree=resources.event_hierarchy,
+				n_rounds=options.n_rounds,
+				verbose=False,
+				early_stop=options.early_stop,
+				stats=event_stats
+			)
+			for segment, event_stats in zip(segments, segment_stats)
+		))
+		for event_stats in segment_stats:
+			stats.calls += event_stats.calls
+			stats.segment_rounds += event_stats.segment_rounds
+			stats.saved_rounds += event_stats.saved_rounds
+
+	for (event_type, _), event_stats in zip(results, segment_stats):
+		logger.debug(f"Segment classified as '{event_type}' with {event_stats.calls} voting calls ({event_stats.saved_rounds} saved).")
+
+	logger.debug(f"{len(segments)} segments classified with {stats.calls} voting calls for {stats.segment_rounds} segment rounds ({stats.saved_rounds} rounds saved).")
+
+	return await asyncio.gather(*(_segment_class(model, segment, event_type, thinking) for segment, (event_type, thinking) in zip(segments, results)))
+
+async def extract_segment_elements(model: BaseChatModel, title: str, segment: str, agents: list[Agent], objects: list[Object], places: list[Place], resources: AnnotationResources) -> EventElements:
+	event_metada = EventMetadata(
+		title=title,
+		agents=agents,
+		objects=objects,
+		places=places,
+		story_segment=segment
+	)
+
+	return await extract_event_elements(model, event_metada, resources.event_examples)
+
+def build_events(segments: list[str], elements: list[EventElements], classes: list[SegmentClass]) -> list[Event]:
+	return [
+		Event(
+			class_name=segment_class.class_name,
+			instance_name=segment_class.instance_name,
+			description=segment,
+			agents=segment_elements.agents,
+			objects=segment_elements.objects,
+			place=segment_elements.place
+		)
+		for segment, segment_elements, segment_class in zip(segments, elements, classes)
+	]
+
+# Etapas que se guardan en disco para reanudar la anotación si falla. Los elementos de cada
+# segmento son índices en las listas de personajes, objetos y lugares, así que estas también
+# se guardan: si se volvieran a extraer, los índices restaurados apuntarían a otras listas.
+CHECKPOINT_STAGES = {
+	"objects": list[Object],
+	"places": list[Place],
+	"agents": list[Agent],
+	"segments": list[str],
+	"elements": list[EventElements],
+	"classes": list[SegmentClass]
+}
+
+def annotation_fingerprint(text: str, options: AnnotationOptions) -> str:
+	"""
+	Huella del texto y las opciones de una anotación, para no reutilizar checkpoints de otra.
+	"""
+	return hashlib.sha256(f"{options.model_dump_json()}\n{text}".encode("utf-8")).hexdigest()
+
+def annotation_stages(model: BaseChatModel, text: str, title: str, resources: AnnotationResources, options: AnnotationOptions, checkpoints: Optional[StageCheckpoints] = None) -> dict[str, Stage]:
+	"""
+	Grafo de etapas de la anotación de un cuento.
+
+	Género, objetos, lugares y segmentos no dependen entre sí; los personajes dependen de los
+	lugares y las relaciones, de los personajes. Por cada segmento, la clasificación solo
+	depende del segmento, y la extracción de elementos, además, de personajes, objetos y lugares.
+	Con `checkpoints`, las etapas de CHECKPOINT_STAGES se guardan en cuanto terminan y no se
+	repiten si ya estaban guardadas.
+	"""
+	async def elements(segments, agents, objects, places):
+		return await asyncio.gather(*(extract_segment_elements(model, title, segment, agents, objects, places, resources) for segment in segments))
+
+	async def relationships(agents):
+		if options.relationship_mode == "matrix":
+			return await extract_relationships_matrix(model, text, agents, options.relationship_group_size)
+		return await extract_relationships(model, text, agents)
+
+	async def classes(segments):
+		return await classify_segments(model, segments, resources, options)
+
+	async def events(segments, segment_elements, segment_classes):
+		return build_events(segments, segment_elements, segment_classes)
+
+	stages = {
+		"genre": Stage(lambda: extract_genre(model, text)),
+		"objects": Stage(lambda: extract_objects(model, text, resources.object_hierarchy)),
+		"places": Stage(lambda: extract_places(model, text, resources.place_hierarchy)),
+		"agents": Stage(lambda places: extract_agents(model, text, resources.example_agents, places, resources.role_hierarchy), ["places"]),
+		"relationships": Stage(relationships, ["agents"]),
+		"segments": Stage(lambda: extract_story_segments(model, text)),
+		"elements": Stage(elements, ["segments", "agents", "objects", "places"]),
+		"classes": Stage(classes, ["segments"]),
+		"events": Stage(events, ["segments", "elements", "classes"])
+	}
+
+	if checkpoints is not None:
+		for name, type_ in CHECKPOINT_STAGES.items():
+			stages[name] = checkpoints.wrap(name, stages[name], type_)
+
+	return stages
+
+async def annotate_folktale(model: BaseChatModel, text: str, title: str, uri: str, nation: Optional[str], resources: AnnotationResources, options: AnnotationOptions = AnnotationOptions(), checkpoints: Optional[StageCheckpoints] = None) -> AnnotatedFolktale:
+	"""
+	Anota un cuento completo: género, objetos, lugares, personajes, relaciones y eventos.
+
+	Las etapas se ejecutan como un grafo de dependencias (ver annotation_stages), así que el
+	tiempo de cada cuento se acerca al de su camino crítico y no a la suma de todas las llamadas.
+	"""
+	stages = annotation_stages(model, text, title, resources, options, checkpoints)
+
+	start = time.perf_counter()
+	results, timings = await run_stages(stages)
+	elapsed = time.perf_counter() - start
+
+	logger.debug(f"'{title}' annotated in {elapsed:.1f}s (stages: {sum(timings.values()):.1f}s, critical path: {critical_path(stages, timings):.1f}s).")
+
+	return AnnotatedFolktale(
+		uri=uri,
+		nation=nation,
+		has_genre=results["genre"],
+		title=title,
+		relationships=results["relationships"],
+		agents=results["agents"],
+		places=results["places"],
+		objects=results["objects"],
+		events=results["events"]
+	)
+
+async def annotate_folktales(model: BaseChatModel, folktales_df: DataFrame, resources: AnnotationResources, log_dir: str, concurrency: int = 4, max_requests: Optional[int] = 8, options: AnnotationOptions = AnnotationOptions(), annotated_dir: str = os.path.join(out_dir, "annotated"), checkpoint_dir: Optional[str] = os.path.join(out_dir, "checkpoints"), overwrite: bool = False, cache: Optional[LLMCache] = None) -> int:
+	"""
+	Anota varios cuentos a la vez y guarda cada uno en cuanto termina.
+
+	Se anotan como mucho `concurrency` cuentos simultáneamente y, entre todos ellos, hay como
+	mucho `max_requests` peticiones al modelo en vuelo. Si se indica `cache`, las respuestas del
+	modelo se buscan y se guardan en ella. El error de un cuento no afecta a los
+	demás: se registra en exceptions.log y su índice se añade a failed_indexes.log, del que se
+	quita cuando el cuento se anota correctamente.
+
+	Para poder reanudar una ejecución, los cuentos que ya están en `annotated_dir` se saltan
+	(salvo con `overwrite`) y las etapas costosas de cada cuento se guardan en
+	`checkpoint_dir`/<índice>, que se borra al guardar el cuento. Sin `checkpoint_dir` no se
+	guardan checkpoints.
+
+	Returns:
+		int: Número de cuentos anotados correctamente.
+	"""
+	client = LLMClient(model, max_requests, cache)
+	semaphore = asyncio.Semaphore(concurrency)
+	failed_indexes = FailedIndexes(f"{log_dir}/failed_indexes.log")
+	start = time.perf_counter()
+
+	async def annotate_row(idx, row) -> Optional[bool]:
+		text = row["text"]
+		uri = row["source"].rstrip('/')
+		nation = row["nation"]
+		if isinstance(nation, str):
+			nation = nation.lower()
+		else:
+			nation = None
+		title = row["title"]
+
+		filename = re.sub(clean_regex, "", title)
+		filename = f"{idx}_{title_case_to_snake_case(filename)}"
+		if not overwrite and os.path.exists(os.path.join(annotated_dir, f"{filename}.json")):
+			logger.debug(f"Skipping title '{title}' (index {idx}): already annotated.")
+			failed_indexes.remove(idx)
+			return None
+
+		async with semaphore:
+			logger.debug(f"Starting annotation for title '{title}' (index {idx})...")
+
+			try:
+				checkpoints = None
+				if checkpoint_dir is not None:
+					checkpoints = StageCheckpoints(os.path.join(checkpoint_dir, str(idx)), annotation_fingerprint(text, options))
+
+				folktale = await annotate_folktale(client, text, title, uri, nation, resources, options, checkpoints)
+
+				save_structured_folktale(folktale, annotated_dir, filename)
+				if checkpoints is not None:
+					checkpoints.clear()
+				failed_indexes.remove(idx)
+				return True
+
+			except Exception:
+				logger.exception(
+					"Error processing folktale | title={} | index={}",
+					title,
+					idx
+				)
+				failed_indexes.add(idx)
+				return False
+
+	results = await asyncio.gather(*(annotate_row(idx, row) for idx, row in folktales_df.iterrows()))
+
+	elapsed = time.perf_counter() - start
+	n_skipped = results.count(None)
+	n_processed = len(results) - n_skipped
+	n_annotated = results.count(True)
+	logger.info(f"Annotated {n_annotated}/{n_processed} folktales in {elapsed:.1f}s ({n_processed / elapsed * 60:.1f} folktales/min), {n_skipped} skipped.")
+	return n_annotated
@@ -0,0 +1,138 @@
+from pydantic import TypeAdapter
+from typing import Any, Awaitable, Callable, Optional
+from loguru import logger
+import asyncio
+import shutil
+import time
+import os
+
+class Stage:
+	"""
+	Etapa de la anotación de un cuento: una corrutina que recibe los resultados de las etapas
+	de las que depende, en el orden de `deps`.
+	"""
+	func: Callable[..., Awaitable[Any]]
+	deps: list[str]
+
+	def __init__(self, func: Callable[..., Awaitable[Any]], deps: Optional[list[str]] = None):
+		self.func = func
+		self.deps = deps or []
+
+async def run_stages(stages: dict[str, Stage]) -> tuple[dict[str, Any], dict[str, float]]:
+	"""
+	Ejecuta un grafo de etapas de forma concurrente: cada etapa empieza en cuanto terminan
+	sus dependencias. Si una etapa falla, se cancelan las que siguen en marcha y se propaga
+	la excepción.
+
+	Returns:
+		tuple[dict[str, Any], dict[str, float]]: Resultado y duración de cada etapa. La duración
+		se mide desde que terminan sus dependencias.
+	"""
+	tasks: dict[str, asyncio.Task] = {}
+	timings: dict[str, float] = {}
+
+	def schedule(name: str, path: tuple[str, ...] = ()) -> asyncio.Task:
+		if name in path:
+			raise ValueError(f"Cyclic stage dependency: {' -> '.join(path + (name,))}.")
+		if name not in tasks:
+			stage = stages[name]
+			deps = [schedule(dep, path + (name,)) for dep in stage.deps]
+
+			async def run():
+				values = await asyncio.gather(*deps)
+				start = time.perf_counter()
+				result = await stage.func(*values)
+				timings[name] = time.perf_counter() - start
+				return result
+
+			tasks[name] = asyncio.ensure_future(run())
+		return tasks[name]
+
+	for name in stages:
+		schedule(name)
+
+	try:
+		results = await asyncio.gather(*tasks.values())
+	except BaseException:
+		for task in tasks.values():
+			task.cancel()
+		await asyncio.gather(*tasks.values(), return_exceptions=True)
+		raise
+
+	return dict(zip(tasks, results)), timings
+
+def critical_path(stages: dict[str, Stage], timings: dict[str, float]) -> float:
+	"""
+	Duración del camino más largo del grafo de etapas: el tiempo mínimo de la anotación si
+	todas las etapas independientes se ejecutan a la vez.
+	"""
+	finish: dict[str, float] = {}
+
+	def finish_time(name: str) -> float:
+		if name not in finish:
+			finish[name] = max((finish_time(dep) for dep in stages[name].deps), default=0.0) + timings.get(name, 0.0)
+		return finish[name]
+
+	return max((finish_time(name) for name in stages), default=0.0)
+
+class StageCheckpoints:
+	"""
+	Resultados guardados en disco de algunas etapas de la anotación de un cuento, para no
+	repetirlas si la anotación falla y se reanuda.
+
+	Cada etapa se guarda como un JSON en `folder` en cuanto termina. La huella identifica el
+	texto y las opciones de la anotación: si no coincide con la guardada, los resultados
+	anteriores se descartan.
+	"""
+	folder: str
+
+	def __init__(self, folder: str, fingerprint: str):
+		self.folder = folder
+
+		fingerprint_path = os.path.join(folder, "fingerprint")
+		if os.path.exists(fingerprint_path):
+			with open(fingerprint_path, "r", encoding="utf-8") as f:
+				if f.read() != fingerprint:
+					self.clear()
+
+		os.makedirs(folder, exist_ok=True)
+		with open(fingerprint_path, "w", encoding="utf-8") as f:
+			f.write(fingerprint)
+
+	def _path(self, name: str) -> str:
+		return os.path.join(self.folder, f"{name}.json")
+
+	def load(self, name: str, adapter: TypeAdapter) -> Optional[Any]:
+		path = self._path(name)
+		if not os.path.exists(path):
+			return None
+		with open(path, "rb") as f:
+			return adapter.validate_json(f.read())
+
+	def save(self, name: str, adapter: TypeAdapter, value: Any):
+		path = self._path(name)
+		tmp_path = f"{path}.tmp"
+		with open(tmp_path, "wb") as f:
+			f.write(adapter.dump_json(value))
+		os.replace(tmp_path, path)
+
+	def wrap(self, name: str, stage: Stage, type_: Any) -> Stage:
+		"""
+		Etapa equivalente a `stage` que devuelve el resultado guardado si existe y, si no,
+		ejecuta la etapa y guarda su resultado.
+		"""
+		adapter = TypeAdapter(type_)
+
+		async def func(*values):
+			result = self.load(name, adapter)
+			if result is not None:
+				logger.debug(f"Stage '{name}' restored from checkpoint ({self.folder}).")
+				return result
+			result = await stage.func(*values)
+			self.save(name, adapter, result)
+			return result
+
+		return Stage(func, stage.deps)
+
+	def clear(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
@@ -4,6 +4,7 @@ from common.models.place import Place
 from langchain_core.language_models.chat_models import BaseChatModel
 from common.utils.format_utils import format_hierarchy, format_places
 from loguru import logger
+from annotation.tools.llm import ainvoke
 import json
 from typing import cast
 
@@ -75,7 +76,7 @@ Folktale:
 	]
 )
 
-def extract_agents(model: BaseChatModel, folktale: str, example: list[Agent], places: list[Place], role_hierarchy: dict):
+async def extract_agents(model: BaseChatModel, folktale: str, example: list[Agent], places: list[Place], role_hierarchy: dict):
     """
     Extrae los agentes de un cuento utilizando un modelo de lenguaje con salida estructurada.
 
@@ -102,13 +103,12 @@ def extract_agents(model: BaseChatModel, folktale: str, example: list[Agent], pl
     formatted_places = format_places(places)
     formatted_hierarchy = format_hierarchy(role_hierarchy)
     
-    agent_chain = agent_prompt | model.with_structured_output(Agents)
-    agents = agent_chain.invoke({
+    agents = await ainvoke(model, agent_prompt, {
         "folktale": folktale,
         "example": example_json,
         "places": formatted_places,
         "role_hierarchy": formatted_hierarchy
-    })
+    }, schema=Agents, stage="agents")
     
     agents = cast(Agents, agents).agents
 
@@ -4,6 +4,8 @@ from pydantic import BaseModel, Field, ConfigDict
 from collections import Counter
 from typing import Optional, cast
 from common.utils.regex_utils import snake_case_regex
+from annotation.tools.llm import ainvoke
+import asyncio
 
 class Response(BaseModel):
 	'''Model output for a single-option classification task.'''
@@ -112,7 +114,7 @@ def _build_options_prompt_by_list(options: list) -> str:
 	]
 	return "\n".join(lines)
 
-def _extract_event(model: BaseChatModel, folktale_event: str, options: str, previous_thought: str = ""):
+async def _extract_event(model: BaseChatModel, folktale_event: str, options: str, previous_thought: str = "", sample: int = 0):
 	"""
 	Extrae un evento relevante de exto utilizando un modelo de lenguaje.
 
@@ -121,6 +123,7 @@ def _extract_event(model: BaseChatModel, folktale_event: str, options: str, prev
 	folktale_event (str): Texto.
 	options (str): Lista de opciones formateadas
 	previous_thought (str, opcional): Pensamientos o contexto previo del modelo
+	sample (int, opcional): Ronda de votación, para que la caché distinga rondas con el mismo prompt
 
 	Returns:
 	tuple[str, str]:
@@ -128,78 +131,111 @@ def _extract_event(model: BaseChatModel, folktale_event: str, options: str, prev
 		- thinking (str): Razonamiento del modelo sobre la selección.
 
 	"""
-	class_chain = class_prompt | model.with_structured_output(Response)
-	response = class_chain.invoke({
+	response = await ainvoke(model, class_prompt, {
 		"options": options,
 		"event": folktale_event,
 		"previous_thought": previous_thought
-	})
+	}, schema=Response, stage="classes", sample=sample)
 
 	response = cast(Response, response)
 
 	return response.response, response.thinking
 
-def hierarchical_event_classification(model: BaseChatModel, folktale_event: str, taxonomy_tree: dict, n_rounds: int = 3, verbose: bool = False):
+class VotingStats(BaseModel):
 	"""
-	Clasifica un evento usando una taxonomía jerárquica con descripciones.
-
-	Args:
-		model: Instancia de BaseChatModel.
-		folktale_event: Texto del evento a clasificar.
-		taxonomy_tree: Diccionario de taxonomía.
-		n_rounds: Número de veces a preguntar al LLM por cada nivel.
+	Llamadas al modelo hechas y ahorradas durante la clasificación de uno o varios segmentos.
 
-	Returns:
-		tuple[str, str]: (evento final elegido, justificación final)
+	`segment_rounds` cuenta las respuestas pedidas por segmento; sin lotes coincide con `calls`.
+	En las estadísticas de un solo segmento clasificado por lotes, cada llamada compartida con
+	otros segmentos cuenta en `calls` como una llamada del segmento.
 	"""
+	calls: int = 0
+	segment_rounds: int = 0
+	saved_rounds: int = 0
 
-	current_nodes = taxonomy_tree["event"]["children"]
-	previous_event = None
-	final_thinking = []
-	options_str,options_list = _build_options_prompt(taxonomy_tree["event"])
-	level = 0
-	final_thinking_str = ""
-
-	if verbose:
-		print("=== Inicio de clasificación jerárquica ===")
-		print(f"Evento a clasificar: {folktale_event}")
+def _is_decided(votes: list[int], remaining: int) -> bool:
+	"""
+	Indica si la mayoría ya está decidida: ni con todas las rondas restantes puede otra opción
+	empatar con la más votada.
+	"""
+	counts = sorted(Counter(votes).values(), reverse=True) + [0, 0]
+	return counts[0] > counts[1] + remaining
 
-	while current_nodes:
-		votes = []
-		thoughts = []
+def _next_batch(votes: list[int], remaining: int) -> int:
+	"""
+	Número mínimo de rondas que, si todas votan a la opción más votada, deciden la mayoría.
+	"""
+	counts = sorted(Counter(votes).values(), reverse=True) + [0, 0]
+	return min((counts[1] + remaining - counts[0]) // 2 + 1, remaining)
 
-		if verbose:
-			print(f"\n--- Nivel {level} ---")
-			print("Opciones disponibles:")
-			print(options_str)
+def _pending_rounds(votes: list[int], answered: int, n_rounds: int, early_stop: bool) -> int:
+	"""
+	Rondas que hay que pedir a continuación para un segmento (0 si ya no hace falta ninguna).
+	"""
+	if answered == 0:
+		return n_rounds // 2 + 1 if early_stop else n_rounds
 
-		# Preguntar al LLM n_rounds veces
-		for i in range(n_rounds):
-			event, thinking = _extract_event(
-				model=model,
-				folktale_event=folktale_event,
-				options=options_str,
-				previous_thought=final_thinking_str
-			)
+	remaining = n_rounds - answered
+	if remaining == 0 or (early_stop and _is_decided(votes, remaining)):
+		return 0
+	return _next_batch(votes, remaining) if early_stop else remaining
 
-			# if 0 <= event < len(options_list):
-			if event >= 0 and event < len(options_list):
-				votes.append(event)
-				thoughts.append(thinking)
+class ClassificationState:
+	"""
+	Estado de la clasificación jerárquica de un segmento: nodo actual de la taxonomía, opciones
+	del nivel y razonamientos acumulados. `advance` aplica el voto de un nivel y desciende o
+	termina, como en hierarchical_event_classification.
+	"""
+	folktale_event: str
+	current_nodes: dict
+	previous_event: Optional[str]
+	final_thinking: list[str]
+	final_thinking_str: str
+	options_str: str
+	options_list: list
+	level: int
+	done: bool
+	result: Optional[str]
+	stats: Optional[VotingStats]
+
+	def __init__(self, folktale_event: str, taxonomy_tree: dict, stats: Optional[VotingStats] = None):
+		self.folktale_event = folktale_event
+		self.current_nodes = taxonomy_tree["event"]["children"]
+		self.previous_event = None
+		self.final_thinking = []
+		self.final_thinking_str = ""
+		self.options_str, self.options_list = _build_options_prompt(taxonomy_tree["event"])
+		self.level = 0
+		self.done = False
+		self.result = None
+		# Estadísticas de este segmento, además de las del conjunto
+		self.stats = stats
+
+	def finish(self, event: Optional[str]):
+		self.result = event
+		self.done = True
+
+	def tied_options(self, votes: list[int]) -> list[int]:
+		"""
+		Opciones empatadas en la votación que hay que desempatar con otra llamada al modelo (vacía
+		si no hay empate). Las opciones de un nivel son eventos distintos, así que cualquier empate
+		necesita el desempate.
+		"""
+		vote_count = Counter(votes)
+		max_freq = max(vote_count.values(), default=0)
+		most_frequent = [v for v, c in vote_count.items() if c == max_freq]
 
-				if verbose:
-					print(f"\nLlamada al modelo ({i + 1}/{n_rounds})")
-					print(f"  Evento propuesto: {options_list[event]}")
-					print(f"  Justificación: {thinking}")
-			else:
-				if verbose:
-					print("OUT OF RANGE")
-					print(f"\nLlamada al modelo ({i + 1}/{n_rounds})")
-					print(f"  Índice del evento: {event}")
-					print(f"  Justificación: {thinking}")
+		return most_frequent if len(most_frequent) > 1 else []
 
+	def advance(self, votes: list[int], thoughts: list[str], stats: VotingStats, verbose: bool = False, tie_break: Optional[int] = None):
+		"""
+		Aplica el voto de un nivel. `tie_break` es la respuesta del modelo al desempate entre las
+		opciones de `tied_options`, como índice en esa lista; si queda fuera de rango, la
+		clasificación termina en el nivel anterior.
+		"""
 		if not votes:
-			return previous_event, final_thinking
+			self.finish(self.previous_event)
+			return
 
 		if verbose:
 			print("\n---\n")
@@ -213,65 +249,351 @@ def hierarchical_event_classification(model: BaseChatModel, folktale_event: str,
 
 		winning_event = most_frequent[0]
 
-		if len(most_frequent) > 1:
-			selected = [options_list[i] for i in most_frequent]
-			selected_str = _build_options_prompt_by_list(selected)
-			# event: indice de evento de lista de most_frequent
-			event, thinking = _extract_event(
-				model=model,
-				folktale_event=folktale_event,
-				options=selected_str,
-				previous_thought=final_thinking_str
-			)
-
+		if len(most_frequent) > 1 and tie_break is not None:
 			if verbose:
 				print(f" Empate:")
-				print(selected_str)
-				print(f"  Índice del evento: {event}")
-				print(f"  Justificación: {thinking}")
+				print(_build_options_prompt_by_list([self.options_list[i] for i in most_frequent]))
+				print(f"  Índice del evento: {tie_break}")
+
+			if not 0 <= tie_break < len(most_frequent):
+				self.finish(self.previous_event)
+				return
 
-			if event >= 0 and event < len(selected):
-				return previous_event, final_thinking
-			
-			winning_event = most_frequent[event]
+			winning_event = most_frequent[tie_break]
 
-		final_thinking.extend(
+		self.final_thinking.extend(
 			thoughts[i] for i, v in enumerate(votes) if v == winning_event
 		)
 		
-		winning_event = options_list[winning_event][0]
+		winning_event = self.options_list[winning_event][0]
 
 		if verbose:
 			print(f"  Evento propuesto: {winning_event}")
 
 		# Si el evento se repite o no tiene hijos
-		if winning_event == previous_event:
+		if winning_event == self.previous_event:
 			if verbose:
 				print("Evento repetido. Finalizando clasificación.")
-			return winning_event, final_thinking
+			self.finish(winning_event)
+			return
 		
-		if not current_nodes[winning_event]["children"]:
+		if not self.current_nodes[winning_event]["children"]:
 			if verbose:
 				print("El evento ganador no tiene hijos. Finalizando clasificación.")
-			return winning_event, final_thinking		
+			self.finish(winning_event)
+			return
 		
-		options_str,options_list = _build_options_prompt(current_nodes[winning_event],winning_event)
+		self.options_str, self.options_list = _build_options_prompt(self.current_nodes[winning_event], winning_event)
 
-		current_nodes = current_nodes[winning_event]["children"]
-		previous_event = winning_event
+		self.current_nodes = self.current_nodes[winning_event]["children"]
+		self.previous_event = winning_event
 
-		final_thinking_str = "Previous decision or reasoning to consider:\n" + "\n".join(final_thinking)
+		self.final_thinking_str = "Previous decision or reasoning to consider:\n" + "\n".join(self.final_thinking)
 
 		if verbose:
 			print(f"Descendiendo a los hijos de: {winning_event}")
-			level += 1
+			self.level += 1
+
+async def _vote(model: BaseChatModel, state: ClassificationState, n_rounds: int, early_stop: bool, stats: VotingStats, verbose: bool = False):
+	"""
+	Pregunta al modelo hasta `n_rounds` veces por el nivel actual de un segmento, enviando las
+	rondas en lotes concurrentes. Sin parada temprana se envían todas en un único lote. Con ella,
+	primero se envían las necesarias para una mayoría y después solo las que aún podrían
+	decidirla, hasta que ninguna ronda restante pueda cambiar el resultado.
+
+	Returns:
+		tuple[list[int], list[str]]: Votos válidos y sus razonamientos, en orden de ronda.
+	"""
+	votes = []
+	thoughts = []
+	answered = 0
+	batch = _pending_rounds(votes, answered, n_rounds, early_stop)
+
+	while batch > 0:
+		responses = await asyncio.gather(*(
+			_extract_event(
+				model=model,
+				folktale_event=state.folktale_event,
+				options=state.options_str,
+				previous_thought=state.final_thinking_str,
+				sample=answered + k
+			)
+			for k in range(batch)
+		))
+
+		for i, (event, thinking) in enumerate(responses, start=answered):
+			# if 0 <= event < len(options_list):
+			if event >= 0 and event < len(state.options_list):
+				votes.append(event)
+				thoughts.append(thinking)
+
+				if verbose:
+					print(f"\nLlamada al modelo ({i + 1}/{n_rounds})")
+					print(f"  Evento propuesto: {state.options_list[event]}")
+					print(f"  Justificación: {thinking}")
+			else:
+				if verbose:
+					print("OUT OF RANGE")
+					print(f"\nLlamada al modelo ({i + 1}/{n_rounds})")
+					print(f"  Índice del evento: {event}")
+					print(f"  Justificación: {thinking}")
+
+		answered += batch
+		batch = _pending_rounds(votes, answered, n_rounds, early_stop)
+
+	if verbose and answered < n_rounds:
+		print(f"Mayoría decidida. Se omiten {n_rounds - answered} rondas.")
+
+	stats.calls += answered
+	stats.segment_rounds += answered
+	stats.saved_rounds += n_rounds - answered
+	return votes, thoughts
+
+async def _tie_break(model: BaseChatModel, state: ClassificationState, votes: list[int], stats: VotingStats) -> Optional[int]:
+	"""
+	Pide al modelo que elija entre las opciones empatadas en la votación de un segmento.
+
+	Returns:
+		Optional[int]: Índice elegido entre las opciones empatadas (ver ClassificationState.advance),
+		o None si no hay empate.
+	"""
+	all_stats = [stats] if state.stats is None else [stats, state.stats]
+
+	tied = state.tied_options(votes)
+	if not tied:
+		return None
+
+	event, _ = await _extract_event(
+		model=model,
+		folktale_event=state.folktale_event,
+		options=_build_options_prompt_by_list([state.options_list[i] for i in tied]),
+		previous_thought=state.final_thinking_str
+	)
+	for segment_stats in all_stats:
+		segment_stats.calls += 1
+	return event
+
+async def hierarchical_event_classification(model: BaseChatModel, folktale_event: str, taxonomy_tree: dict, n_rounds: int = 3, verbose: bool = False, early_stop: bool = False, stats: Optional[VotingStats] = None):
+	"""
+	Clasifica un evento usando una taxonomía jerárquica con descripciones.
+
+	Args:
+		model: Instancia de BaseChatModel.
+		folktale_event: Texto del evento a clasificar.
+		taxonomy_tree: Diccionario de taxonomía.
+		n_rounds: Número de veces a preguntar al LLM por cada nivel.
+		early_stop: Si es True, se dejan de preguntar rondas en cuanto la mayoría está decidida.
+		stats: Si se indica, acumula las llamadas hechas y ahorradas.
+
+	Returns:
+		tuple[str, str]: (evento final elegido, justificación final)
+	"""
+	if stats is None:
+		stats = VotingStats()
+
+	state = ClassificationState(folktale_event, taxonomy_tree)
+
+	if verbose:
+		print("=== Inicio de clasificación jerárquica ===")
+		print(f"Evento a clasificar: {folktale_event}")
+
+	while state.current_nodes and not state.done:
+		if verbose:
+			print(f"\n--- Nivel {state.level} ---")
+			print("Opciones disponibles:")
+			print(state.options_str)
+
+		# Preguntar al LLM n_rounds veces
+		votes, thoughts = await _vote(model, state, n_rounds, early_stop, stats, verbose)
+		tie_break = await _tie_break(model, state, votes, stats)
+		state.advance(votes, thoughts, stats, verbose, tie_break)
+
+	if state.done:
+		return state.result, state.final_thinking
 
 	# if verbose:
 	print("\n=== Fin de clasificación ===")
-	print(f"  Evento propuesto: {previous_event}")
-	print(f"  Justificación: {final_thinking}")
+	print(f"  Evento propuesto: {state.previous_event}")
+	print(f"  Justificación: {state.final_thinking}")
+
+	return state.previous_event, state.final_thinking
+
+class SegmentResponse(Response):
+	'''Model output for one of the text fragments of a batched classification task.'''
+
+	segment: int = Field(
+		...,
+		description="Zero-based index of the classified text fragment, as numbered in the input.",
+		ge=0
+	)
+
+class BatchResponse(BaseModel):
+	'''Model output for a batched single-option classification task: one answer per text fragment.'''
+
+	model_config = ConfigDict(extra="forbid")
+
+	responses: list[SegmentResponse] = Field(..., description="One classification per text fragment.")
+
+batch_system_prompt = SystemMessagePromptTemplate.from_template(template="""You are an expert narrative analysis assistant. Your task is to classify several text fragments, each one independently, by selecting the most specific narrative event from a closed list of options.
+
+Instructions:
+- For EACH text fragment, select exactly ONE option from the list.
+- Each option is identified by its index number (0, 1, 2, ...).
+- The value returned in "response" MUST be a valid index within the bounds of the provided options list.
+- Do NOT return an index that is negative or greater than or equal to the number of available options.
+- Return ONLY the index number as an integer in "response".
+- Do NOT invent options or return natural language in "response".
+- If multiple options are applicable, select the one that is the most detailed and specific.
+- Abstract or general options should only be chosen if no specific option applies.
+- A fragment may come with previous decisions or reasoning about it. Consider them only for that fragment.
+Available options:
+\"\"\"{options}\"\"\"
+
+Output format:
+{{
+  "responses": [
+    {{
+      "segment": int,
+      "thinking": "Brief justification based on the text",
+      "response": int
+    }}
+  ]
+}}
+""")
+
+batch_human_prompt = HumanMessagePromptTemplate.from_template(
+	"""Text fragments to classify:
+
+{events}"""
+)
+
+batch_prompt = ChatPromptTemplate.from_messages([
+	batch_system_prompt,
+	batch_human_prompt,
+])
+
+async def _extract_events(model: BaseChatModel, states: list[ClassificationState], sample: int = 0) -> list[Optional[tuple[int, str]]]:
+	"""
+	Clasifica en una sola llamada varios segmentos que están en el mismo nodo de la taxonomía.
+
+	Returns:
+		list[Optional[tuple[int, str]]]: Respuesta y razonamiento de cada segmento, en el mismo
+		orden (None si el modelo no respondió por ese segmento).
+	"""
+	events = "\n\n".join(
+		f"Text {i}:\n\"\"\"{state.folktale_event}\"\"\"" + (f"\n{state.final_thinking_str}" if state.final_thinking_str else "")
+		for i, state in enumerate(states)
+	)
+
+	response = await ainvoke(model, batch_prompt, {
+		"options": states[0].options_str,
+		"events": events
+	}, schema=BatchResponse, stage="classes", sample=sample)
+
+	response = cast(BatchResponse, response)
+
+	answers: list[Optional[tuple[int, str]]] = [None] * len(states)
+	for answer in response.responses:
+		if answer.segment < len(states) and answers[answer.segment] is None:
+			answers[answer.segment] = (answer.response, answer.thinking)
+	return answers
+
+async def _vote_batch(model: BaseChatModel, states: list[ClassificationState], n_rounds: int, early_stop: bool, stats: VotingStats, max_batch: int):
+	"""
+	Votación de un nivel para varios segmentos en el mismo nodo. Cada ronda es una única llamada
+	por cada `max_batch` segmentos que aún la necesitan; las rondas se envían a la vez y la parada
+	temprana se decide por segmento, como en _vote.
+
+	Returns:
+		list[tuple[list[int], list[str]]]: Votos válidos y razonamientos de cada segmento.
+	"""
+	votes: list[list[int]] = [[] for _ in states]
+	thoughts: list[list[str]] = [[] for _ in states]
+	answered = [0] * len(states)
+	pending = [_pending_rounds([], 0, n_rounds, early_stop) for _ in states]
+	sent_rounds = 0
+
+	while any(pending):
+		chunks = []
+		for r in range(max(pending)):
+			waiting = [i for i, n in enumerate(pending) if n > r]
+			chunks.extend((sent_rounds + r, waiting[start:start + max_batch]) for start in range(0, len(waiting), max_batch))
+		sent_rounds += max(pending)
+
+		responses = await asyncio.gather(*(_extract_events(model, [states[i] for i in chunk], sample) for sample, chunk in chunks))
+		stats.calls += len(chunks)
+
+		for (_, chunk), answers in zip(chunks, responses):
+			for i, answer in zip(chunk, answers):
+				if answer is None:
+					continue
+				event, thinking = answer
+				if event >= 0 and event < len(states[i].options_list):
+					votes[i].append(event)
+					thoughts[i].append(thinking)
+
+		for i, n in enumerate(pending):
+			answered[i] += n
+			pending[i] = _pending_rounds(votes[i], answered[i], n_rounds, early_stop)
+
+	stats.segment_rounds += sum(answered)
+	stats.saved_rounds += sum(n_rounds - n for n in answered)
+	for state, n in zip(states, answered):
+		if state.stats is not None:
+			state.stats.calls += n
+			state.stats.segment_rounds += n
+			state.stats.saved_rounds += n_rounds - n
+	return list(zip(votes, thoughts))
+
+async def level_synchronous_classification(model: BaseChatModel, folktale_events: list[str], taxonomy_tree: dict, n_rounds: int = 3, early_stop: bool = False, max_batch: int = 8, stats: Optional[VotingStats] = None, segment_stats: Optional[list[VotingStats]] = None) -> list[tuple[Optional[str], list[str]]]:
+	"""
+	Clasifica todos los segmentos de un cuento avanzando por la taxonomía nivel a nivel.
+
+	En cada nivel, los segmentos que están en el mismo nodo comparten opciones y se clasifican
+	juntos, hasta `max_batch` por llamada. Los votos, la decisión y los razonamientos siguen
+	siendo los de cada segmento, como en hierarchical_event_classification. Con `segment_stats`,
+	además de las estadísticas del conjunto se acumulan las de cada segmento, en el mismo orden.
+
+	Returns:
+		list[tuple[Optional[str], list[str]]]: (evento elegido, justificación) de cada segmento.
+	"""
+	if stats is None:
+		stats = VotingStats()
+
+	if segment_stats is None:
+		segment_stats = [None] * len(folktale_events)
+
+	states = [ClassificationState(folktale_event, taxonomy_tree, event_stats) for folktale_event, event_stats in zip(folktale_events, segment_stats)]
+
+	while True:
+		active = []
+		for state in states:
+			if state.done:
+				continue
+			if not state.current_nodes:
+				state.finish(state.previous_event)
+				continue
+			active.append(state)
+		if not active:
+			break
+
+		groups: dict[Optional[str], list[ClassificationState]] = {}
+		for state in active:
+			groups.setdefault(state.previous_event, []).append(state)
+
+		results = await asyncio.gather(*(_vote_batch(model, group, n_rounds, early_stop, stats, max_batch) for group in groups.values()))
+
+		voted = [
+			(state, votes, thoughts)
+			for group, group_results in zip(groups.values(), results)
+			for state, (votes, thoughts) in zip(group, group_results)
+		]
+		tie_breaks = await asyncio.gather(*(_tie_break(model, state, votes, stats) for state, votes, _ in voted))
+
+		for (state, votes, thoughts), tie_break in zip(voted, tie_breaks):
+			state.advance(votes, thoughts, stats, tie_break=tie_break)
 
-	return previous_event, final_thinking
+	return [(state.result, state.final_thinking) for state in states]
 
 class EventInstanceName(BaseModel):
 	"""
@@ -341,7 +663,7 @@ instance_prompt = ChatPromptTemplate.from_messages([
 	instance_human_prompt,
 ])
 
-def extract_event_instance_name(model: BaseChatModel, event_type: str, event_text: str, thinking: str = ""):
+async def extract_event_instance_name(model: BaseChatModel, event_type: str, event_text: str, thinking: str = ""):
 	"""
 	Extrae el nombre de la instancia de un evento a partir de su tipo y descripción.
 
@@ -354,11 +676,10 @@ def extract_event_instance_name(model: BaseChatModel, event_type: str, event_tex
 	Returns:
 		str: Nombre de la instancia del evento identificada por el modelo.
 	"""
-	instance_chain = instance_prompt | model.with_structured_output(EventInstanceName)
-	response = instance_chain.invoke({
+	response = await ainvoke(model, instance_prompt, {
 		"event_type": event_type,
 		"event_text": event_text,
 		"thinking": thinking
-	})
+	}, schema=EventInstanceName, stage="instance_names")
 	response = cast(EventInstanceName, response)
 	return response.instance_name
\ No newline at end of file
@@ -6,6 +6,7 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from pydantic_core import ValidationError
 from typing import cast
 from loguru import logger
+from annotation.tools.llm import ainvoke
 
 event_prompt = ChatPromptTemplate.from_messages(
 	[
@@ -26,7 +27,7 @@ Folktale:
 	]
 )
 
-def extract_story_segments(model: BaseChatModel, folktale: str):
+async def extract_story_segments(model: BaseChatModel, folktale: str):
 	"""
 	Extrae los segmentos de una historia (eventos).
 
@@ -39,8 +40,6 @@ def extract_story_segments(model: BaseChatModel, folktale: str):
 
 	"""
 
-	event_chain = event_prompt | model.with_structured_output(StorySegments)
-
 	# logger.info(
 	# 	event_prompt.format(
 	# 		folktale=folktale,
@@ -48,8 +47,8 @@ def extract_story_segments(model: BaseChatModel, folktale: str):
 	# 	)
 	# )
 
-	events = event_chain.invoke({"folktale": folktale,
-							  	"max_events": MAX_EVENTS})
+	events = await ainvoke(model, event_prompt, {"folktale": folktale,
+							  	"max_events": MAX_EVENTS}, schema=StorySegments, stage="segments")
 
 	events = cast(StorySegments, events)
 	
@@ -103,7 +102,7 @@ Important Guidelines:
 - Be thorough in your analysis and ensure that you select only the relevant elements based on the context of the segment.
 ''')
 
-def extract_event_elements(model: BaseChatModel, event: EventMetadata, examples: list[EventExample], max_attempts: int = 5):
+async def extract_event_elements(model: BaseChatModel, event: EventMetadata, examples: list[EventExample], max_attempts: int = 5):
 	"""
 	Extrae los elementos de un evento a partir de un segmento de historia.
 
@@ -166,8 +165,6 @@ def extract_event_elements(model: BaseChatModel, event: EventMetadata, examples:
 
 	messages: list[BaseMessage] = []
 
-	elements_chain = elements_prompt | model.bind_tools([EventElements], tool_choice="any")
-
 	formatted_agents = format_agents(event.agents)
 	formatted_objects = format_objects(event.objects)
 	formatted_places = format_places(event.places)
@@ -185,7 +182,7 @@ def extract_event_elements(model: BaseChatModel, event: EventMetadata, examples:
 			)
 		)
 
-		ai_message = elements_chain.invoke({
+		ai_message = await ainvoke(model, elements_prompt, {
 			"story_segment": event.story_segment,
 			"places": formatted_places,
 			"objects": formatted_objects,
@@ -193,7 +190,7 @@ def extract_event_elements(model: BaseChatModel, event: EventMetadata, examples:
 			"title": event.title,
 			"few_shot_examples": few_shot_examples,
 			"messages": messages
-		})
+		}, tools=[EventElements], stage="elements")
 
 		# print(ai_message)
 
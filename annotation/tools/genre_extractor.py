@@ -3,6 +3,7 @@ from common.models.folktale import Genre
 from langchain_core.language_models.chat_models import BaseChatModel
 from typing import cast
 from loguru import logger
+from annotation.tools.llm import ainvoke
 
 genre_prompt = ChatPromptTemplate.from_messages(
 	[
@@ -24,7 +25,7 @@ Folktale:
 	]
 )
 
-def extract_genre(model: BaseChatModel, folktale: str):
+async def extract_genre(model: BaseChatModel, folktale: str):
 	"""
 	Extrae el género de un cuento.
 
@@ -36,8 +37,7 @@ def extract_genre(model: BaseChatModel, folktale: str):
 		str: Género.
 
 	"""
-	genre_chain = genre_prompt | model.with_structured_output(Genre)
-	genre = genre_chain.invoke({"folktale": folktale})
+	genre = await ainvoke(model, genre_prompt, {"folktale": folktale}, schema=Genre, stage="genre")
 	
 	logger.debug(f"Genre: {genre}")
 
@@ -0,0 +1,252 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_to_dict, messages_from_dict
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, ValidationError
+from collections import Counter
+from typing import Any, Awaitable, Callable, Optional, Union
+from loguru import logger
+import asyncio
+import hashlib
+import sqlite3
+import time
+import json
+import os
+
+# Etapas de la anotación con las que se etiqueta cada llamada al modelo
+STAGES = ("genre", "objects", "places", "agents", "relationships", "segments", "elements", "classes", "instance_names")
+
+class LLMCache:
+	"""
+	Caché persistente (SQLite) de las respuestas del modelo, compartida por todos los extractores.
+
+	La clave es el hash de los mensajes del prompt ya rellenado, el nombre y la temperatura del
+	modelo, el esquema de salida (o las herramientas) y el número de muestra, que distingue las
+	rondas de votación con el mismo prompt. Cada respuesta se guarda con la etapa que la pidió,
+	lo que permite invalidar solo las de algunas etapas (por ejemplo, tras cambiar su prompt).
+	"""
+	path: str
+	hits: Counter
+	misses: Counter
+
+	def __init__(self, path: str = "./out/cache/llm.sqlite"):
+		self.path = path
+		self.hits = Counter()
+		self.misses = Counter()
+
+		os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+		self._connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+		# WAL permite que varios procesos de anotación compartan la caché
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stage TEXT NOT NULL, response TEXT NOT NULL)")
+		self._connection.execute("CREATE INDEX IF NOT EXISTS responses_stage ON responses (stage)")
+		self._connection.commit()
+
+	@staticmethod
+	def key(model: BaseChatModel, messages: list[BaseMessage], schema: Optional[type[BaseModel]] = None, tools: Optional[list[type[BaseModel]]] = None, sample: int = 0) -> str:
+		data = {
+			"messages": messages_to_dict(messages),
+			"model": getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__,
+			"temperature": getattr(model, "temperature", None),
+			"schema": schema.model_json_schema() if schema is not None else None,
+			"tools": [tool.model_json_schema() for tool in tools] if tools is not None else None,
+			"sample": sample
+		}
+		canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+		return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+	def get(self, key: str, stage: str) -> Optional[str]:
+		row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+		if row is None:
+			self.misses[stage] += 1
+			return None
+		self.hits[stage] += 1
+		return row[0]
+
+	def put(self, key: str, stage: str, response: str):
+		self._connection.execute("INSERT OR REPLACE INTO responses (key, stage, response) VALUES (?, ?, ?)", (key, stage, response))
+		self._connection.commit()
+
+	def invalidate(self, stages: list[str]) -> int:
+		"""
+		Borra las respuestas de las etapas indicadas.
+
+		Returns:
+			int: Número de respuestas borradas.
+		"""
+		cursor = self._connection.executemany("DELETE FROM responses WHERE stage = ?", [(stage,) for stage in stages])
+		self._connection.commit()
+		logger.info(f"LLM cache: {cursor.rowcount} responses invalidated ({', '.join(stages)}).")
+		return cursor.rowcount
+
+	def summary(self) -> str:
+		stages = sorted(set(self.hits) | set(self.misses), key=lambda stage: STAGES.index(stage) if stage in STAGES else len(STAGES))
+		hits = sum(self.hits.values())
+		total = hits + sum(self.misses.values())
+		per_stage = ", ".join(f"{stage}={self.hits[stage]}/{self.hits[stage] + self.misses[stage]}" for stage in stages)
+		return f"{hits}/{total} hits ({hits / total if total else 0.0:.1%}). Per stage: {per_stage}"
+
+	def close(self):
+		self._connection.close()
+
+class ModelPool:
+	"""
+	Conjunto de instancias del mismo modelo servidas por endpoints distintos (por ejemplo, varios
+	servidores de Ollama), que se usa en lugar de un modelo en `ainvoke`.
+
+	Cada petición va al endpoint con menos peticiones en vuelo. Si un endpoint falla, la petición
+	se repite en otro y el que ha fallado no recibe más peticiones durante `cooldown` segundos.
+	Los errores de formato de la respuesta no son del endpoint y se propagan sin reintentar.
+	"""
+	models: list[BaseChatModel]
+	cooldown: float
+	in_flight: list[int]
+	requests: list[int]
+	failures: list[int]
+
+	def __init__(self, models: list[BaseChatModel], cooldown: float = 30.0):
+		if not models:
+			raise ValueError("A model pool needs at least one model.")
+		self.models = models
+		self.cooldown = cooldown
+		self.in_flight = [0] * len(models)
+		self.requests = [0] * len(models)
+		self.failures = [0] * len(models)
+		self._unavailable_until = [0.0] * len(models)
+
+	# Nombre y temperatura del modelo, comunes a todos los endpoints (forman parte de la clave de la caché)
+	@property
+	def model(self) -> str:
+		model = self.models[0]
+		return getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__
+
+	@property
+	def temperature(self) -> Optional[float]:
+		return getattr(self.models[0], "temperature", None)
+
+	def _select(self, tried: set[int]) -> int:
+		candidates = [i for i in range(len(self.models)) if i not in tried]
+		now = time.monotonic()
+		available = [i for i in candidates if self._unavailable_until[i] <= now]
+		# Si todos están en espera tras un fallo, se prueba igualmente con alguno
+		return min(available or candidates, key=lambda i: (self.in_flight[i], self.requests[i]))
+
+	async def run(self, call: Callable[[BaseChatModel], Awaitable[Any]]) -> Any:
+		"""
+		Ejecuta `call` con el modelo de algún endpoint, probando con los demás si falla.
+		"""
+		tried: set[int] = set()
+		while True:
+			i = self._select(tried)
+			tried.add(i)
+			self.in_flight[i] += 1
+			self.requests[i] += 1
+			try:
+				return await call(self.models[i])
+			except (OutputParserException, ValidationError):
+				raise
+			except Exception as e:
+				self.failures[i] += 1
+				self._unavailable_until[i] = time.monotonic() + self.cooldown
+				if len(tried) == len(self.models):
+					raise
+				logger.warning(f"Model pool: endpoint {i} failed ({type(e).__name__}: {e}), retrying on another endpoint.")
+			finally:
+				self.in_flight[i] -= 1
+
+	def summary(self) -> str:
+		return ", ".join(f"endpoint {i}: {self.requests[i]} requests, {self.failures[i]} failures" for i in range(len(self.models)))
+
+class LLMClient:
+	"""
+	Modelo (o ModelPool) junto con su límite de peticiones en vuelo y su caché de respuestas. Se
+	usa en lugar del modelo en `ainvoke`, así que los extractores lo reciben sin cambios.
+
+	Cada anotación crea el suyo: dos pipelines del mismo proceso no comparten límite ni caché
+	salvo que se les pase el mismo cliente. El semáforo se crea en el bucle de eventos que hace
+	las peticiones, porque un asyncio.Semaphore queda ligado al primer bucle que lo usa.
+	"""
+	model: Union[BaseChatModel, ModelPool]
+	max_requests: Optional[int]
+	cache: Optional[LLMCache]
+
+	def __init__(self, model: Union[BaseChatModel, ModelPool], max_requests: Optional[int] = None, cache: Optional[LLMCache] = None):
+		self.model = model
+		self.max_requests = max_requests
+		self.cache = cache
+		self._semaphore: Optional[asyncio.Semaphore] = None
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+	def _limit(self) -> Optional[asyncio.Semaphore]:
+		if not self.max_requests:
+			return None
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self._semaphore = asyncio.Semaphore(self.max_requests)
+			self._loop = loop
+		return self._semaphore
+
+def _dump_response(response: Any, schema: Optional[type[BaseModel]]) -> str:
+	if schema is not None:
+		return response.model_dump_json()
+	return json.dumps(message_to_dict(response))
+
+def _load_response(response: str, schema: Optional[type[BaseModel]]) -> Any:
+	if schema is not None:
+		return schema.model_validate_json(response)
+	return messages_from_dict([json.loads(response)])[0]
+
+def _runnable(model: BaseChatModel, schema: Optional[type[BaseModel]], tools: Optional[list[type[BaseModel]]]):
+	if schema is not None:
+		return model.with_structured_output(schema)
+	if tools is not None:
+		return model.bind_tools(tools, tool_choice="any")
+	return model
+
+async def ainvoke(model: Union[BaseChatModel, ModelPool, LLMClient], prompt: ChatPromptTemplate, inputs: dict[str, Any], schema: Optional[type[BaseModel]] = None, tools: Optional[list[type[BaseModel]]] = None, stage: str = "", sample: int = 0) -> Any:
+	"""
+	Llama al modelo con un prompt de forma asíncrona. Con un LLMClient se respeta su límite de
+	peticiones en vuelo y, si tiene caché, la respuesta se busca primero en ella y solo se llama
+	al modelo si no está.
+
+	Args:
+		model (Union[BaseChatModel, ModelPool, LLMClient]): Modelo de lenguaje, conjunto de endpoints del mismo modelo o cliente con límite y caché.
+		prompt (ChatPromptTemplate): Prompt a rellenar con `inputs`.
+		inputs (dict[str, Any]): Variables del prompt.
+		schema (Optional[type[BaseModel]]): Si se indica, se pide salida estructurada con este esquema.
+		tools (Optional[list[type[BaseModel]]]): Si se indican, se obliga al modelo a llamar a una de estas herramientas.
+		stage (str): Etapa de la anotación que hace la llamada (ver STAGES).
+		sample (int): Número de muestra, para distinguir llamadas repetidas con el mismo prompt.
+
+	Returns:
+		Any: Instancia de `schema` si se indicó, o el mensaje del modelo en otro caso.
+	"""
+	client = model if isinstance(model, LLMClient) else LLMClient(model)
+	model = client.model
+	messages = await prompt.ainvoke(inputs)
+
+	cache = client.cache
+	if cache is not None:
+		key = cache.key(model, messages.to_messages(), schema, tools, sample)
+		cached = cache.get(key, stage)
+		if cached is not None:
+			return _load_response(cached, schema)
+
+	async def call(model: BaseChatModel) -> Any:
+		return await _runnable(model, schema, tools).ainvoke(messages)
+
+	async def call_model() -> Any:
+		if isinstance(model, ModelPool):
+			return await model.run(call)
+		return await call(model)
+
+	semaphore = client._limit()
+	if semaphore is None:
+		response = await call_model()
+	else:
+		async with semaphore:
+			response = await call_model()
+
+	if cache is not None and response is not None:
+		cache.put(key, stage, _dump_response(response, schema))
+	return response
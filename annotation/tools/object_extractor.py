@@ -4,6 +4,7 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from typing import cast
 from loguru import logger
 from common.utils.format_utils import format_hierarchy, format_classes
+from annotation.tools.llm import ainvoke
 
 object_prompt = ChatPromptTemplate.from_messages(
 	[
@@ -57,7 +58,7 @@ Folktale:
 	]
 )
 
-def extract_objects(model: BaseChatModel, folktale: str, object_hierarchy: dict):
+async def extract_objects(model: BaseChatModel, folktale: str, object_hierarchy: dict):
 	"""
 	Extrae los objetos presentes en un texto.
 
@@ -73,12 +74,11 @@ def extract_objects(model: BaseChatModel, folktale: str, object_hierarchy: dict)
 	formatted_hierarchy = format_hierarchy(object_hierarchy)
 	formatted_classes = format_classes(object_hierarchy)
 
-	object_chain = object_prompt | model.with_structured_output(Objects)
-	objects = object_chain.invoke({
+	objects = await ainvoke(model, object_prompt, {
 		"folktale": folktale,
 		"object_hierarchy": formatted_hierarchy,
 		"objects": formatted_classes
-	})
+	}, schema=Objects, stage="objects")
 	
 	# logger.info(
 	#    object_prompt.format(
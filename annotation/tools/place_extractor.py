@@ -4,6 +4,7 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from typing import cast
 from loguru import logger
 from common.utils.format_utils import format_hierarchy, format_classes
+from annotation.tools.llm import ainvoke
 
 place_prompt = ChatPromptTemplate.from_messages(
 	[
@@ -64,7 +65,7 @@ Folktale:
 	]
 )
 
-def extract_places(model: BaseChatModel, folktale: str, place_hierarchy: dict):
+async def extract_places(model: BaseChatModel, folktale: str, place_hierarchy: dict):
    """
    Extrae los lugares presentes en un cuento.
 
@@ -80,13 +81,12 @@ def extract_places(model: BaseChatModel, folktale: str, place_hierarchy: dict):
    formatted_hierarchy = format_hierarchy(place_hierarchy)
    formatted_classes = format_classes(place_hierarchy)
 
-   place_chain = place_prompt | model.with_structured_output(Places)
-   places = place_chain.invoke({
+   places = await ainvoke(model, place_prompt, {
 	  "folktale": folktale,
 	  "max_places": MAX_PLACES,
 	  "place_hierarchy": formatted_hierarchy,
 	  "places": formatted_classes
-   })
+   }, schema=Places, stage="places")
    
 #    logger.info(
 # 	  place_prompt.format(
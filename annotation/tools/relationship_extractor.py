@@ -1,8 +1,12 @@
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from common.models.agent import Agent, Relationship
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Literal, Optional, cast
 from langchain_core.language_models.chat_models import BaseChatModel
 from loguru import logger
 from common.utils.regex_utils import relationship_regex
+from annotation.tools.llm import ainvoke
+import asyncio
 import re
 
 relationship_prompt = ChatPromptTemplate.from_messages(
@@ -38,7 +42,7 @@ Folktale:
 	]
 )
 
-def extract_relationships(model: BaseChatModel, folktale: str, agents: list[Agent]):
+async def extract_relationships(model: BaseChatModel, folktale: str, agents: list[Agent]):
 	"""
 	Extrae las relaciones entre agentes de un cuento.
 
@@ -50,46 +54,155 @@ def extract_relationships(model: BaseChatModel, folktale: str, agents: list[Agen
 	Returns:
 		list[Relationship]: Lista de relaciones identificadas entre los agentes.
 	"""
-	relationship_chain = relationship_prompt | model
+	async def extract_relationship(i: int, j: int) -> Optional[Relationship]:
+		agent_1 = agents[i]
+		agent_2 = agents[j]
+
+		ai_messsage = await ainvoke(model, relationship_prompt, {
+			"folktale": folktale,
+			"agent_1": agent_1.instance_name,
+			"agent_2": agent_2.instance_name
+		}, stage="relationships")
+
+		content = ai_messsage.content
+		match = re.search(relationship_regex, content)
+
+		relationship = None
+		relationship_type = "none"
+		if match:
+			relationship_type = match.group(1)
+
+			if relationship_type in {"knows", "friend", "enemy", "family_member"}:
+				relationship = Relationship(
+					agent=i,
+					other=j,
+					relationship=relationship_type
+				)
+			else:
+				relationship_type = "none"
+
+		logger.debug(f"Relationship between '{agent_1.instance_name}' and '{agent_2.instance_name}': {relationship_type}\nReasoning: {content}")
+
+		return relationship
+
+	# Las parejas son independientes: se consultan todas a la vez
+	pairs = [(i, j) for i in range(len(agents)) for j in range(i + 1, len(agents))]
+	relationships = await asyncio.gather(*(extract_relationship(i, j) for i, j in pairs))
+
+	return [relationship for relationship in relationships if relationship is not None]
+
+class RelationshipEntry(BaseModel):
+	'''The relationship between two characters of a folktale, referenced by their indices.'''
+
+	agent: int = Field(..., description="Index of the first character.")
+	other: int = Field(..., description="Index of the second character.")
+	relationship: Literal["knows", "friend", "enemy", "family_member", "none"] = Field(..., description="Relationship between the two characters.")
+
+class Relationships(BaseModel):
+	'''The relationships between the characters of a folktale. Pairs of characters that do not meet or interact are omitted.'''
+
+	model_config = ConfigDict(extra="forbid")
+
+	relationships: list[RelationshipEntry] = Field(
+		...,
+		description="One entry per pair of characters that interact in the story. 'agent' and 'other' are the indices of the two characters in the list provided."
+	)
+
+matrix_prompt = ChatPromptTemplate.from_messages(
+	[
+		SystemMessagePromptTemplate.from_template(template='''You are an AI tasked with identifying the relationships between the characters in a folktale. Your task is to determine, for every pair of characters, the most accurate relationship based on the interactions described in the folktale. The relationship types you can choose from are:
+
+- 'knows': The characters are acquaintances, but not close friends or enemies.
+- 'friend': The characters share a close bond and help each other whenever needed.
+- 'enemy': The characters have a rivalry or antagonism, typically involving conflict.
+- 'family_member': The characters are related by blood, marriage, or adoption, regardless of the quality of their relationship.
+
+KEY GUIDELINES:
+- Focus on the nature of the interactions between the characters. Are they working together as allies, or is there tension between them?
+- If two characters do not meet or interact in the story, or their relationship is unclear, do NOT include that pair.
+- Remember that the context of the story is key, so consider only the interactions presented in the folktale.
+- Refer to each character by its index in the list provided. Include each pair at most once and never relate a character to itself.
+'''),
+
+		HumanMessagePromptTemplate.from_template(template='''Based on the following folktale, identify the relationships between the characters listed below. Choose the most accurate relationship type for each pair, considering the context of their interactions in the story.
+
+Characters:
+{characters}
+
+Folktale:
+{folktale}
+''')
+	]
+)
+
+def _estimate_tokens(prompt: ChatPromptTemplate, inputs: dict) -> int:
+	# Aproximación de ~4 caracteres por token; basta para comparar modos
+	return sum(len(str(message.content)) for message in prompt.format_messages(**inputs)) // 4
+
+def _format_characters(agents: list[Agent], indices: list[int]) -> str:
+	lines = []
+	for i in indices:
+		agent = agents[i]
+		if agent.name:
+			lines.append(f"- {i}. {agent.instance_name} ({agent.name})")
+		else:
+			lines.append(f"- {i}. {agent.instance_name}")
+	return "\n".join(lines)
+
+async def extract_relationships_matrix(model: BaseChatModel, folktale: str, agents: list[Agent], group_size: int = 12):
+	"""
+	Extrae todas las relaciones entre agentes con salida estructurada, en lugar de una llamada
+	por pareja.
+
+	Si hay más de `group_size` agentes, se dividen en grupos y se hace una llamada por cada par
+	de grupos (incluido cada grupo consigo mismo), de modo que cada pareja se pregunta una vez.
+	Se descartan las relaciones con índices fuera de rango, de un agente consigo mismo, de
+	parejas que no corresponden a la llamada o repetidas.
+
+	Args:
+		model (BaseChatModel): Modelo de lenguaje utilizado para la extracción de relaciones.
+		folktale (str): Texto completo del cuento.
+		agents (list[Agent]): Lista de agentes presentes en el cuento.
+		group_size (int): Máximo de agentes por grupo.
+
+	Returns:
+		list[Relationship]: Lista de relaciones identificadas entre los agentes, con agent < other.
+	"""
+	n_agents = len(agents)
+	if n_agents < 2:
+		return []
+
+	groups = [list(range(start, min(start + group_size, n_agents))) for start in range(0, n_agents, group_size)]
+	blocks = [(i, j) for i in range(len(groups)) for j in range(i, len(groups))]
+	group_of = {agent: g for g, group in enumerate(groups) for agent in group}
+
+	inputs = [
+		{"folktale": folktale, "characters": _format_characters(agents, sorted(set(groups[i] + groups[j])))}
+		for i, j in blocks
+	]
+	responses = await asyncio.gather(*(ainvoke(model, matrix_prompt, block_inputs, schema=Relationships, stage="relationships") for block_inputs in inputs))
 
 	relationships = []
-	for i, agent_1 in enumerate(agents):
-		start = i + 1
-		for j, agent_2 in enumerate(agents[start:], start=start):
-			# print(i, j)
-			
-			# logger.info(
-			# 	relationship_prompt.format(
-			# 		folktale = folktale,
-			# 		agent_1 = agent_1.instance_name,
-			# 		agent_2 = agent_2.instance_name
-			# 	)
-			# )
-
-			ai_messsage = relationship_chain.invoke({
-				"folktale": folktale,
-				"agent_1": agent_1.instance_name,
-				"agent_2": agent_2.instance_name
-			})
-			
-			content = ai_messsage.content
-			match = re.search(relationship_regex, content)
-
-			relationship_type = "none"
-			if match:
-				relationship_type = match.group(1)
-
-				if relationship_type in {"knows", "friend", "enemy", "family_member"}:
-					relationship = Relationship(
-						agent=i,
-						other=j,
-						relationship=relationship_type
-					)
-
-					relationships.append(relationship)
-				else:
-					relationship_type = "none"
-			
-			logger.debug(f"Relationship between '{agent_1.instance_name}' and '{agent_2.instance_name}': {relationship_type}\nReasoning: {content}")
-
-	return relationships
\ No newline at end of file
+	seen = set()
+	for (i, j), response in zip(blocks, responses):
+		for relationship in cast(Relationships, response).relationships:
+			if relationship.relationship == "none":
+				continue
+			agent, other = sorted((relationship.agent, relationship.other))
+			if agent < 0 or other >= n_agents or agent == other:
+				logger.warning(f"Relationship {relationship} is out of bounds. Indices must be different and less than {n_agents}.")
+				continue
+			# Cada pareja solo se acepta en la llamada de sus dos grupos
+			if tuple(sorted((group_of[agent], group_of[other]))) != (i, j) or (agent, other) in seen:
+				continue
+			seen.add((agent, other))
+			relationships.append(Relationship(agent=agent, other=other, relationship=relationship.relationship))
+
+	relationships.sort(key=lambda relationship: (relationship.agent, relationship.other))
+
+	n_pairs = n_agents * (n_agents - 1) // 2
+	pairwise_tokens = n_pairs * _estimate_tokens(relationship_prompt, {"folktale": folktale, "agent_1": agents[0].instance_name, "agent_2": agents[1].instance_name})
+	matrix_tokens = sum(_estimate_tokens(matrix_prompt, block_inputs) for block_inputs in inputs)
+	logger.debug(f"Relationships: {len(blocks)} calls (~{matrix_tokens} prompt tokens) instead of {n_pairs} pairwise calls (~{pairwise_tokens} prompt tokens). {relationships}")
+
+	return relationships
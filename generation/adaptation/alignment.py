@@ -1,12 +1,13 @@
-from queue import PriorityQueue
 from generation.ontology.event_retriever import EventRetriever
+from generation.ontology.entity_sequences import EntitySequenceIndex, EntitySequences, EntityKind
 from generation.ontology.folktale_graph import FolktaleOntology
-from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
-from generation.adaptation.similarity import best_similarity
+from generation.adaptation.similarity import ClassSimilarityTable, batch_best_similarity
+from generation.adaptation.top_n import TopN
 from common.utils.regex_utils import snake_case_to_pascal_case, camel_to_snake
 from loguru import logger
 from collections import defaultdict
 import pandas as pd
+import numpy as np
 
 class ItemContainer:
     def __init__(self, id: str, n: int = 2):
@@ -14,7 +15,7 @@ class ItemContainer:
         self.id = id
         self.events: list[str] = []
         self.event_types: list[str] = []
-        self.queue: PriorityQueue[tuple[int, str]] = PriorityQueue()
+        self.candidates = TopN(n)
 
     # Añade un evento en el que participa este contenedor
     def add_event(self, event_uri: str,event_type:str):
@@ -24,9 +25,7 @@ class ItemContainer:
     # Añade un candidato (URI) con su score
     # Se mantiene solo el top-n según score
     def add_candidate(self, event_uri: str, value: float = 0):
-        self.queue.put((value, event_uri))
-        if self.queue.qsize() > self.n:
-            self.queue.get()
+        self.candidates.push((value, event_uri))
 
 # Función de debug para imprimir el contenido de los contenedores
 def print_dict(title: str, container_dict: dict[str, list[ItemContainer]]):
@@ -39,9 +38,7 @@ def print_dict(title: str, container_dict: dict[str, list[ItemContainer]]):
         for container in container_list:
             print(f"  ItemContainer id: {container.id}")
             print(f"    events: {container.events}")
-            # Mostrar los elementos de la cola sin vaciarla
-            queue_contents = list(container.queue.queue)
-            print(f"    queue: {queue_contents}")
+            print(f"    candidates: {container.candidates.ascending()}")
 
 # Procesa los eventos de la historia y construye contenedores de lugares, objetos y roles
 def process_events(events: dict[str, dict], eventRetriever: EventRetriever):
@@ -123,56 +120,64 @@ def process_events(events: dict[str, dict], eventRetriever: EventRetriever):
 
     return places, objects, roles
 
-# Para cada rol candidato, se calcula la similitud semántica con la secuencia de eventos del contenedor
-def process_roles(genre: str, container_dict: dict[str, list[ItemContainer]], eventRetriever: EventRetriever, sim: LocalSemanticSimilarityCalculator):
-    genre = camel_to_snake(genre)
-    for key, container_list in container_dict.items():
-        roles = eventRetriever.get_roles_by_type_and_genre(snake_case_to_pascal_case(key),FolktaleOntology.GENRE_MAP[genre])
-        for uri, label, folktale_title in roles:
-            events = eventRetriever.get_ordered_events_for_agent(uri)
-            event_types = [row[0] for row in events]
+class CandidateBatch:
+    """
+    Candidatos de una clase y los contenedores que los reciben, con sus secuencias de eventos
+    codificadas en la tabla de similitud. Puntuar el lote no modifica ningún estado compartido.
+    """
+    def __init__(self, kind: EntityKind, candidates: EntitySequences, containers: list[ItemContainer], candidate_codes: list[np.ndarray], container_codes: list[np.ndarray]):
+        self.kind = kind
+        self.candidates = candidates
+        self.containers = containers
+        self.candidate_codes = candidate_codes
+        self.container_codes = container_codes
+
+    def score(self, table: np.ndarray) -> np.ndarray:
+        return batch_best_similarity(self.candidate_codes, self.container_codes, table)
+
+    def add_to_containers(self, scores: np.ndarray):
+        for k, (uri, event_types) in enumerate(self.candidates):
             print(f"uri: {uri}")
             print(event_types)
-            for container in container_list:
-                score, _ = best_similarity(event_types,container.event_types,sim.path_similarity_class)
+            for c, container in enumerate(self.containers):
+                score = float(scores[k, c])
                 print(f"    - event_types: {container.event_types}")
                 print(f"    - events: {container.events}")
                 print(f"    - score: {score}")
                 container.add_candidate(uri,score)
 
-# Para cada objeto candidato, se calcula la similitud semántica con la secuencia de eventos del contenedor
-def process_objects(genre: str, container_dict: dict[str, list[ItemContainer]], eventRetriever: EventRetriever, sim:LocalSemanticSimilarityCalculator):
+# Prepara un lote por clase con sus candidatos y rellena la tabla de similitud con los pares que necesitan
+def prepare_candidate_batches(kind: EntityKind, genre: str, container_dict: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable) -> list[CandidateBatch]:
     genre = camel_to_snake(genre)
+    index_codes = sim_table.codes(sequence_index.event_types)
+    batches = []
     for key, container_list in container_dict.items():
-        objects = eventRetriever.get_objects_by_type_and_genre(snake_case_to_pascal_case(key),FolktaleOntology.GENRE_MAP[genre])
-        for uri, label, folktale_title in objects:
-            events = eventRetriever.get_ordered_events_for_object(uri)
-            event_types = [row[0] for row in events]
-            print(f"uri: {uri}")
-            print(event_types)
-            for container in container_list:
-                score, _ = best_similarity(event_types,container.event_types,sim.path_similarity_class)
-                print(f"    - event_types: {container.event_types}")
-                print(f"    - events: {container.events}")
-                print(f"    - score: {score}")
-                container.add_candidate(uri,score)
+        candidates = sequence_index.get(kind, snake_case_to_pascal_case(key), FolktaleOntology.GENRE_MAP[genre])
+        if len(candidates) == 0:
+            continue
+
+        candidate_codes = [index_codes[candidates.codes_of(i)] for i in range(len(candidates))]
+        container_codes = [sim_table.codes(container.event_types) for container in container_list]
+        sim_table.fill(np.concatenate(candidate_codes), np.concatenate(container_codes))
+        batches.append(CandidateBatch(kind, candidates, container_list, candidate_codes, container_codes))
+    return batches
+
+# Puntúa en bloque todos los candidatos de cada clase frente a las secuencias de eventos de sus contenedores
+def _fill_candidates(kind: EntityKind, genre: str, container_dict: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable):
+    for batch in prepare_candidate_batches(kind, genre, container_dict, sequence_index, sim_table):
+        batch.add_to_containers(batch.score(sim_table.table))
+
+# Para cada rol candidato, se calcula la similitud semántica con la secuencia de eventos del contenedor
+def process_roles(genre: str, container_dict: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable):
+    _fill_candidates("agent", genre, container_dict, sequence_index, sim_table)
+
+# Para cada objeto candidato, se calcula la similitud semántica con la secuencia de eventos del contenedor
+def process_objects(genre: str, container_dict: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable):
+    _fill_candidates("object", genre, container_dict, sequence_index, sim_table)
 
 # Para cada place candidato, se calcula la similitud semántica con la secuencia de eventos del contenedor
-def process_places(genre: str, container_dict: dict[str, list[ItemContainer]], eventRetriever: EventRetriever, sim: LocalSemanticSimilarityCalculator):
-    genre = camel_to_snake(genre)
-    for key, container_list in container_dict.items():
-        places = eventRetriever.get_place_by_type_and_genre(snake_case_to_pascal_case(key),FolktaleOntology.GENRE_MAP[genre])
-        for uri, label, folktale_title in places:
-            events = eventRetriever.get_ordered_events_for_place(uri)
-            event_types = [row[0] for row in events]
-            print(f"uri: {uri}")
-            print(event_types)
-            for container in container_list:
-                score, _ = best_similarity(event_types,container.event_types,sim.path_similarity_class)
-                print(f"    - event_types: {container.event_types}")
-                print(f"    - events: {container.events}")
-                print(f"    - score: {score}")
-                container.add_candidate(uri,score)
+def process_places(genre: str, container_dict: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable):
+    _fill_candidates("place", genre, container_dict, sequence_index, sim_table)
 
 # Selecciona URIs únicos para cada contenedor, evitando reutilizar el mismo URI
 def build_unique_uri_dict(container_dict: dict[str, list[ItemContainer]]) -> dict[str, list[str]]:
@@ -181,12 +186,8 @@ def build_unique_uri_dict(container_dict: dict[str, list[ItemContainer]]) -> dic
 
     for key, containers in container_dict.items():
         for container in containers:
-            # Obtener candidatos ordenados por score DESC
-            candidates = sorted(
-                container.queue.queue,
-                key=lambda x: x[0],
-                reverse=True
-            )
+            # Candidatos ordenados por score DESC
+            candidates = container.candidates.descending()
 
             selected_uri = None
             for score, uri in candidates:
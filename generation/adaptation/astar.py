@@ -1,11 +1,17 @@
 from generation.adaptation.query import Query
 from generation.adaptation.node import Node
-from generation.adaptation.similarity import compute_event_similarity
+from generation.adaptation.open_list import BoundedOpenList
+from generation.adaptation.tracer import SearchTracer, NullTracer, NULL_TRACER
+from generation.adaptation.memo import HeuristicMemo
+from generation.adaptation.similarity import compute_similarity_components, combine_similarity_components, majority_genre, compute_initial_similarities
 from generation.ontology.event_retriever import EventRetriever
+from generation.ontology.event_features import EventFeatureIndex
 from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
 from common.models.event import MAX_EVENTS
 from rdflib import Graph
 from loguru import logger
+from typing import Optional
+import numpy as np
 import heapq
 
 class ConstructiveAdaptation:
@@ -16,8 +22,13 @@ class ConstructiveAdaptation:
 	top_n: int
 	g_weight: float
 	h_weight: float
+	max_open_nodes: Optional[int]
+	peak_open_size: int
+	features: Optional[EventFeatureIndex]
+	heuristic_memo_size: int
+	heuristic_memo: Optional[HeuristicMemo]
 	
-	def __init__(self, graph: Graph, weights: dict[str, float], retriever: EventRetriever, sim_calculator: LocalSemanticSimilarityCalculator, top_n: int = 5, g_weight: float = 1.0, h_weight: float = 5.0):
+	def __init__(self, graph: Graph, weights: dict[str, float], retriever: EventRetriever, sim_calculator: LocalSemanticSimilarityCalculator, top_n: int = 5, g_weight: float = 1.0, h_weight: float = 5.0, max_open_nodes: Optional[int] = None, heuristic_memo_size: int = 100_000):
 		self.graph = graph
 		self.weights = weights
 		self.retriever = retriever
@@ -25,9 +36,27 @@ class ConstructiveAdaptation:
 		self.top_n = top_n
 		self.g_weight = g_weight
 		self.h_weight = h_weight
+		# Límite de nodos en la lista abierta. Al superarlo se descartan los de peor f.
+		self.max_open_nodes = max_open_nodes
+		self.peak_open_size = 0
+		# Características de los eventos para puntuar en bloque los candidatos iniciales. Se construyen bajo demanda.
+		self.features = None
+		# Memo de componentes de la heurística por firma de nodo. Se reinicia en cada búsqueda (depende de la consulta).
+		self.heuristic_memo_size = heuristic_memo_size
+		self.heuristic_memo = None
 
 	def _heuristic(self, node: Node, query: Query):
-		sim = compute_event_similarity(node, query, self.weights, self.retriever, self.sim_calculator)
+		memo = self.heuristic_memo
+		if memo is None:
+			components = compute_similarity_components(node, query, self.retriever, self.sim_calculator)
+		else:
+			key = node.signature(majority_genre(node, self.retriever))
+			components = memo.get(key)
+			if components is None:
+				components = compute_similarity_components(node, query, self.retriever, self.sim_calculator)
+				memo.put(key, components)
+
+		sim = combine_similarity_components(components, self.weights, len(node.objects) > 0)
 		h = -sim * self.h_weight
 		return h
 	
@@ -37,44 +66,103 @@ class ConstructiveAdaptation:
 		# return ((max_events - n_events) / max_events) ** 2 * self.g_weight
 	
 	def _debug_node(self, message: str, node: Node):
-		logger.debug(f"{message}: events={node.get_event_names()}, g={node.g:.2f}, h={node.h:.2f}, f={node.f:.2f}")
+		# El mensaje solo se formatea si el nivel DEBUG está activo
+		logger.opt(lazy=True).debug("{}", lambda: f"{message}: events={node.get_event_names()}, g={node.g:.2f}, h={node.h:.2f}, f={node.f:.2f}")
+
+	def _report_search(self, open_heap: BoundedOpenList, tracer: SearchTracer | NullTracer):
+		self.peak_open_size = open_heap.peak_size
+		tracer.count("evicted", open_heap.evicted)
+		tracer.sample("open_peak", open_heap.peak_size)
+		logger.debug(f"Open list: peak={open_heap.peak_size}, evicted={open_heap.evicted}, limit={self.max_open_nodes}")
+
+		memo = self.heuristic_memo
+		if memo is not None:
+			tracer.count("heuristic_memo_hits", memo.hits)
+			tracer.count("heuristic_memo_misses", memo.misses)
+			logger.debug(f"Heuristic memo: hits={memo.hits}, misses={memo.misses}, hit_rate={memo.hit_rate:.2%}")
+		tracer.finish()
+
+	def _select_initial_candidates(self, candidates: list[str], query: Query):
+		"""
+		Preselecciona los candidatos iniciales puntuándolos en bloque con las características
+		precalculadas. Solo los supervivientes se convierten en nodos y se puntúan con la
+		heurística completa, que decide el orden final.
+		"""
+		if len(candidates) <= self.top_n:
+			return candidates
+
+		if self.features is None:
+			self.features = EventFeatureIndex(self.graph)
+
+		if any(candidate not in self.features for candidate in candidates):
+			return candidates
 
-	def generate(self, query: Query, max_events: int = MAX_EVENTS):
-		open_heap: list[tuple[float, int, Node]] = []
+		similarities = compute_initial_similarities(candidates, query, self.weights, self.features, self.sim_calculator)
+		# Todos los nodos iniciales tienen el mismo coste g, así que basta con ordenar por h
+		h = -similarities * self.h_weight
+
+		top = np.argpartition(h, self.top_n - 1)[:self.top_n]
+		threshold = h[top].max()
+		# Los empates con el peor superviviente se resuelven por orden de aparición, como en heapq.nsmallest
+		better = np.flatnonzero(h < threshold - 1e-9)
+		ties = np.flatnonzero(np.abs(h - threshold) <= 1e-9)[:self.top_n - len(better)]
+		survivors = np.sort(np.concatenate([better, ties]))
+
+		logger.debug(f"Initial candidates: {len(candidates)} scored in bulk, {len(survivors)} kept.")
+		return [candidates[i] for i in survivors]
+
+	def generate(self, query: Query, max_events: int = MAX_EVENTS, tracer: SearchTracer | NullTracer = NULL_TRACER):
+		open_heap = BoundedOpenList(self.max_open_nodes)
 		counter = 0
+		self.heuristic_memo = HeuristicMemo(self.heuristic_memo_size) if self.heuristic_memo_size > 0 else None
 
 		initial_event = query.events[0]
-		initial_candidates = self.retriever.get_instances_of_class(initial_event)
-		if not initial_candidates:
-			initial_candidates = self.retriever.get_all_event_instances()
+		with tracer.span("retrieval"):
+			initial_candidates = self.retriever.get_instances_of_class(initial_event)
+			if not initial_candidates:
+				initial_candidates = self.retriever.get_all_event_instances()
+		with tracer.span("initial_selection"):
+			initial_candidates = self._select_initial_candidates(initial_candidates, query)
+
 		scored_initial_candidates: list[Node] = []
 		for candidate in initial_candidates:
 			node = Node()
-			node.add_event(candidate, self.retriever)
+			with tracer.span("retrieval"):
+				node.add_event(candidate, self.retriever)
 			node.g = self._path_cost(node, max_events)
-			node.h = self._heuristic(node, query)
+			with tracer.span("heuristic"):
+				node.h = self._heuristic(node, query)
 			node.f = node.g + node.h
 			scored_initial_candidates.append(node)
+		tracer.count("generated", len(scored_initial_candidates))
 
 		top_initial_candidates = heapq.nsmallest(self.top_n, scored_initial_candidates, key=lambda node: node.f)
 
 		for node in top_initial_candidates:
-			heapq.heappush(open_heap, (node.f, counter, node))
+			if open_heap.push((node.f, counter, node)):
+				tracer.count("pushes")
 			counter += 1
 			self._debug_node("Initial node added", node)
 
 
 		while open_heap:
-			_, _, node = heapq.heappop(open_heap)
+			_, _, node = open_heap.pop()
+			tracer.count("expansions")
+			tracer.sample("open_size", len(open_heap))
 			self._debug_node("Expanding node", node)
 
-			if node.is_goal(self.retriever, max_events):
+			with tracer.span("retrieval"):
+				is_goal = node.is_goal(self.retriever, max_events)
+
+			if is_goal:
+				self._report_search(open_heap, tracer)
 
-				logger.debug(f"Goal reached: events={node.get_event_names()}, g={node.g:.2f}, h={node.h:.2f}, f={node.f:.2f}, places={node.places}, objects={node.objects}, roles={node.roles}")
+				logger.opt(lazy=True).debug("{}", lambda: f"Goal reached: events={node.get_event_names()}, g={node.g:.2f}, h={node.h:.2f}, f={node.f:.2f}, places={node.places}, objects={node.objects}, roles={node.roles}")
 				return node
 			
 			last_event = node.events[-1]
-			candidates = self.retriever.get_post_event_instances(last_event, node.events)
+			with tracer.span("retrieval"):
+				candidates = self.retriever.get_post_event_instances(last_event, node.events)
 			# logger.debug(f"Candidates for expansion from '{last_event.split("/")[-1]}': {[candidate.split("/")[-1] for candidate in candidates]}")
 
 			scored_candidates: list[Node] = []
@@ -83,18 +171,23 @@ class ConstructiveAdaptation:
 				new_node = node.clone(
 					parent=node
 				)
-				new_node.add_event(candidate, self.retriever)
+				with tracer.span("retrieval"):
+					new_node.add_event(candidate, self.retriever)
 				new_node.g = self._path_cost(node, max_events)
-				new_node.h = self._heuristic(new_node, query)
+				with tracer.span("heuristic"):
+					new_node.h = self._heuristic(new_node, query)
 				new_node.f = new_node.g + new_node.h
 				scored_candidates.append(new_node)
+			tracer.count("generated", len(scored_candidates))
 
 			top_candidates = heapq.nsmallest(self.top_n, scored_candidates, key=lambda node: node.f)
 
 			for new_node in top_candidates:
-				heapq.heappush(open_heap, (new_node.f, counter, new_node))
+				if open_heap.push((new_node.f, counter, new_node)):
+					tracer.count("pushes")
 				self._debug_node("New node added", new_node)
 				counter += 1
 		
+		self._report_search(open_heap, tracer)
 		logger.debug("No valid sequence found.")
 		return None
\ No newline at end of file
@@ -0,0 +1,65 @@
+from generation.adaptation.alignment import ItemContainer, CandidateBatch, prepare_candidate_batches
+from generation.adaptation.similarity import ClassSimilarityTable
+from generation.ontology.entity_sequences import EntitySequenceIndex, EntityKind
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+import numpy as np
+import time
+
+FILLING_KINDS: dict[str, EntityKind] = {
+	"roles": "agent",
+	"objects": "object",
+	"places": "place"
+}
+
+def _score_batch(batch: CandidateBatch, table: np.ndarray):
+	start = time.perf_counter()
+	scores = batch.score(table)
+	return scores, time.perf_counter() - start
+
+def fill_candidates(genre: str, roles: dict[str, list[ItemContainer]], objects: dict[str, list[ItemContainer]], places: dict[str, list[ItemContainer]], sequence_index: EntitySequenceIndex, sim_table: ClassSimilarityTable, workers: int = 4) -> dict[str, float]:
+	"""
+	Rellena los candidatos de roles, objetos y lugares puntuando todas sus clases en un pool de hilos.
+
+	Primero se preparan los lotes y se completa la tabla de similitud, que es lo único que
+	consulta el grafo. Después los lotes se puntúan en paralelo sobre el índice y la tabla, que
+	ya solo se leen, y los candidatos se añaden a los contenedores en el mismo orden que en
+	process_roles, process_objects y process_places, por lo que el resultado es idéntico.
+
+	El orden no depende del de las filas de las consultas (que en rdflib varía entre procesos):
+	las clases de roles y objetos de cada evento y sus URIs se recorren ordenados, los candidatos
+	de cada clase se puntúan por URI y los empates de score se resuelven por URI ascendente.
+
+	Args:
+		genre (str): Género de la consulta.
+		roles, objects, places (dict[str, list[ItemContainer]]): Contenedores de process_events.
+		sequence_index (EntitySequenceIndex): Secuencias de eventos de las entidades candidatas.
+		sim_table (ClassSimilarityTable): Tabla de similitud entre tipos de evento.
+		workers (int): Número de hilos. Con 1 se puntúa en el hilo actual.
+
+	Returns:
+		dict[str, float]: Tiempo de rellenado de cada tipo (roles, objects, places).
+	"""
+	timings = {name: 0.0 for name in FILLING_KINDS}
+	containers = {"roles": roles, "objects": objects, "places": places}
+
+	batches: list[tuple[str, CandidateBatch]] = []
+	for name, kind in FILLING_KINDS.items():
+		start = time.perf_counter()
+		batches.extend((name, batch) for batch in prepare_candidate_batches(kind, genre, containers[name], sequence_index, sim_table))
+		timings[name] += time.perf_counter() - start
+
+	table = sim_table.table
+	if workers <= 1 or len(batches) <= 1:
+		results = [_score_batch(batch, table) for _, batch in batches]
+	else:
+		with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+			results = list(executor.map(lambda item: _score_batch(item[1], table), batches))
+
+	for (name, batch), (scores, elapsed) in zip(batches, results):
+		start = time.perf_counter()
+		batch.add_to_containers(scores)
+		timings[name] += elapsed + time.perf_counter() - start
+
+	logger.debug(f"Filling: {len(batches)} candidate batches scored with {workers} workers.")
+	return timings
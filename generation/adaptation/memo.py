@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class HeuristicMemo:
+	"""
+	Caché LRU acotada de componentes de la heurística, indexada por la firma canónica de un nodo.
+	"""
+	maxsize: int
+	entries: OrderedDict[Hashable, Any]
+	hits: int
+	misses: int
+
+	def __init__(self, maxsize: int = 100_000):
+		self.maxsize = maxsize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, key: Hashable) -> Optional[Any]:
+		value = self.entries.get(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.entries.move_to_end(key)
+		return value
+
+	def put(self, key: Hashable, value: Any):
+		self.entries[key] = value
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+
+	@property
+	def hit_rate(self):
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
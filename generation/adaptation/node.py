@@ -74,5 +74,19 @@ class Node(BaseModel):
 			parent=parent,
 		)
 	
+	def signature(self, genre: Optional[str]):
+		"""
+		Firma canónica y hashable del nodo para memorizar la heurística. Incluye todo aquello de lo
+		que depende: la secuencia de tipos de evento, el género mayoritario y los conjuntos de clases
+		de lugares, roles y objetos (la heurística no depende de cuántas veces aparece cada clase).
+		"""
+		return (
+			tuple(self.events_type),
+			genre,
+			frozenset(self.places),
+			frozenset(self.roles),
+			frozenset(self.objects),
+		)
+
 	def get_event_names(self):
 		return [event.split("/")[-1] for event in self.events]
\ No newline at end of file
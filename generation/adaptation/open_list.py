@@ -0,0 +1,144 @@
+from typing import Any, Optional
+
+class BoundedOpenList:
+	"""
+	Lista abierta de A* implementada como un min-max heap.
+
+	Permite extraer tanto el nodo con menor f (siguiente a expandir) como el de mayor f
+	(el que se descarta cuando se alcanza el límite de nodos) en O(log n).
+	Las entradas son tuplas (f, contador, nodo), igual que en el heap de heapq, por lo
+	que el orden de expansión sin límite es idéntico.
+	"""
+	max_size: Optional[int]
+	heap: list[tuple[float, int, Any]]
+	peak_size: int
+	evicted: int
+
+	def __init__(self, max_size: Optional[int] = None):
+		if max_size is not None and max_size < 1:
+			raise ValueError("max_size must be at least 1.")
+		self.max_size = max_size
+		self.heap = []
+		self.peak_size = 0
+		self.evicted = 0
+
+	def __len__(self):
+		return len(self.heap)
+
+	def __bool__(self):
+		return bool(self.heap)
+
+	def push(self, entry: tuple[float, int, Any]) -> bool:
+		"""
+		Inserta una entrada. Si la lista está llena se descarta la entrada con peor f
+		(que puede ser la propia entrada nueva).
+
+		Returns:
+			bool: True si la entrada queda en la lista.
+		"""
+		if self.max_size is not None and len(self.heap) >= self.max_size:
+			self.evicted += 1
+			if entry >= self.heap[self._max_index()]:
+				return False
+			self.pop_max()
+
+		self.heap.append(entry)
+		self._bubble_up(len(self.heap) - 1)
+		self.peak_size = max(self.peak_size, len(self.heap))
+		return True
+
+	def pop(self) -> tuple[float, int, Any]:
+		"""Extrae la entrada con menor f."""
+		heap = self.heap
+		last = heap.pop()
+		if not heap:
+			return last
+		root = heap[0]
+		heap[0] = last
+		self._trickle_down(0)
+		return root
+
+	def pop_max(self) -> tuple[float, int, Any]:
+		"""Extrae la entrada con mayor f."""
+		heap = self.heap
+		index = self._max_index()
+		last = heap.pop()
+		if index == len(heap):
+			return last
+		entry = heap[index]
+		heap[index] = last
+		self._trickle_down(index)
+		return entry
+
+	def _max_index(self):
+		n = len(self.heap)
+		if n <= 2:
+			return n - 1
+		return 1 if self.heap[1] >= self.heap[2] else 2
+
+	@staticmethod
+	def _is_min_level(index: int):
+		return (index + 1).bit_length() % 2 == 1
+
+	def _swap(self, i: int, j: int):
+		self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+
+	def _bubble_up(self, index: int):
+		if index == 0:
+			return
+		heap = self.heap
+		parent = (index - 1) // 2
+		if self._is_min_level(index):
+			if heap[index] > heap[parent]:
+				self._swap(index, parent)
+				self._bubble_up_grandparents(parent, is_min=False)
+			else:
+				self._bubble_up_grandparents(index, is_min=True)
+		else:
+			if heap[index] < heap[parent]:
+				self._swap(index, parent)
+				self._bubble_up_grandparents(parent, is_min=True)
+			else:
+				self._bubble_up_grandparents(index, is_min=False)
+
+	def _bubble_up_grandparents(self, index: int, is_min: bool):
+		heap = self.heap
+		while index > 2:
+			grandparent = ((index - 1) // 2 - 1) // 2
+			if (heap[index] < heap[grandparent]) if is_min else (heap[index] > heap[grandparent]):
+				self._swap(index, grandparent)
+				index = grandparent
+			else:
+				break
+
+	def _trickle_down(self, index: int):
+		heap = self.heap
+		n = len(heap)
+		is_min = self._is_min_level(index)
+
+		while True:
+			first_child = 2 * index + 1
+			if first_child >= n:
+				return
+
+			# Mejor descendiente entre hijos y nietos
+			descendants = [first_child, first_child + 1, 2 * first_child + 1, 2 * first_child + 2, 2 * first_child + 3, 2 * first_child + 4]
+			best = first_child
+			for candidate in descendants[1:]:
+				if candidate >= n:
+					continue
+				if (heap[candidate] < heap[best]) if is_min else (heap[candidate] > heap[best]):
+					best = candidate
+
+			improves = (heap[best] < heap[index]) if is_min else (heap[best] > heap[index])
+			if not improves:
+				return
+
+			self._swap(best, index)
+			if best <= first_child + 1:
+				return
+
+			parent = (best - 1) // 2
+			if (heap[best] > heap[parent]) if is_min else (heap[best] < heap[parent]):
+				self._swap(best, parent)
+			index = best
@@ -2,6 +2,7 @@ from generation.adaptation.node import Node
 from generation.adaptation.query import Query
 from generation.ontology.event_retriever import EventRetriever
 from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
+from generation.ontology.event_features import EventFeatureIndex
 from typing import Iterable, Callable, Any
 from collections import Counter
 import numpy as np
@@ -13,7 +14,7 @@ def safe_mean(values: Iterable[float]):
     values = tuple(values)
     return sum(values) / len(values) if values else 0
 
-def genre_similarity(node: Node, query: Query, retriever: EventRetriever):
+def majority_genre(node: Node, retriever: EventRetriever):
     genres = []
 
     for event in node.events:
@@ -21,9 +22,15 @@ def genre_similarity(node: Node, query: Query, retriever: EventRetriever):
         genres.append(genre_label.replace(" ", ""))
         
     if not genres:
+        return None
+
+    return Counter(genres).most_common(1)[0][0]
+
+def genre_similarity(node: Node, query: Query, retriever: EventRetriever):
+    most_common_genre = majority_genre(node, retriever)
+    if most_common_genre is None:
         return 0.0
 
-    most_common_genre = Counter(genres).most_common(1)[0][0]
     return float(query.genre == most_common_genre)
 
 def event_similarity(node: Node, query: Query, sim_calculator: LocalSemanticSimilarityCalculator):
@@ -67,26 +74,175 @@ def role_similarity(node: Node, query: Query, sim_calculator: LocalSemanticSimil
         for q_role in query.roles
     )
 
-def compute_event_similarity(node: Node, query: Query, weights: dict[str, float], retriever: EventRetriever, sim_calculator: LocalSemanticSimilarityCalculator):
-
-    components = {
+def compute_similarity_components(node: Node, query: Query, retriever: EventRetriever, sim_calculator: LocalSemanticSimilarityCalculator):
+    return {
         "genre": genre_similarity(node, query, retriever),
         "event": event_similarity(node, query, sim_calculator),
         "place": place_similarity(node, query, sim_calculator),
         "object": object_similarity(node, query, sim_calculator),
         "role": role_similarity(node, query, sim_calculator),
     }
-    
+
+def combine_similarity_components(components: dict[str, float], weights: dict[str, float], has_objects: bool):
     total_sim = sum(
         components[name] * weights.get(name, 0)
         for name in components
     )
 
-    if len(node.objects) <= 0:
+    if not has_objects:
         total_sim = total_sim / (1.0 - weights.get("object", 0))
 
     return total_sim
 
+def compute_event_similarity(node: Node, query: Query, weights: dict[str, float], retriever: EventRetriever, sim_calculator: LocalSemanticSimilarityCalculator):
+    components = compute_similarity_components(node, query, retriever, sim_calculator)
+    return combine_similarity_components(components, weights, len(node.objects) > 0)
+
+def _class_similarity_matrix(query_classes: list[str], classes: list, sim_calculator: LocalSemanticSimilarityCalculator):
+    matrix = np.zeros((len(query_classes), len(classes)), dtype=float)
+    for i, q_class in enumerate(query_classes):
+        for j, class_id in enumerate(classes):
+            matrix[i, j] = sim_calculator.path_similarity_class(q_class, class_id)
+    return matrix
+
+def _mean_max_similarity(query_classes: list[str], classes: list[str], counts: np.ndarray, sim_calculator: LocalSemanticSimilarityCalculator):
+    if not query_classes:
+        return np.zeros(len(counts))
+    matrix = _class_similarity_matrix(query_classes, classes, sim_calculator)
+    present = (counts > 0)[:, None, :]
+    # Máximo sobre las clases presentes en cada evento (0 si no hay ninguna), media sobre la consulta
+    best = np.where(present, matrix[None, :, :], 0.0).max(axis=2, initial=0.0)
+    return best.sum(axis=1) / len(query_classes)
+
+def compute_initial_similarities(event_uris: list[str], query: Query, weights: dict[str, float], features: EventFeatureIndex, sim_calculator: LocalSemanticSimilarityCalculator):
+    """
+    Calcula en bloque compute_event_similarity para nodos formados por un único evento,
+    usando las características precalculadas de los eventos.
+    """
+    indices = features.indices(event_uris)
+
+    genres = np.array([
+        (genre or "").replace(" ", "") for genre in features.genres
+    ])[indices]
+    genre = (genres == str(query.genre)).astype(float)
+
+    # Con un único evento, el alineamiento óptimo empareja el evento de la consulta más similar
+    types = sorted({features.types[i] for i in indices}, key=str)
+    type_index = {type_id: i for i, type_id in enumerate(types)}
+    type_sims = _class_similarity_matrix(query.events, types, sim_calculator).max(axis=0, initial=0.0) * 2
+    event = type_sims[[type_index[features.types[i]] for i in indices]] / (len(query.events) + 1)
+
+    place_ids = sorted({features.places[i] for i in indices}, key=str)
+    place_index = {place_id: i for i, place_id in enumerate(place_ids)}
+    if query.places:
+        place_sims = _class_similarity_matrix(query.places, place_ids, sim_calculator).sum(axis=0) / len(query.places)
+        place = place_sims[[place_index[features.places[i]] for i in indices]]
+    else:
+        place = np.zeros(len(indices))
+
+    object_counts = features.object_counts[indices]
+    object = _mean_max_similarity(query.objects, features.object_classes, object_counts, sim_calculator)
+    role = _mean_max_similarity(query.roles, features.role_classes, features.role_counts[indices], sim_calculator)
+
+    components = {
+        "genre": genre,
+        "event": event,
+        "place": place,
+        "object": object,
+        "role": role,
+    }
+
+    total_sim = sum(
+        components[name] * weights.get(name, 0)
+        for name in components
+    )
+
+    has_objects = object_counts.sum(axis=1) > 0
+    return np.where(has_objects, total_sim, total_sim / (1.0 - weights.get("object", 0)))
+
+class ClassSimilarityTable:
+    """
+    Tabla compartida de path_similarity_class entre clases. Cada clase recibe un código
+    entero y la tabla se rellena bajo demanda, solo para los pares que se usan.
+    """
+    sim_calculator: LocalSemanticSimilarityCalculator
+    class_index: dict[str, int]
+    table: np.ndarray
+
+    def __init__(self, sim_calculator: LocalSemanticSimilarityCalculator):
+        self.sim_calculator = sim_calculator
+        self.class_index = {}
+        self.table = np.full((0, 0), np.nan)
+
+    def codes(self, classes: Iterable[str]) -> np.ndarray:
+        codes = [self.class_index.setdefault(class_id, len(self.class_index)) for class_id in classes]
+
+        size = len(self.class_index)
+        if size > self.table.shape[0]:
+            table = np.full((size, size), np.nan)
+            table[:self.table.shape[0], :self.table.shape[1]] = self.table
+            self.table = table
+
+        return np.array(codes, dtype=np.intp)
+
+    def fill(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Calcula los pares (fila, columna) que aún no están en la tabla y la devuelve completa.
+        """
+        classes = list(self.class_index)
+        rows, cols = np.unique(rows), np.unique(cols)
+        missing = np.isnan(self.table[np.ix_(rows, cols)])
+        for i, j in zip(*np.nonzero(missing)):
+            row, col = rows[i], cols[j]
+            self.table[row, col] = self.sim_calculator.path_similarity_class(classes[row], classes[col])
+        return self.table
+
+    def fill_all(self) -> np.ndarray:
+        """
+        Calcula la tabla completa para todas las clases con código, de una sola vez.
+        """
+        classes = list(self.class_index)
+        self.table[:len(classes), :len(classes)] = np.array(self.sim_calculator.path_similarity_class_matrix(classes), dtype=float).reshape(len(classes), len(classes))
+        return self.table
+
+def _pad(sequences: list[np.ndarray]):
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.intp)
+    padded = np.zeros((len(sequences), lengths.max(initial=0)), dtype=np.intp)
+    for i, sequence in enumerate(sequences):
+        padded[i, :len(sequence)] = sequence
+    return padded, lengths
+
+def batch_best_similarity(A: list[np.ndarray], B: list[np.ndarray], table: np.ndarray) -> np.ndarray:
+    """
+    Calcula el score de best_similarity (sin penalización) para todos los pares de secuencias
+    de A y B a la vez.
+
+    Args:
+        A (list[np.ndarray]): Secuencias de códigos de clase (filas de table).
+        B (list[np.ndarray]): Secuencias de códigos de clase (columnas de table).
+        table (np.ndarray): Similitud entre clases, table[a, b] = sim(a, b).
+
+    Returns:
+        np.ndarray: Matriz len(A) x len(B) con scores[k, c] = best_similarity(A[k], B[c], sim)[0].
+    """
+    a_codes, a_lengths = _pad(A)
+    b_codes, b_lengths = _pad(B)
+    n_a, n_b = len(A), len(B)
+
+    # dp[k, c, j]: mejor similitud con las i primeras clases de A[k] y las j primeras de B[c]
+    dp = np.zeros((n_a, n_b, b_codes.shape[1] + 1))
+    zeros = np.zeros((n_a, n_b, 1))
+
+    for i in range(a_codes.shape[1]):
+        sims = table[a_codes[:, i][:, None, None], b_codes[None, :, :]]
+        # Emparejar (i, j) o descartar el elemento i de A; descartar elementos de B es el máximo acumulado por la fila
+        row = np.maximum(dp[:, :, 1:], dp[:, :, :-1] + sims)
+        row = np.maximum.accumulate(np.concatenate([zeros, row], axis=2), axis=2)
+        # Las secuencias de A ya terminadas conservan su última fila
+        dp = np.where((i < a_lengths)[:, None, None], row, dp)
+
+    return dp[:, np.arange(n_b), b_lengths]
+
 def best_similarity(A: list[Any], B: list[Any], sim: Callable[[Any, Any], float],penalty: float = 0.0) -> tuple[float, list[tuple[int, int]]]:
     """
     Devuelve:
@@ -10,6 +10,14 @@ from common.models.event import Event, EventClass
 
 def story_builder(title: str, genre:str, events_data: dict[str, dict], places_dict: dict[str, list[str]], objects_dict: dict[str, list[str]], roles_dict: dict[str, list[str]], eventRetriever: EventRetriever):
 
+    # Atributos de todos los recursos seleccionados en una sola consulta
+    descriptions = eventRetriever.describe_resources([
+        *(uris[0] for uris in places_dict.values()),
+        *(uri for uris in objects_dict.values() for uri in uris),
+        *(uri for uris in roles_dict.values() for uri in uris),
+        *events_data
+    ])
+
     # ---------- PLACES ----------
     place_index_map: dict[str, int] = {}
     places: list[Place] = []
@@ -17,7 +25,7 @@ def story_builder(title: str, genre:str, events_data: dict[str, dict], places_di
     for place_id, uris in places_dict.items():
         uri = uris[0]
         place_class = PlaceClass(camel_to_snake(place_id))
-        place_label = title_case_to_snake_case(eventRetriever.get_label(uri))
+        place_label = title_case_to_snake_case(descriptions[uri].label)
         place = Place(class_name=place_class,instance_name=place_label)
         places.append(place)
         place_index_map[place_id] = len(place_index_map)
@@ -28,7 +36,7 @@ def story_builder(title: str, genre:str, events_data: dict[str, dict], places_di
     for obj_id, uris in objects_dict.items():
         for uri in uris:
             object_class = ObjectClass(camel_to_snake(obj_id))
-            object_label = title_case_to_snake_case(eventRetriever.get_label(uri))
+            object_label = title_case_to_snake_case(descriptions[uri].label)
             _object = Object(class_name=object_class,instance_name=object_label)
             objects.append(_object)
             object_index_map[obj_id].append(len(objects)- 1)
@@ -40,20 +48,18 @@ def story_builder(title: str, genre:str, events_data: dict[str, dict], places_di
     for role_id, uris in roles_dict.items():
         role_class = RoleClass(camel_to_snake(role_id))
         for uri in uris:
-            print(uri)
-            role_label = eventRetriever.get_role_labels(uri)
-            role_label = title_case_to_snake_case(role_label)
+            description = descriptions[uri]
+            role_label = title_case_to_snake_case(description.role_label)
             role = Role(class_name= role_class, instance_name= role_label)
 
-            agent_label = title_case_to_snake_case(eventRetriever.get_label(uri))
-            age_category = eventRetriever.get_age_category(uri)
+            agent_label = title_case_to_snake_case(description.label)
+            age_category = description.age_category
             age_category = age_category.split("/")[-1] # TODO
-            personality = eventRetriever.get_personality_traits(uri)
-            personality = [camel_to_snake(obj.split("/")[-1]) for obj in personality]
+            personality = [camel_to_snake(obj.split("/")[-1]) for obj in description.personality_traits]
 
-            name = eventRetriever.get_name(uri)
-            gender = eventRetriever.get_gender(uri)
-            agent_class_name = eventRetriever.get_type_name(uri)
+            name = description.name
+            gender = description.gender
+            agent_class_name = description.type_name
             agent_class = AgentClass(camel_to_snake(agent_class_name))
             agent = Agent(
                 class_name= agent_class,
@@ -74,7 +80,7 @@ def story_builder(title: str, genre:str, events_data: dict[str, dict], places_di
 
     events: list[Event] = []
     for event_uri, data in events_data.items():
-        event_type = eventRetriever.get_type_name(event_uri)
+        event_type = descriptions[event_uri].type_name
 
         place_id = data["place"]
         place_index = place_index_map.get(place_id)
@@ -91,7 +97,7 @@ def story_builder(title: str, genre:str, events_data: dict[str, dict], places_di
             object_indices.extend(object_index_map.get(obj_id, [])[:n])
         
         event_class = EventClass(camel_to_snake(event_type))
-        event_label = title_case_to_snake_case(eventRetriever.get_label(event_uri))
+        event_label = title_case_to_snake_case(descriptions[event_uri].label)
         event = Event(
             class_name=event_class,
             instance_name= event_label,
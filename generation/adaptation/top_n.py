@@ -0,0 +1,37 @@
+from operator import itemgetter
+from typing import Any
+import heapq
+
+class TopN:
+	"""
+	Conserva las n mayores entradas (score, uri) sin bloqueos.
+
+	Las entradas se guardan en un min-heap de heapq: la peor entrada está siempre en la
+	posición 0 y, con el heap lleno, heappushpop la descarta en O(log n). Los empates de score
+	se resuelven comparando el URI, de modo que el resultado no depende del orden de inserción.
+	"""
+	n: int
+	entries: list[tuple[float, Any]]
+
+	def __init__(self, n: int):
+		self.n = n
+		self.entries = []
+
+	def __len__(self):
+		return len(self.entries)
+
+	def push(self, entry: tuple[float, Any]):
+		if len(self.entries) < self.n:
+			heapq.heappush(self.entries, entry)
+		elif self.entries:
+			heapq.heappushpop(self.entries, entry)
+
+	def ascending(self):
+		return sorted(self.entries)
+
+	def descending(self):
+		"""
+		Entradas por score descendente; a igual score, por URI ascendente. Se ordena primero de
+		forma ascendente y después, de forma estable, solo por score.
+		"""
+		return sorted(self.ascending(), key=itemgetter(0), reverse=True)
@@ -0,0 +1,127 @@
+from generation.ontology.graph_retriever import GraphRetriever
+from contextlib import contextmanager, nullcontext
+from typing import Any, Optional
+from loguru import logger
+import json
+import time
+import os
+
+class SearchTracer:
+	"""
+	Registra contadores y tiempos de una búsqueda A*: expansiones, inserciones en la lista
+	abierta, tamaño de la lista, tiempo de heurística, tiempo de recuperación y tasas de
+	acierto de las cachés de los recuperadores.
+
+	Se activa pasando una instancia a ConstructiveAdaptation.generate. Sin tracer se usa
+	NULL_TRACER, cuyas operaciones no hacen nada.
+	"""
+	enabled: bool = True
+	counters: dict[str, int]
+	timers: dict[str, float]
+	max_values: dict[str, float]
+	trace_events: list[dict[str, Any]]
+	record_events: bool
+
+	def __init__(self, name: str = "search", retrievers: Optional[dict[str, GraphRetriever]] = None, record_events: bool = True):
+		self.name = name
+		self.counters = {}
+		self.timers = {}
+		self.max_values = {}
+		self.trace_events = []
+		self.record_events = record_events
+		self.retrievers = retrievers or {}
+		self._cache_start = {key: (r.hits, r.misses) for key, r in self.retrievers.items()}
+		self._start = time.perf_counter()
+		self._end: Optional[float] = None
+
+	def _timestamp(self, instant: float):
+		# Los eventos de Chrome trace usan microsegundos
+		return (instant - self._start) * 1e6
+
+	def count(self, name: str, value: int = 1):
+		self.counters[name] = self.counters.get(name, 0) + value
+
+	def sample(self, name: str, value: float):
+		self.max_values[name] = max(value, self.max_values.get(name, value))
+		if self.record_events:
+			self.trace_events.append({
+				"name": name, "ph": "C", "ts": self._timestamp(time.perf_counter()),
+				"pid": 0, "tid": 0, "args": {name: value}
+			})
+
+	@contextmanager
+	def span(self, name: str):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			end = time.perf_counter()
+			self.timers[name] = self.timers.get(name, 0.0) + (end - start)
+			if self.record_events:
+				self.trace_events.append({
+					"name": name, "ph": "X", "ts": self._timestamp(start),
+					"dur": (end - start) * 1e6, "pid": 0, "tid": 0
+				})
+
+	def finish(self):
+		self._end = time.perf_counter()
+
+	def cache_stats(self):
+		stats = {}
+		for key, retriever in self.retrievers.items():
+			start_hits, start_misses = self._cache_start[key]
+			hits = retriever.hits - start_hits
+			misses = retriever.misses - start_misses
+			total = hits + misses
+			stats[key] = {
+				"hits": hits,
+				"misses": misses,
+				"hit_rate": hits / total if total else 0.0
+			}
+		return stats
+
+	def summary(self):
+		end = self._end if self._end is not None else time.perf_counter()
+		return {
+			"name": self.name,
+			"elapsed": end - self._start,
+			"counters": dict(self.counters),
+			"timers": dict(self.timers),
+			"max": dict(self.max_values),
+			"caches": self.cache_stats()
+		}
+
+	def save(self, path: str, chrome_trace_path: Optional[str] = None):
+		"""
+		Guarda el resumen en JSON y, opcionalmente, los eventos en formato Chrome trace
+		(se pueden abrir en chrome://tracing o Perfetto).
+		"""
+		os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump(self.summary(), f, ensure_ascii=False, indent=4)
+
+		if chrome_trace_path is not None:
+			os.makedirs(os.path.dirname(chrome_trace_path) or ".", exist_ok=True)
+			with open(chrome_trace_path, "w", encoding="utf-8") as f:
+				json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+		logger.debug(f"Search trace saved. Filename: {os.path.basename(path)}.")
+
+class NullTracer:
+	"""Tracer desactivado: todas las operaciones son no-ops."""
+	enabled: bool = False
+	_span = nullcontext()
+
+	def count(self, name: str, value: int = 1):
+		pass
+
+	def sample(self, name: str, value: float):
+		pass
+
+	def span(self, name: str):
+		return self._span
+
+	def finish(self):
+		pass
+
+NULL_TRACER = NullTracer()
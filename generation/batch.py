@@ -0,0 +1,213 @@
+from generation.pipeline import GenerationPipeline, GenerationResult
+from generation.adaptation.query import Query
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from pydantic import ValidationError
+from typing import Optional, Iterable, Iterator, TextIO
+from loguru import logger
+import multiprocessing
+import json
+import time
+import os
+
+# Pipeline compartido por los procesos del pool. Se asigna antes de crear el pool para
+# que los procesos hijos lo hereden con fork (copy-on-write) en lugar de serializarlo.
+_pipeline: Optional[GenerationPipeline] = None
+
+def _run_query(query: Query) -> GenerationResult:
+	assert _pipeline is not None, "Pipeline not initialized in worker."
+	return _pipeline.run(query)
+
+def create_worker_pool(pipeline: GenerationPipeline, workers: int) -> ProcessPoolExecutor:
+	"""
+	Crea un pool de procesos (fork) que heredan el pipeline ya calentado y ejecutan _run_query.
+	El pipeline queda asignado hasta que se llame a release_worker_pool.
+	"""
+	global _pipeline
+
+	# Los índices y la tabla de similitud se construyen antes del fork para que todos los procesos los hereden
+	pipeline.warm_up()
+	_pipeline = pipeline
+	context = multiprocessing.get_context("fork")
+	return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def submit_query(executor: ProcessPoolExecutor, query: Query) -> Future:
+	"""
+	Envía una consulta a un pool creado con create_worker_pool.
+	"""
+	return executor.submit(_run_query, query)
+
+def release_worker_pool(executor: ProcessPoolExecutor):
+	global _pipeline
+
+	executor.shutdown()
+	_pipeline = None
+
+def generate_batch(pipeline: GenerationPipeline, queries: Iterable[Query], workers: int = 1) -> list[GenerationResult]:
+	"""
+	Genera un cuento por cada consulta compartiendo el grafo, el EventRetriever y la caché de similitud.
+
+	Con workers > 1 las consultas se reparten entre procesos creados con fork, que heredan el
+	estado ya calentado del pipeline y lo reutilizan en todas las consultas que procesan.
+
+	Args:
+		pipeline (GenerationPipeline): Pipeline con el grafo y los recuperadores ya construidos.
+		queries (Iterable[Query]): Consultas a resolver.
+		workers (int): Número de procesos. Con 1 se ejecuta en el proceso actual.
+
+	Returns:
+		list[GenerationResult]: Resultados en el mismo orden que las consultas, con sus tiempos.
+	"""
+	queries = list(queries)
+	start = time.perf_counter()
+
+	if workers <= 1 or len(queries) <= 1:
+		results = [pipeline.run(query) for query in queries]
+	else:
+		executor = create_worker_pool(pipeline, min(workers, len(queries)))
+		try:
+			results = list(executor.map(_run_query, queries))
+		finally:
+			release_worker_pool(executor)
+
+	elapsed = time.perf_counter() - start
+	for result in results:
+		logger.debug(f"Query '{result.title}' generated in {result.timings.get('total', 0):.2f}s.")
+	logger.info(f"Batch of {len(queries)} queries generated in {elapsed:.2f}s with {workers} workers.")
+
+	return results
+
+def _completed_ids(path: str) -> set[int]:
+	"""
+	Identificadores de secuencia ya escritos en un JSONL de resultados. Las líneas que no se
+	pueden leer se ignoran (sus consultas se vuelven a generar). Si la última línea quedó a
+	medias por una interrupción, se recorta para poder seguir escribiendo a continuación.
+	"""
+	if not os.path.exists(path):
+		return set()
+
+	completed: set[int] = set()
+	valid_size = 0
+	with open(path, "rb") as f:
+		for line_number, line in enumerate(f):
+			if not line.endswith(b"\n"):
+				break
+			valid_size += len(line)
+			try:
+				completed.add(int(json.loads(line)["id"]))
+			except (ValueError, KeyError, TypeError):
+				logger.warning(f"Skipping unreadable result at line {line_number} of {os.path.basename(path)}.")
+
+	if valid_size < os.path.getsize(path):
+		logger.warning(f"Truncating incomplete results in {os.path.basename(path)}.")
+		with open(path, "r+b") as f:
+			f.truncate(valid_size)
+
+	return completed
+
+def _read_queries(path: str, skip: set[int]) -> Iterator[tuple[int, Query]]:
+	# El identificador de secuencia es el número de línea (desde 0) de la consulta en el fichero
+	with open(path, "r", encoding="utf-8") as f:
+		for sequence_id, line in enumerate(f):
+			if sequence_id in skip or not line.strip():
+				continue
+			try:
+				yield sequence_id, Query.model_validate_json(line)
+			except ValidationError as e:
+				logger.error(f"Invalid query at line {sequence_id}: {e}")
+
+def _write_result(output: TextIO, sequence_id: int, result: GenerationResult):
+	record = {"id": sequence_id, **result.model_dump(mode="json")}
+	output.write(json.dumps(record, ensure_ascii=False) + "\n")
+	output.flush()
+
+def _drain(pending: dict[Future, tuple[int, Query]], output: TextIO) -> tuple[int, bool]:
+	"""
+	Escribe los resultados de las consultas que terminen.
+
+	Returns:
+		tuple[int, bool]: Resultados escritos y si el pool se ha roto (un proceso murió).
+	"""
+	done, _ = wait(pending, return_when=FIRST_COMPLETED)
+	written = 0
+	broken = False
+	for future in done:
+		sequence_id, query = pending.pop(future)
+		try:
+			result = future.result()
+		except BrokenProcessPool:
+			broken = True
+			continue
+		except Exception as e:
+			# No se escribe: al retomar se volverá a intentar
+			logger.error(f"Query {sequence_id} ('{query.title}') failed: {e}")
+			continue
+		_write_result(output, sequence_id, result)
+		written += 1
+	return written, broken
+
+def generate_jsonl(pipeline: GenerationPipeline, queries_path: str, output_path: str, workers: int = 1) -> int:
+	"""
+	Genera un cuento por cada consulta de un fichero JSONL y escribe los resultados en otro JSONL.
+
+	Las consultas se leen de forma incremental y se reparten entre procesos (fork) que comparten
+	el grafo ya construido. Cada resultado se escribe en cuanto termina, por orden de finalización,
+	junto con su identificador de secuencia (número de línea de la consulta). Si el fichero de
+	salida ya existe se retoma: se omiten las consultas cuyo identificador ya está escrito.
+
+	Args:
+		pipeline (GenerationPipeline): Pipeline con el grafo y los recuperadores ya construidos.
+		queries_path (str): Fichero JSONL con una Query por línea.
+		output_path (str): Fichero JSONL de resultados.
+		workers (int): Número de procesos. Con 1 se ejecuta en el proceso actual.
+
+	Returns:
+		int: Número de resultados escritos en esta ejecución.
+	"""
+	completed = _completed_ids(output_path)
+	if completed:
+		logger.info(f"Resuming: {len(completed)} queries already generated.")
+
+	os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+	queries = _read_queries(queries_path, completed)
+	written = 0
+	start = time.perf_counter()
+
+	with open(output_path, "a", encoding="utf-8") as output:
+		if workers <= 1:
+			for sequence_id, query in queries:
+				try:
+					result = pipeline.run(query)
+				except Exception as e:
+					logger.error(f"Query {sequence_id} ('{query.title}') failed: {e}")
+					continue
+				_write_result(output, sequence_id, result)
+				written += 1
+		else:
+			executor = create_worker_pool(pipeline, workers)
+			broken = False
+			try:
+				# Se mantienen como mucho dos consultas por proceso en vuelo para no leer todo el fichero
+				pending: dict[Future, tuple[int, Query]] = {}
+				for item in queries:
+					if len(pending) >= 2 * workers:
+						drained, broken = _drain(pending, output)
+						written += drained
+						if broken:
+							break
+					pending[executor.submit(_run_query, item[1])] = item
+				while pending and not broken:
+					drained, broken = _drain(pending, output)
+					written += drained
+			except BrokenProcessPool:
+				broken = True
+			finally:
+				release_worker_pool(executor)
+
+			if broken:
+				# Un proceso del pool murió (por ejemplo, por falta de memoria): el pool ya no sirve,
+				# pero los resultados escritos son válidos y la ejecución se puede retomar.
+				logger.error(f"A worker process terminated abruptly. {written} results were written to {output_path}; run again with the same output file to resume.")
+
+	logger.info(f"{written} queries generated in {time.perf_counter() - start:.2f}s with {workers} workers.")
+	return written
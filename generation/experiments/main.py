@@ -1,9 +1,4 @@
-from generation.ontology.event_retriever import EventRetriever
-from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
-from generation.adaptation.astar import ConstructiveAdaptation
 from generation.adaptation.query import Query
-from generation.adaptation.alignment import process_events, print_dict, process_roles, process_objects, process_places, print_selected_uris, build_unique_uri_dict
-from generation.adaptation.story_builder import story_builder
 from generation.adaptation.alignment import dataframe_alignment_table
 from generation.adaptation.similarity import best_similarity
 from common.utils.loader import load_json_folder, data_dir, out_dir
@@ -11,6 +6,8 @@ from common.models.folktale import AnnotatedFolktale
 from common.models.event import MIN_EVENTS
 import generation.experiments.loader as loader
 from generation.ontology.folktale_graph import create_graph
+from generation.pipeline import GenerationPipeline
+from generation.batch import generate_batch
 from loguru import logger
 
 def main():
@@ -37,58 +34,31 @@ def main():
         render_html=False
     )
     
-    event_retriever = EventRetriever(graph)
-    sim_calculator = LocalSemanticSimilarityCalculator(graph)
+    pipeline = GenerationPipeline(graph, top_n=10)
+    sim_calculator = pipeline.sim_calculator
 
-    weights = {
-        "genre": 0.13,
-        "event": 0.52,
-        "role": 0.18,
-        "place": 0.10,
-        "object": 0.07
-    }
-
-    constructive_adaptation = ConstructiveAdaptation(graph, weights, event_retriever, sim_calculator, top_n= 10)
+    def sim(class1_id: str, class2_id: str):
+        return sim_calculator.path_similarity_class(class1_id, class2_id) * 2
 
     queries = load_json_folder(loader.query_dir)
-    r = []
-    for query in queries.values():
-        query = Query.model_validate(query)
-
-        logger.info(query)
-
-        goal_node = constructive_adaptation.generate(query, query.max_events)
-        if goal_node is not None:
-            places, objects, roles = process_events(goal_node.event_elements, event_retriever)
-            print(query.genre)
-            process_roles(query.genre, roles, event_retriever, sim_calculator)
-            process_objects(query.genre, objects,event_retriever, sim_calculator)
-            process_places(query.genre, places,event_retriever, sim_calculator)
+    queries = [Query.model_validate(query) for query in queries.values()]
 
-            # print_dict("places", places)
-            # print_dict("objects", objects)
-            # print_dict("roles", roles)
+    results = generate_batch(pipeline, queries, workers=len(queries))
 
-            places_dict = build_unique_uri_dict(places)
-            objects_dict = build_unique_uri_dict(objects)
-            roles_dict = build_unique_uri_dict(roles)
-
-            # print_selected_uris("Places", places_dict)
-            # print_selected_uris("Objects", objects_dict)
-            # print_selected_uris("Roles", roles_dict)
-
-            folktale = story_builder(query.title,query.genre, goal_node.event_elements, places_dict, objects_dict, roles_dict, event_retriever)
-            
-            goal_events =  [event_retriever.get_type_name(event_uri) for event_uri in goal_node.events]
+    r = []
+    for query, result in zip(queries, results):
+        logger.info(query)
 
-            def sim(class1_id: str, class2_id: str):
-                return sim_calculator.path_similarity_class(class1_id, class2_id) * 2
+        if result.folktale is not None:
+            goal_events = result.events
 
             score, pairs = best_similarity(query.events, goal_events,sim)
             score = score / (len(goal_events) + len(query.events))
             print(f"Score: {score}")
             df = dataframe_alignment_table(query.events, goal_events,pairs)
             print(df)
+            print(f"Timings: {result.timings}")
+            print(f"Heuristic memo hit rate: {result.heuristic_memo_hit_rate:.2%}")
             r.append((query.title,score,df))
         
     for title,score,df in r:
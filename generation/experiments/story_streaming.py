@@ -0,0 +1,31 @@
+from generation.story_generator import StoryStream, generate_story
+from generation.utils.loader import load_generation_examples
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from loguru import logger
+import io
+
+# Compara la espera hasta ver la historia con y sin streaming, sin conexión, con un modelo
+# falso que emite un carácter cada `TOKEN_LATENCY` segundos.
+TOKEN_LATENCY = 0.01
+RESPONSE = "  Once upon a time, a hare mocked a tortoise for being slow. The tortoise challenged him to a race...  "
+
+def main():
+    examples = load_generation_examples()
+    folktale = examples[0][0]
+
+    model = FakeListChatModel(responses=[RESPONSE], sleep=TOKEN_LATENCY)
+
+    file = io.StringIO()
+    stream = StoryStream(folktale, examples, model=model, file=file)
+    chunks = list(stream)
+    # Sin streaming no se ve nada hasta que llega el último token
+    logger.info(f"Blocking: first text after {stream.metrics.elapsed:.2f}s")
+    logger.info(f"Streaming: first text after {stream.metrics.ttft:.2f}s, {stream.metrics.tokens} tokens at {stream.metrics.tokens_per_second:.1f} tokens/s ({len(chunks)} chunks)")
+
+    story = generate_story(folktale, examples, model=model)
+
+    assert stream.story == story, "The streamed story differs from the blocking one."
+    assert file.getvalue().rstrip() == story, "The written story differs from the returned one."
+
+if __name__ == "__main__":
+    main()
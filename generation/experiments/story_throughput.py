@@ -0,0 +1,32 @@
+from generation.story_generator import generate_stories, generate_story
+from generation.utils.loader import load_generation_examples
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from loguru import logger
+import asyncio
+import time
+
+# Mide el rendimiento de la generación de historias sin conexión, con un modelo falso que
+# tarda `LATENCY` segundos en responder a cada petición.
+LATENCY = 0.5
+N_STORIES = 32
+
+def main():
+    examples = load_generation_examples()
+    folktales = [examples[0][0]] * N_STORIES
+
+    model = FakeListChatModel(responses=["Once upon a time..."], sleep=LATENCY)
+
+    start = time.perf_counter()
+    for folktale in folktales[:4]:
+        generate_story(folktale, examples, model=model)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Sequential: {4 / elapsed:.2f} stories/s")
+
+    for concurrency in (1, 4, 16):
+        start = time.perf_counter()
+        stories = asyncio.run(generate_stories(folktales, examples, concurrency=concurrency, model=model))
+        elapsed = time.perf_counter() - start
+        logger.info(f"Concurrency {concurrency}: {len(stories) / elapsed:.2f} stories/s ({sum(story is not None for story in stories)} generated)")
+
+if __name__ == "__main__":
+    main()
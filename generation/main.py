@@ -1,38 +1,42 @@
-from generation.ontology.event_retriever import EventRetriever
-from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
-from generation.adaptation.astar import ConstructiveAdaptation
 from generation.adaptation.query import Query
-from generation.adaptation.alignment import process_events, print_dict, process_roles, process_objects, process_places, print_selected_uris, build_unique_uri_dict
-from generation.adaptation.story_builder import story_builder
-from common.utils.loader import load_json_folder, data_dir, out_dir, load_json, load_txt_folder
+from generation.pipeline import GenerationPipeline
+from common.utils.loader import load_json_folder, data_dir, out_dir, load_json
 from common.utils.regex_utils import clean_regex, title_case_to_snake_case
 from generation.ontology.folktale_graph import create_graph
 import generation.utils.sbc_tools as sbc
 from loguru import logger
 from dotenv import load_dotenv
-from generation.story_generator import generate_story
+from generation.story_generator import generate_story, StoryStream
 from common.models.folktale import AnnotatedFolktale
 from common.models.event import MIN_EVENTS
-from generation.utils.loader import save_annotated_folktale, save_raw_folktale
+from generation.utils.loader import save_annotated_folktale, save_raw_folktale, open_raw_folktale, load_generation_examples
+from generation.batch import generate_jsonl
+from generation.utils.story_cache import StoryCache
+import argparse
+import sys
 import re
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Genera cuentos estructurados a partir de consultas.")
+    parser.add_argument("--queries", help="Fichero JSONL con una consulta por línea. Sin él se usa ./query.json.")
+    parser.add_argument("--output", default="./generation/out/generated.jsonl", help="Fichero JSONL de resultados (se retoma si ya existe).")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de generación en modo JSONL.")
+    parser.add_argument("--stream", action="store_true", help="Muestra la historia a medida que se genera.")
+    parser.add_argument("--no-cache", action="store_true", help="Genera la historia con el modelo aunque ya esté en la caché.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     load_dotenv()
 
     folktales = []
 
-    raw_examples = load_txt_folder(f"{data_dir}/examples/raw")
-
     examples = load_json_folder(f"{data_dir}/examples/annotated")
     examples = {filename: AnnotatedFolktale(**folktale) for filename, folktale in examples.items()}
 
     folktales.extend(examples.values())
 
-    keys = ["the_hare_and_the_tortoise"]
-    generation_examples = [
-        (examples[key], "\n".join(raw_examples[key].splitlines()[1:]))
-        for key in keys
-    ]
+    generation_examples = load_generation_examples(["the_hare_and_the_tortoise"])
     
     out = load_json_folder(out_dir)
     out = [AnnotatedFolktale(**folktale) for folktale in out.values()]
@@ -47,51 +51,38 @@ def main():
         render_html=False
     )
     
-    event_retriever = EventRetriever(graph)
-    sim_calculator = LocalSemanticSimilarityCalculator(graph)
-
-    weights = {
-        "genre": 0.13,
-        "event": 0.52,
-        "role": 0.18,
-        "place": 0.10,
-        "object": 0.07
-    }
+    if args.queries is not None:
+        pipeline = GenerationPipeline(graph, top_n=5)
+        generate_jsonl(pipeline, args.queries, args.output, args.workers)
+        return
 
-    constructive_adaptation = ConstructiveAdaptation(graph, weights, event_retriever, sim_calculator, top_n = 5)
+    pipeline = GenerationPipeline(graph, top_n=5, verbose=True)
 
     query_json = load_json("./query.json")
     query = Query.model_validate(query_json)
 
     logger.info(query)
 
-    goal_node = constructive_adaptation.generate(query, query.max_events)
-
-    if goal_node is not None:
-        places, objects, roles = process_events(goal_node.event_elements, event_retriever)
-        process_roles(query.genre, roles, event_retriever, sim_calculator)
-        process_objects(query.genre, objects,event_retriever, sim_calculator)
-        process_places(query.genre, places,event_retriever, sim_calculator)
-
-        print_dict("places", places)
-        print_dict("objects", objects)
-        print_dict("roles", roles)
+    result = pipeline.run(query)
 
-        places_dict = build_unique_uri_dict(places)
-        objects_dict = build_unique_uri_dict(objects)
-        roles_dict = build_unique_uri_dict(roles)
-
-        print_selected_uris("Places", places_dict)
-        print_selected_uris("Objects", objects_dict)
-        print_selected_uris("Roles", roles_dict)
-
-        folktale = story_builder(query.title, query.genre, goal_node.event_elements, places_dict, objects_dict, roles_dict, event_retriever)
-
-        story = generate_story(folktale, generation_examples)
+    if result.folktale is not None:
+        folktale = result.folktale
 
         filename = re.sub(clean_regex, "", folktale.title)
         filename = title_case_to_snake_case(filename)
-        save_raw_folktale(story, filename)
+
+        if args.stream:
+            with open_raw_folktale(filename) as f:
+                stream = StoryStream(folktale, generation_examples, file=f)
+                for chunk in stream:
+                    sys.stdout.write(chunk)
+                    sys.stdout.flush()
+            print()
+            logger.info(f"Time to first token: {stream.metrics.ttft or 0.0:.2f}s, {stream.metrics.tokens_per_second:.1f} tokens/s.")
+        else:
+            cache = None if args.no_cache else StoryCache()
+            story = generate_story(folktale, generation_examples, cache=cache)
+            save_raw_folktale(story, filename)
 
         save_annotated_folktale(folktale, filename)
 
@@ -0,0 +1,114 @@
+from generation.ontology.namespaces import ONT
+from generation.ontology.graph_retriever import GraphRetriever
+from rdflib.namespace import RDF
+from rdflib import Graph
+from typing import Literal, Iterator
+import numpy as np
+
+EntityKind = Literal["agent", "object", "place"]
+
+# Patrón que relaciona un evento (?event) con una entidad (?entity) y su clase (?class)
+ENTITY_CLASS_PATTERNS: dict[EntityKind, str] = {
+	"agent": "?event ont:hasAgent ?entity . ?entity ont:hasRole ?role . ?role rdf:type ?class .",
+	"object": "?event ont:hasObject ?entity . ?entity rdf:type ?class .",
+	"place": "?event ont:hasPlace ?entity . ?entity rdf:type ?class ."
+}
+
+class EntitySequences:
+	"""
+	Entidades de una misma clase y género con su secuencia ordenada de tipos de evento.
+
+	Las secuencias se guardan concatenadas en un único array de enteros (códigos de tipo de
+	evento) y se delimitan con offsets: la entidad i ocupa codes[offsets[i]:offsets[i + 1]].
+	"""
+	uris: list[str]
+	codes: np.ndarray
+	offsets: np.ndarray
+	event_types: list[str]
+
+	def __init__(self, uris: list[str], sequences: list[list[int]], event_types: list[str]):
+		self.uris = uris
+		self.event_types = event_types
+		lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+		self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+		self.codes = np.fromiter((code for sequence in sequences for code in sequence), dtype=np.int32, count=int(self.offsets[-1]))
+
+	def __len__(self):
+		return len(self.uris)
+
+	def codes_of(self, i: int) -> np.ndarray:
+		return self.codes[self.offsets[i]:self.offsets[i + 1]]
+
+	def types_of(self, i: int) -> list[str]:
+		return [self.event_types[code] for code in self.codes_of(i)]
+
+	def __iter__(self) -> Iterator[tuple[str, list[str]]]:
+		for i, uri in enumerate(self.uris):
+			yield uri, self.types_of(i)
+
+class EntitySequenceIndex(GraphRetriever):
+	"""
+	Índice (tipo de entidad, clase, género) → entidades con su secuencia ordenada de tipos de evento.
+
+	Se construye una vez por grafo con una consulta agrupada por tipo de entidad (agentes por
+	clase de rol, objetos y lugares), ordenando los eventos por ont:sequenceIndex. Con él, el
+	rellenado de roles, objetos y lugares no necesita consultar el grafo.
+	"""
+	event_types: list[str]
+	type_index: dict[str, int]
+	groups: dict[tuple[EntityKind, str, str], EntitySequences]
+
+	def __init__(self, graph: Graph):
+		super().__init__(graph)
+		self._build()
+
+	def __len__(self):
+		return len(self.groups)
+
+	def _rows(self, kind: EntityKind):
+		query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?entity ?class ?genre ?event ?eventType ?position
+		WHERE {{
+			?folktale a ont:Folktale ;
+					ont:hasGenre ?genre ;
+					ont:hasEvent ?event .
+			{ENTITY_CLASS_PATTERNS[kind]}
+			?event rdf:type ?eventType ;
+				ont:sequenceIndex ?position .
+			FILTER(STRSTARTS(STR(?class), STR(ont:)))
+		}}
+		"""
+		return self.execute_query(query)
+
+	def _build(self):
+		rows = {kind: self._rows(kind) for kind in ENTITY_CLASS_PATTERNS}
+
+		self.event_types = sorted({str(row.eventType).split("/")[-1] for kind_rows in rows.values() for row in kind_rows})
+		self.type_index = {event_type: i for i, event_type in enumerate(self.event_types)}
+
+		events: dict[tuple[EntityKind, str, str], dict[str, list[tuple[int, int]]]] = {}
+		for kind, kind_rows in rows.items():
+			for row in kind_rows:
+				key = (kind, str(row["class"]).split("/")[-1], str(row.genre))
+				code = self.type_index[str(row.eventType).split("/")[-1]]
+				events.setdefault(key, {}).setdefault(str(row.entity), []).append((int(row.position), code))
+
+		self.groups = {}
+		for key, entities in events.items():
+			uris = sorted(entities)
+			# Los eventos con varios tipos aportan uno por tipo, en orden alfabético dentro de su posición
+			sequences = [[code for _, code in sorted(entities[uri])] for uri in uris]
+			self.groups[key] = EntitySequences(uris, sequences, self.event_types)
+
+	def get(self, kind: EntityKind, class_id: str, genre) -> EntitySequences:
+		"""
+		Returns:
+			EntitySequences: Entidades de la clase y el género indicados (vacío si no hay ninguna).
+		"""
+		group = self.groups.get((kind, class_id, str(genre)))
+		if group is None:
+			return EntitySequences([], [], self.event_types)
+		return group
@@ -0,0 +1,144 @@
+from generation.ontology.namespaces import ONT
+from generation.ontology.graph_retriever import GraphRetriever
+from rdflib.namespace import RDF, RDFS
+from rdflib import Graph
+from typing import Optional
+import numpy as np
+
+class EventFeatureIndex(GraphRetriever):
+	"""
+	Características precalculadas de todos los eventos del grafo: tipo, clase del lugar,
+	clases de roles, clases de objetos y género del cuento al que pertenecen.
+
+	Se construye con unas pocas consultas agrupadas en lugar de varias consultas por evento,
+	y guarda las características como arrays de NumPy indexados por posición de evento.
+	"""
+	events: list[str]
+	event_index: dict[str, int]
+	types: list[Optional[str]]
+	places: list[Optional[str]]
+	genres: list[Optional[str]]
+	role_classes: list[str]
+	object_classes: list[str]
+	role_counts: np.ndarray
+	object_counts: np.ndarray
+
+	def __init__(self, graph: Graph):
+		super().__init__(graph)
+		self._build()
+
+	def __len__(self):
+		return len(self.events)
+
+	def __contains__(self, event_uri: str):
+		return event_uri in self.event_index
+
+	def _first_value_by_event(self, query: str, value: str):
+		values: dict[str, str] = {}
+		for row in self.execute_query(query):
+			values.setdefault(str(row.event), str(getattr(row, value)))
+		return values
+
+	def _min_value_by_event(self, query: str, value: str):
+		values: dict[str, str] = {}
+		for row in self.execute_query(query):
+			event, row_value = str(row.event), str(getattr(row, value))
+			values[event] = min(values.get(event, row_value), row_value)
+		return values
+
+	def _counts_by_event(self, query: str, value: str):
+		counts: dict[str, dict[str, int]] = {}
+		for row in self.execute_query(query):
+			class_id = str(getattr(row, value)).split('/')[-1]
+			counts.setdefault(str(row.event), {})[class_id] = int(row.number)
+		return counts
+
+	@staticmethod
+	def _count_matrix(events: list[str], counts: dict[str, dict[str, int]]):
+		classes = sorted({class_id for event_counts in counts.values() for class_id in event_counts})
+		class_index = {class_id: i for i, class_id in enumerate(classes)}
+		matrix = np.zeros((len(events), len(classes)), dtype=np.int32)
+		for i, event in enumerate(events):
+			for class_id, count in counts.get(event, {}).items():
+				matrix[i, class_index[class_id]] = count
+		return classes, matrix
+
+	def _build(self):
+		type_query = f"""
+		PREFIX rdfs: <{RDFS}>
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?event ?type
+		WHERE {{
+			?event rdf:type ?eventClass .
+			?eventClass rdfs:subClassOf* ont:Event .
+			?event rdf:type ?type .
+			FILTER(STRSTARTS(STR(?type), STR(ont:)))
+		}}
+		"""
+
+		place_query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?event ?placeClass
+		WHERE {{
+			?event ont:hasPlace ?place .
+			?place rdf:type ?placeClass .
+		}}
+		"""
+
+		genre_query = f"""
+		PREFIX rdfs: <{RDFS}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?event ?genreLabel
+		WHERE {{
+			?folktale ont:hasEvent ?event .
+			?folktale ont:hasGenre ?genre .
+			?genre rdfs:label ?genreLabel .
+		}}
+		"""
+
+		role_query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT ?event ?roleClass (COUNT(?role) AS ?number)
+		WHERE {{
+			?event ont:hasAgent ?agent .
+			?agent ont:hasRole ?role .
+			?role rdf:type ?roleClass .
+		}}
+		GROUP BY ?event ?roleClass
+		"""
+
+		object_query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT ?event ?objectClass (COUNT(?object) AS ?number)
+		WHERE {{
+			?event ont:hasObject ?object .
+			?object rdf:type ?objectClass .
+		}}
+		GROUP BY ?event ?objectClass
+		"""
+
+		# Si un evento tiene varios tipos, el mismo que elige EventRetriever.get_type_name
+		types = self._min_value_by_event(type_query, "type")
+		places = self._first_value_by_event(place_query, "placeClass")
+		genres = self._first_value_by_event(genre_query, "genreLabel")
+
+		self.events = list(types)
+		self.event_index = {event: i for i, event in enumerate(self.events)}
+		self.types = [types[event].split('/')[-1] for event in self.events]
+		self.places = [places[event].split('/')[-1] if event in places else None for event in self.events]
+		self.genres = [genres.get(event) for event in self.events]
+
+		self.role_classes, self.role_counts = self._count_matrix(self.events, self._counts_by_event(role_query, "roleClass"))
+		self.object_classes, self.object_counts = self._count_matrix(self.events, self._counts_by_event(object_query, "objectClass"))
+
+	def indices(self, event_uris: list[str]):
+		return np.fromiter((self.event_index[uri] for uri in event_uris), dtype=np.intp, count=len(event_uris))
@@ -2,6 +2,18 @@ from generation.ontology.namespaces import ONT,WD
 from rdflib.namespace import RDF, RDFS
 from generation.ontology.graph_retriever import GraphRetriever
 from rdflib import Graph
+from pydantic import BaseModel, Field
+from typing import Iterable, Optional
+
+class ResourceDescription(BaseModel):
+	"""Atributos de un recurso (agente, lugar, objeto o evento) usados para construir un cuento."""
+	label: Optional[str] = None
+	type_name: Optional[str] = None
+	gender: Optional[str] = None
+	name: Optional[str] = None
+	age_category: Optional[str] = None
+	role_label: Optional[str] = None
+	personality_traits: list[str] = Field(default_factory=list)
 
 class EventRetriever(GraphRetriever):
 	def __init__(self, graph: Graph):
@@ -100,6 +112,7 @@ class EventRetriever(GraphRetriever):
 			<{event_uri}> ont:hasPlace ?place .
 			?place rdf:type ?placeClass .
 		}}
+		ORDER BY ?placeClass
 		LIMIT 1
 		"""
 
@@ -124,6 +137,7 @@ class EventRetriever(GraphRetriever):
 			?object rdf:type ?objectClass .
 		}}
 		GROUP BY ?objectClass
+		ORDER BY ?objectClass
 		"""
 
 		results = self.execute_query(query)
@@ -151,6 +165,7 @@ class EventRetriever(GraphRetriever):
 			?role rdf:type ?roleClass .
 		}}
 		GROUP BY ?roleClass
+		ORDER BY ?roleClass
 		"""
 
 		results = self.execute_query(query)
@@ -203,12 +218,13 @@ class EventRetriever(GraphRetriever):
 			?role rdf:type ?roleClass .
 		}}
 		GROUP BY ?roleClass
+		ORDER BY ?roleClass
 		"""
 
 		results = self.execute_query(query)
 
 		if results:
-			dict_result = {str(result.roleClass).split('/')[-1]: (int(result.roleCount), [agent_uri.strip() for agent_uri in str(result.agents).split(separator)]) for result in results}
+			dict_result = {str(result.roleClass).split('/')[-1]: (int(result.roleCount), sorted(agent_uri.strip() for agent_uri in str(result.agents).split(separator))) for result in results}
 			return dict_result
 		return {}
 
@@ -224,12 +240,13 @@ class EventRetriever(GraphRetriever):
 			?object rdf:type ?objectClass .
 		}}
 		GROUP BY ?objectClass
+		ORDER BY ?objectClass
 		"""
 
 		results = self.execute_query(query)
 
 		if results:
-			dict_result = {str(result.objectClass).split('/')[-1]: (int(result.objectCount),[obj_uri.strip() for obj_uri in str(result.objects).split(separator)]) for result in results}
+			dict_result = {str(result.objectClass).split('/')[-1]: (int(result.objectCount),sorted(obj_uri.strip() for obj_uri in str(result.objects).split(separator))) for result in results}
 			return dict_result
 
 		return {}
@@ -245,6 +262,7 @@ class EventRetriever(GraphRetriever):
 			<{event_uri}> ont:hasPlace ?place .
 			?place rdf:type ?placeClass .
 		}}
+		ORDER BY ?placeClass ?place
 		LIMIT 1
 		"""
 
@@ -354,94 +372,6 @@ class EventRetriever(GraphRetriever):
 			for row in results
 		]
 
-	def get_ordered_events_for_agent(self, agent_uri):
-		query = f"""
-		PREFIX rdfs: <{RDFS}>
-				PREFIX rdf: <{RDF}>
-		PREFIX ont: <{ONT}>
-
-		SELECT ?event ?label ?eventType (COUNT(?prev) AS ?order)
-		WHERE {{
-			?event ont:hasAgent <{agent_uri}> ;
-				rdf:type ?eventType .
-			OPTIONAL {{ ?event rdfs:label ?label }}
-
-			OPTIONAL {{
-				?prev ont:postEvent+ ?event .
-			}}
-		}}
-		GROUP BY ?event ?label
-		ORDER BY ?order
-		"""
-		results = self.execute_query(query)
-
-		return [
-			(str(r.eventType.split("/")[-1]),str(r.event), str(r.label),str(r.order))
-			for r in results
-		]
-
-	def get_ordered_events_for_object(self, object_uri):
-		query = f"""
-		PREFIX rdfs: <{RDFS}>
-		PREFIX rdf: <{RDF}>
-		PREFIX ont: <{ONT}>
-
-		SELECT ?event ?label ?eventType (COUNT(?prev) AS ?order)
-		WHERE {{
-			?event ont:hasObject <{object_uri}> ;
-				rdf:type ?eventType .
-			OPTIONAL {{ ?event rdfs:label ?label }}
-
-			OPTIONAL {{
-				?prev ont:postEvent+ ?event .
-			}}
-		}}
-		GROUP BY ?event ?label ?eventType
-		ORDER BY ?order
-		"""
-		results = self.execute_query(query)
-
-		return [
-			(
-				str(r.eventType.split("/")[-1]),
-				str(r.event),
-				str(r.label),
-				str(r.order)
-			)
-			for r in results
-		]
-
-	def get_ordered_events_for_place(self, place_uri):
-		query = f"""
-		PREFIX rdfs: <{RDFS}>
-		PREFIX rdf: <{RDF}>
-		PREFIX ont: <{ONT}>
-
-		SELECT ?event ?label ?eventType (COUNT(?prev) AS ?order)
-		WHERE {{
-			?event ont:hasPlace <{place_uri}> ;
-				rdf:type ?eventType .
-			OPTIONAL {{ ?event rdfs:label ?label }}
-
-			OPTIONAL {{
-				?prev ont:postEvent+ ?event .
-			}}
-		}}
-		GROUP BY ?event ?label ?eventType
-		ORDER BY ?order
-		"""
-		results = self.execute_query(query)
-
-		return [
-			(
-				str(r.eventType.split("/")[-1]),
-				str(r.event),
-				str(r.label),
-				str(r.order)
-			)
-			for r in results
-		]
-	
 	def get_type_name(self, uri: str):
 		query = f"""
 		PREFIX rdf: <{RDF}>
@@ -452,6 +382,7 @@ class EventRetriever(GraphRetriever):
 			<{uri}> rdf:type ?type .
 			FILTER(STRSTARTS(STR(?type), STR(ont:)))
 		}}
+		ORDER BY ?type
 		LIMIT 1
 		"""
 		
@@ -541,6 +472,7 @@ class EventRetriever(GraphRetriever):
 		WHERE {{
 			<{agent_uri}> ont:hasPersonality ?trait .
 		}}
+		ORDER BY ?trait
 		"""
 
 		results = self.execute_query(query)
@@ -564,3 +496,76 @@ class EventRetriever(GraphRetriever):
 		if not results: 
 			return None
 		return str(results[0].label)
+
+	def describe_resources(self, uris: Iterable[str]):
+		"""
+		Recupera en una sola consulta los atributos de varios recursos: etiqueta, tipo, género,
+		nombre, categoría de edad, rasgos de personalidad y etiqueta del rol. Equivale a llamar a
+		get_label, get_type_name, get_gender, get_name, get_age_category, get_personality_traits
+		y get_role_labels para cada recurso.
+
+		Returns:
+			dict[str, ResourceDescription]: {uri: descripción}
+		"""
+		uris = list(dict.fromkeys(uris))
+		if not uris:
+			return {}
+
+		values = " ".join(f"<{uri}>" for uri in uris)
+		query = f"""
+		PREFIX rdfs: <{RDFS}>
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT ?resource ?property ?value
+		WHERE {{
+			VALUES ?resource {{ {values} }}
+			{{
+				?resource rdfs:label ?value .
+				BIND("label" AS ?property)
+			}} UNION {{
+				?resource rdf:type ?value .
+				FILTER(STRSTARTS(STR(?value), STR(ont:)))
+				BIND("type_name" AS ?property)
+			}} UNION {{
+				?resource ont:gender ?value .
+				BIND("gender" AS ?property)
+			}} UNION {{
+				?resource ont:name ?value .
+				BIND("name" AS ?property)
+			}} UNION {{
+				?resource ont:ageCategory ?value .
+				BIND("age_category" AS ?property)
+			}} UNION {{
+				?resource ont:hasRole ?role .
+				?role rdfs:label ?value .
+				BIND("role_label" AS ?property)
+			}} UNION {{
+				?resource ont:hasPersonality ?value .
+				BIND("personality_traits" AS ?property)
+			}}
+		}}
+		"""
+
+		results = self.execute_query(query)
+
+		attributes: dict[str, dict] = {uri: {"personality_traits": []} for uri in uris}
+		for row in results:
+			resource_attributes = attributes[str(row.resource)]
+			value = str(row.value)
+			if str(row.property) == "personality_traits":
+				resource_attributes["personality_traits"].append(value)
+			elif str(row.property) == "type_name":
+				# Con varios tipos se conserva el menor, como en get_type_name
+				resource_attributes.setdefault("type_uris", []).append(value)
+			else:
+				# Como las consultas individuales con LIMIT 1, se conserva el primer valor
+				resource_attributes.setdefault(str(row.property), value)
+
+		for resource_attributes in attributes.values():
+			# Mismo orden que get_personality_traits
+			resource_attributes["personality_traits"].sort()
+			if "type_uris" in resource_attributes:
+				resource_attributes["type_name"] = min(resource_attributes.pop("type_uris")).split("/")[-1]
+
+		return {uri: ResourceDescription(**attributes[uri]) for uri in uris}
@@ -283,6 +283,11 @@ class FolktaleOntology(Graph):
 		self.add((ONT.postEvent, RDFS.range, ONT.Event))
 		self.add((ONT.postEvent, OWL.inverseOf, ONT.preEvent))
 
+		# sequenceIndex
+		self.add((ONT.sequenceIndex, RDF.type, OWL.DatatypeProperty))
+		self.add((ONT.sequenceIndex, RDFS.domain, ONT.Event))
+		self.add((ONT.sequenceIndex, RDFS.range, XSD.integer))
+
 		# hasAgent
 		self.add((ONT.hasAgent, RDF.type, OWL.ObjectProperty))
 		self.add((ONT.hasAgent, RDFS.domain, ONT.Event))
@@ -489,6 +494,8 @@ class FolktaleOntology(Graph):
 		# Crear eventos
 		# -----------------------------
 		pre_event_uri = None
+		event_uris = []
+		sequence = []
 		events = data.events
 		if events and isinstance(events, list):
 			for event in events:
@@ -519,9 +526,53 @@ class FolktaleOntology(Graph):
 				if pre_event_uri:
 					self.add((pre_event_uri, ONT.postEvent, event_uri))
 					self.add((event_uri, ONT.preEvent, pre_event_uri))
+					sequence.append((pre_event_uri, event_uri))
 					
+				event_uris.append(event_uri)
 				pre_event_uri = event_uri	
 
+		# Se guarda la posición de cada evento para no recorrer postEvent+ al consultar
+		self._add_sequence_indexes(event_uris, sequence)
+
+	def _add_sequence_indexes(self, events: typing.Iterable[URIRef], sequence: typing.Iterable[tuple[URIRef, URIRef]]):
+		positions = sequence_positions(sequence)
+		for event_uri in events:
+			self.set((event_uri, ONT.sequenceIndex, Literal(positions.get(event_uri, 0), datatype = XSD.integer)))
+
+	def add_missing_sequence_indexes(self):
+		"""
+		Añade ont:sequenceIndex a los grafos guardados antes de que add_folktale lo generase.
+		"""
+		if (None, ONT.sequenceIndex, None) in self:
+			return
+
+		events = set(self.objects(None, ONT.hasEvent))
+		self._add_sequence_indexes(events, self.subject_objects(ONT.postEvent))
+		logger.debug(f"Sequence indexes added to {len(events)} events.")
+
+def sequence_positions(sequence: typing.Iterable[tuple[URIRef, URIRef]]) -> dict[URIRef, int]:
+	"""
+	Posición de cada evento como número de predecesores distintos por ont:postEvent+.
+	Coincide con el índice en la secuencia salvo cuando un cuento repite un evento.
+	"""
+	predecessors: dict[URIRef, set[URIRef]] = {}
+	for pre_event_uri, event_uri in sequence:
+		predecessors.setdefault(event_uri, set()).add(pre_event_uri)
+
+	positions = {}
+	for event_uri in predecessors:
+		seen = set()
+		pending = list(predecessors[event_uri])
+		while pending:
+			pre_event_uri = pending.pop()
+			if pre_event_uri in seen:
+				continue
+			seen.add(pre_event_uri)
+			pending.extend(predecessors.get(pre_event_uri, ()))
+		positions[event_uri] = len(seen)
+
+	return positions
+
 def create_graph(folktales: list[AnnotatedFolktale], filename, folder, build: bool=False, render_html: bool=False) -> Graph:
 	graph = FolktaleOntology()
 	if build:
@@ -541,6 +592,7 @@ def create_graph(folktales: list[AnnotatedFolktale], filename, folder, build: bo
 	logger.debug(f"Graph initialized with {len(graph)} triplets.")
 
 	graph.load(filename, folder)
+	graph.add_missing_sequence_indexes()
 
 	logger.debug(f"Graph initialized with {len(graph)} triplets after loading.")
 
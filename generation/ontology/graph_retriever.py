@@ -3,16 +3,22 @@ from rdflib import Graph
 class GraphRetriever:
 	graph: Graph
 	cache: dict
+	hits: int
+	misses: int
 	
 	def __init__(self, graph: Graph):
 		self.graph = graph
 		self.cache = {}
+		self.hits = 0
+		self.misses = 0
 
 	def execute_query(self, query: str):
 		cache_key = hash(query)
 		if cache_key in self.cache:
+			self.hits += 1
 			return self.cache[cache_key]
 
+		self.misses += 1
 		try:
 			results = self.graph.query(query)
 			result_list = list(results)
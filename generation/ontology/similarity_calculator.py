@@ -156,6 +156,73 @@ class LocalSemanticSimilarityCalculator(GraphRetriever):
 			return 0.0
 		return 1.0 / (1.0 + path_length)
 	
+	def _class_ancestors(self):
+		"""
+		Devuelve una función que calcula los ancestros (rdfs:subClassOf*, incluida la propia clase)
+		de una URI, a partir de la jerarquía de clases leída con una sola consulta.
+		"""
+		query = f"""
+		PREFIX rdfs: <{RDFS}>
+
+		SELECT ?class ?parent WHERE {{
+			?class rdfs:subClassOf ?parent .
+		}}
+		"""
+
+		parents: dict[str, list[str]] = {}
+		for row in self.execute_query(query):
+			parents.setdefault(str(row["class"]), []).append(str(row.parent))
+
+		memo: dict[str, frozenset[str]] = {}
+
+		def ancestors(uri: str) -> frozenset[str]:
+			if uri not in memo:
+				visited = {uri}
+				pending = [uri]
+				while pending:
+					for parent in parents.get(pending.pop(), []):
+						if parent not in visited:
+							visited.add(parent)
+							pending.append(parent)
+				memo[uri] = frozenset(visited)
+			return memo[uri]
+
+		return ancestors
+
+	def path_similarity_class_matrix(self, class_ids: list[str]):
+		"""
+		path_similarity_class de todos los pares de `class_ids`, calculada sobre la jerarquía de
+		clases en memoria en lugar de con tres consultas SPARQL por par. Sigue las mismas reglas
+		que get_least_common_subsumer_class y get_class_depth; si hay varios LCS igual de
+		específicos, se usa el menor.
+
+		Returns:
+			list[list[float]]: Similitud de cada par, en el orden de `class_ids`.
+		"""
+		ancestors = self._class_ancestors()
+
+		def depth(class_id: str) -> int:
+			return len(ancestors(f"{ONT}{class_id}"))
+
+		class_ancestors = [ancestors(f"{ONT}{class_id}") for class_id in class_ids]
+		matrix = []
+		for class1_id, ancestors1 in zip(class_ids, class_ancestors):
+			row = []
+			for class2_id, ancestors2 in zip(class_ids, class_ancestors):
+				common = ancestors1 & ancestors2
+				# LCS: ancestros comunes sin ningún ancestro común más específico
+				lcs = sorted(
+					candidate for candidate in common
+					if not any(other != candidate and candidate in ancestors(other) for other in common)
+				)
+				if not lcs:
+					row.append(0.0)
+					continue
+				path_length = depth(class1_id) + depth(class2_id) - 2 * depth(lcs[0].split('/')[-1])
+				row.append(1.0 / (1.0 + path_length))
+			matrix.append(row)
+		return matrix
+
 	def path_similarity_class_instance(self, class_id, instance_uri):
 		"""
 		Similitud Path (Rada et al., 1989)
@@ -0,0 +1,155 @@
+from generation.ontology.event_retriever import EventRetriever
+from generation.ontology.similarity_calculator import LocalSemanticSimilarityCalculator
+from generation.ontology.entity_sequences import EntitySequenceIndex
+from generation.ontology.event_features import EventFeatureIndex
+from generation.adaptation.astar import ConstructiveAdaptation
+from generation.adaptation.query import Query
+from generation.adaptation.similarity import ClassSimilarityTable
+from generation.adaptation.alignment import process_events, print_dict, print_selected_uris, build_unique_uri_dict
+from generation.adaptation.filling import fill_candidates
+from generation.adaptation.story_builder import story_builder
+from generation.adaptation.tracer import SearchTracer
+from common.utils.regex_utils import clean_regex, title_case_to_snake_case
+from common.models.folktale import AnnotatedFolktale
+from pydantic import BaseModel, Field
+from typing import Optional
+from rdflib import Graph
+from loguru import logger
+import time
+import os
+import re
+
+DEFAULT_WEIGHTS = {
+	"genre": 0.13,
+	"event": 0.52,
+	"role": 0.18,
+	"place": 0.10,
+	"object": 0.07
+}
+
+class GenerationResult(BaseModel):
+	title: str
+	folktale: Optional[AnnotatedFolktale] = None
+	events: list[str] = Field(default_factory=list)
+	timings: dict[str, float] = Field(default_factory=dict)
+	peak_open_size: int = 0
+	heuristic_memo_hit_rate: float = 0.0
+
+class GenerationPipeline:
+	"""
+	Agrupa el grafo, los recuperadores y la búsqueda A* para generar cuentos estructurados.
+
+	Las cachés de EventRetriever y LocalSemanticSimilarityCalculator se conservan entre
+	consultas, de modo que cada consulta aprovecha lo que ya calcularon las anteriores.
+	"""
+	graph: Graph
+	event_retriever: EventRetriever
+	sim_calculator: LocalSemanticSimilarityCalculator
+	constructive_adaptation: ConstructiveAdaptation
+	sim_table: ClassSimilarityTable
+	_sequence_index: Optional[EntitySequenceIndex]
+	filling_workers: int
+	verbose: bool
+	trace_dir: Optional[str]
+	chrome_trace: bool
+
+	def __init__(self, graph: Graph, weights: dict[str, float] = DEFAULT_WEIGHTS, top_n: int = 5, max_open_nodes: Optional[int] = None, heuristic_memo_size: int = 100_000, filling_workers: int = 4, verbose: bool = False, trace_dir: Optional[str] = None, chrome_trace: bool = False):
+		self.graph = graph
+		self.event_retriever = EventRetriever(graph)
+		self.sim_calculator = LocalSemanticSimilarityCalculator(graph)
+		self.constructive_adaptation = ConstructiveAdaptation(graph, weights, self.event_retriever, self.sim_calculator, top_n=top_n, max_open_nodes=max_open_nodes, heuristic_memo_size=heuristic_memo_size)
+		# Tabla de similitud entre tipos de evento compartida por todas las consultas
+		self.sim_table = ClassSimilarityTable(self.sim_calculator)
+		# Índice de secuencias de eventos por entidad para el rellenado. Se construye bajo demanda.
+		self._sequence_index = None
+		self.filling_workers = filling_workers
+		self.verbose = verbose
+		# Si se indica un directorio, cada búsqueda guarda su traza (resumen JSON y, opcionalmente, Chrome trace)
+		self.trace_dir = trace_dir
+		self.chrome_trace = chrome_trace
+
+	@property
+	def sequence_index(self):
+		if self._sequence_index is None:
+			self._sequence_index = EntitySequenceIndex(self.graph)
+		return self._sequence_index
+
+	def warm_up(self):
+		"""
+		Construye de antemano las estructuras que, si no, se construyen bajo demanda en la primera
+		consulta: el índice de secuencias, el índice de características de eventos y la tabla de
+		similitud entre todos los tipos de evento del índice de secuencias.
+		"""
+		start = time.perf_counter()
+		sequence_index = self.sequence_index
+		if self.constructive_adaptation.features is None:
+			self.constructive_adaptation.features = EventFeatureIndex(self.graph)
+		self.sim_table.codes(sequence_index.event_types)
+		self.sim_table.fill_all()
+		logger.debug(f"Pipeline warmed up in {time.perf_counter() - start:.2f}s ({len(sequence_index.event_types)} event types).")
+
+	def _search(self, query: Query):
+		if self.trace_dir is None:
+			return self.constructive_adaptation.generate(query, query.max_events)
+
+		tracer = SearchTracer(
+			name=query.title,
+			retrievers={"event_retriever": self.event_retriever, "sim_calculator": self.sim_calculator},
+			record_events=self.chrome_trace
+		)
+		goal_node = self.constructive_adaptation.generate(query, query.max_events, tracer)
+
+		filename = title_case_to_snake_case(re.sub(clean_regex, "", query.title))
+		chrome_trace_path = os.path.join(self.trace_dir, f"{filename}.trace.json") if self.chrome_trace else None
+		tracer.save(os.path.join(self.trace_dir, f"{filename}.json"), chrome_trace_path)
+		return goal_node
+
+	def run(self, query: Query) -> GenerationResult:
+		timings: dict[str, float] = {}
+		start = time.perf_counter()
+
+		goal_node = self._search(query)
+		timings["search"] = time.perf_counter() - start
+		peak_open_size = self.constructive_adaptation.peak_open_size
+		memo = self.constructive_adaptation.heuristic_memo
+		memo_hit_rate = memo.hit_rate if memo is not None else 0.0
+
+		if goal_node is None:
+			timings["total"] = time.perf_counter() - start
+			logger.debug(f"No folktale generated for '{query.title}'.")
+			return GenerationResult(title=query.title, timings=timings, peak_open_size=peak_open_size, heuristic_memo_hit_rate=memo_hit_rate)
+
+		stage_start = time.perf_counter()
+		places, objects, roles = process_events(goal_node.event_elements, self.event_retriever)
+		filling_timings = fill_candidates(query.genre, roles, objects, places, self.sequence_index, self.sim_table, self.filling_workers)
+		timings.update({f"filling_{name}": elapsed for name, elapsed in filling_timings.items()})
+
+		if self.verbose:
+			print_dict("places", places)
+			print_dict("objects", objects)
+			print_dict("roles", roles)
+
+		places_dict = build_unique_uri_dict(places)
+		objects_dict = build_unique_uri_dict(objects)
+		roles_dict = build_unique_uri_dict(roles)
+
+		if self.verbose:
+			print_selected_uris("Places", places_dict)
+			print_selected_uris("Objects", objects_dict)
+			print_selected_uris("Roles", roles_dict)
+		timings["filling"] = time.perf_counter() - stage_start
+
+		stage_start = time.perf_counter()
+		folktale = story_builder(query.title, query.genre, goal_node.event_elements, places_dict, objects_dict, roles_dict, self.event_retriever)
+		timings["building"] = time.perf_counter() - stage_start
+
+		timings["total"] = time.perf_counter() - start
+
+		return GenerationResult(
+			title=query.title,
+			folktale=folktale,
+			events=list(goal_node.events_type),
+			timings=timings,
+			peak_open_size=peak_open_size,
+			heuristic_memo_hit_rate=memo_hit_rate
+		)
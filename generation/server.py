@@ -0,0 +1,183 @@
+from generation.adaptation.query import Query
+from generation.pipeline import GenerationPipeline
+from generation.batch import create_worker_pool, release_worker_pool, submit_query
+from generation.ontology.folktale_graph import create_graph
+from generation.story_generator import generate_story
+from generation.utils.loader import load_generation_examples
+from generation.utils.story_cache import StoryCache
+import generation.utils.sbc_tools as sbc
+from common.models.folktale import AnnotatedFolktale
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from pydantic import ValidationError
+from dotenv import load_dotenv
+from typing import Any, Optional
+from loguru import logger
+import threading
+import argparse
+import json
+import time
+
+class ServiceBusyError(Exception):
+	pass
+
+class GenerationService:
+	"""
+	Servicio de generación con el grafo, los índices y las cachés cargados una sola vez.
+
+	Las consultas se resuelven en un pool de procesos (fork) que heredan el pipeline calentado,
+	de modo que como mucho se generan `workers` cuentos a la vez. Las peticiones que esperan
+	turno forman la cola, limitada a `max_pending`; por encima de ese límite se rechazan. Una
+	petición ocupa su plaza en la cola hasta que termina, historia incluida, y como mucho hay
+	`story_concurrency` historias generándose con el modelo de lenguaje a la vez.
+	"""
+	pipeline: GenerationPipeline
+	workers: int
+	max_pending: int
+	story_concurrency: int
+	examples: list[tuple[AnnotatedFolktale, str]]
+	story_cache: Optional[StoryCache]
+
+	def __init__(self, pipeline: GenerationPipeline, workers: int = 2, max_pending: int = 16, story_cache: Optional[StoryCache] = None, story_concurrency: Optional[int] = None):
+		self.pipeline = pipeline
+		self.workers = workers
+		self.max_pending = max_pending
+		self.story_concurrency = story_concurrency or workers
+		self.examples = load_generation_examples()
+		self.story_cache = story_cache
+		self._slots = threading.BoundedSemaphore(workers + max_pending)
+		self._story_slots = threading.BoundedSemaphore(self.story_concurrency)
+		self._executor = None
+
+	def start(self):
+		self._executor = create_worker_pool(self.pipeline, self.workers)
+		# Con fork se crean todos los procesos en el primer envío; se fuerza antes de atender peticiones
+		self._executor.submit(int).result()
+		logger.info(f"Generation service ready with {self.workers} workers.")
+
+	def close(self):
+		if self._executor is not None:
+			release_worker_pool(self._executor)
+			self._executor = None
+
+	def generate(self, query: Query, story: bool = False) -> dict[str, Any]:
+		"""
+		Genera el cuento estructurado de una consulta y, si se pide, su historia en lenguaje natural.
+
+		Raises:
+			ServiceBusyError: Si la cola de peticiones está llena.
+		"""
+		if not self._slots.acquire(blocking=False):
+			raise ServiceBusyError(f"Too many pending requests (limit {self.workers + self.max_pending}).")
+
+		try:
+			start = time.perf_counter()
+			result = submit_query(self._executor, query).result()
+			elapsed = time.perf_counter() - start
+
+			response = result.model_dump(mode="json")
+			response["timings"]["queue"] = max(elapsed - result.timings.get("total", 0.0), 0.0)
+
+			if story and result.folktale is not None:
+				stage_start = time.perf_counter()
+				with self._story_slots:
+					response["story"] = generate_story(result.folktale, self.examples, cache=self.story_cache)
+				response["timings"]["story"] = time.perf_counter() - stage_start
+
+			response["timings"]["request"] = time.perf_counter() - start
+			return response
+		finally:
+			self._slots.release()
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+	"""
+	POST /generate        Cuerpo: Query en JSON. Devuelve el GenerationResult con sus tiempos.
+	POST /generate?story=true  Además genera la historia con el modelo de lenguaje.
+	GET  /health          Estado del servicio.
+	"""
+	service: GenerationService
+
+	def _send_json(self, status: int, data: dict[str, Any]):
+		body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if urlparse(self.path).path != "/health":
+			self._send_json(404, {"error": "Not found."})
+			return
+		self._send_json(200, {"status": "ok", "workers": self.service.workers})
+
+	def do_POST(self):
+		url = urlparse(self.path)
+		if url.path != "/generate":
+			self._send_json(404, {"error": "Not found."})
+			return
+
+		try:
+			length = int(self.headers.get("Content-Length", 0))
+			query = Query.model_validate_json(self.rfile.read(length))
+		except (ValueError, ValidationError) as e:
+			self._send_json(400, {"error": str(e)})
+			return
+
+		story = parse_qs(url.query).get("story", ["false"])[0].lower() in ("1", "true", "yes")
+
+		try:
+			response = self.service.generate(query, story)
+		except ServiceBusyError as e:
+			self._send_json(503, {"error": str(e)})
+			return
+		except Exception as e:
+			logger.exception(f"Error generating '{query.title}'.")
+			self._send_json(500, {"error": str(e)})
+			return
+
+		logger.info(f"Query '{query.title}' served in {response['timings']['request']:.2f}s.")
+		self._send_json(200, response)
+
+	def log_message(self, format: str, *args):
+		logger.debug(f"{self.address_string()} - {format % args}")
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 2, max_pending: int = 16, top_n: int = 5, story_cache: bool = True, story_concurrency: Optional[int] = None):
+	graph = create_graph(
+		folktales=[],
+		filename="folktales.ttl",
+		folder=sbc.data_path,
+		build=False
+	)
+
+	service = GenerationService(GenerationPipeline(graph, top_n=top_n), workers, max_pending, StoryCache() if story_cache else None, story_concurrency)
+	service.start()
+
+	handler = type("Handler", (GenerationRequestHandler,), {"service": service})
+	server = ThreadingHTTPServer((host, port), handler)
+	logger.info(f"Serving on http://{host}:{port}.")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		service.close()
+
+def main():
+	load_dotenv()
+
+	parser = argparse.ArgumentParser(description="Servidor HTTP de generación de cuentos estructurados.")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8000)
+	parser.add_argument("--workers", type=int, default=2, help="Cuentos generados a la vez.")
+	parser.add_argument("--max-pending", type=int, default=16, help="Peticiones en cola antes de rechazar con 503.")
+	parser.add_argument("--top-n", type=int, default=5)
+	parser.add_argument("--no-cache", action="store_true", help="Genera siempre las historias con el modelo, sin caché.")
+	parser.add_argument("--story-concurrency", type=int, help="Historias generadas con el modelo a la vez (por defecto, tantas como workers).")
+	args = parser.parse_args()
+
+	serve(args.host, args.port, args.workers, args.max_pending, args.top_n, not args.no_cache, args.story_concurrency)
+
+if __name__ == "__main__":
+	main()
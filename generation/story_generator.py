@@ -3,11 +3,19 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate, FewShotChatMessagePromptTemplate
 from loguru import logger
 from common.models.folktale import AnnotatedFolktale
+from generation.utils.story_cache import StoryCache
+from pydantic import BaseModel
+from typing import Optional, Iterator, TextIO
+import asyncio
+import time
 import json
 
+MODEL_NAME = "llama-3.3-70b-versatile"
+STORY_TEMPERATURE = 0.9
+
 def get_model(temperature: float) -> BaseChatModel:
 	model = ChatGroq(
-		model="llama-3.3-70b-versatile",
+		model=MODEL_NAME,
 		temperature=temperature,
 		timeout=5.0,
 		max_retries=2
@@ -47,9 +55,7 @@ The structured narrative is provided in JSON format below. It includes the follo
 }}
 ''')
 
-def generate_story(folktale: AnnotatedFolktale, examples: list[tuple[AnnotatedFolktale, str]]):
-	model = get_model(0.9)
-
+def build_story_prompt(examples: list[tuple[AnnotatedFolktale, str]]) -> ChatPromptTemplate:
 	few_shot_examples = []
 	for example in examples:
 		example_json = example[0].model_dump(mode="json")
@@ -74,19 +80,174 @@ def generate_story(folktale: AnnotatedFolktale, examples: list[tuple[AnnotatedFo
 		]
 	)
 
-	story_chain = story_prompt | model
+	return story_prompt
 
+def _story_input(folktale: AnnotatedFolktale):
 	folktale_json = folktale.model_dump(mode="json")
 	folktale_json = json.dumps(folktale_json, indent=4)
+	return {"folktale": folktale_json}
+
+def _story_text(folktale: AnnotatedFolktale, content: str):
+	return folktale.title + "\n" + content.strip()
+
+def story_cache_key(folktale: AnnotatedFolktale, examples: list[tuple[AnnotatedFolktale, str]], model: Optional[BaseChatModel] = None) -> str:
+	"""
+	Clave de caché de una historia: cuento, ejemplos few-shot, plantillas del prompt, nombre del
+	modelo y temperatura. Sin modelo se usan los valores de get_model, sin crear el cliente.
+	"""
+	if model is None:
+		model_name, temperature = MODEL_NAME, STORY_TEMPERATURE
+	else:
+		model_name = getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+		temperature = getattr(model, "temperature", None)
+
+	return StoryCache.key({
+		"folktale": folktale.model_dump(mode="json"),
+		"examples": [[example.model_dump(mode="json"), output] for example, output in examples],
+		"prompt": [system_prompt.prompt.template, human_prompt.prompt.template],
+		"model": str(model_name),
+		"temperature": temperature
+	})
+
+def generate_story(folktale: AnnotatedFolktale, examples: list[tuple[AnnotatedFolktale, str]], model: Optional[BaseChatModel] = None, cache: Optional[StoryCache] = None):
+	"""
+	Genera la historia en lenguaje natural de un cuento estructurado.
+
+	Si se pasa una caché, la historia se busca primero en ella y solo se llama al modelo si no
+	está. Sin caché (el valor por defecto) siempre se llama al modelo.
+	"""
+	if cache is not None:
+		key = story_cache_key(folktale, examples, model)
+		story = cache.get(key)
+		if story is not None:
+			logger.debug(f"Story for '{folktale.title}' loaded from cache.")
+			return story
+
+	story_chain = build_story_prompt(examples) | (model or get_model(STORY_TEMPERATURE))
 
 	# print(story_prompt.format(folktale=folktale_json))
 
-	ai_message = story_chain.invoke({
-		"folktale": folktale_json
-	})
+	ai_message = story_chain.invoke(_story_input(folktale))
 
-	story = folktale.title + "\n" + ai_message.content.strip()
+	story = _story_text(folktale, ai_message.content)
 
 	logger.debug(f"Folktale:\n{story}")
 
-	return story
\ No newline at end of file
+	if cache is not None:
+		cache.put(key, story)
+
+	return story
+
+class StreamMetrics(BaseModel):
+	ttft: Optional[float] = None
+	tokens: int = 0
+	elapsed: float = 0.0
+	tokens_per_second: float = 0.0
+
+class StoryStream:
+	"""
+	Historia generada en streaming. Al iterarla se obtienen los fragmentos según llegan del modelo.
+
+	Si se indica un fichero, el título y cada fragmento se escriben en él en cuanto llegan. Al
+	terminar, `story` contiene la historia completa (como la de generate_story) y `metrics` el
+	tiempo hasta el primer token y los tokens por segundo. Si el modelo no informa del uso de
+	tokens, se cuenta cada fragmento no vacío como un token.
+	"""
+	folktale: AnnotatedFolktale
+	story: Optional[str]
+	metrics: StreamMetrics
+
+	def __init__(self, folktale: AnnotatedFolktale, examples: list[tuple[AnnotatedFolktale, str]], model: Optional[BaseChatModel] = None, file: Optional[TextIO] = None):
+		self.folktale = folktale
+		self.story = None
+		self.metrics = StreamMetrics()
+		self._chain = build_story_prompt(examples) | (model or get_model(STORY_TEMPERATURE))
+		self._file = file
+
+	def _write(self, text: str):
+		if self._file is not None:
+			self._file.write(text)
+			self._file.flush()
+
+	def __iter__(self) -> Iterator[str]:
+		start = time.perf_counter()
+		content = []
+		chunks = 0
+		usage_tokens = 0
+		self._write(self.folktale.title + "\n")
+
+		for chunk in self._chain.stream(_story_input(self.folktale)):
+			if chunk.usage_metadata:
+				usage_tokens += chunk.usage_metadata.get("output_tokens", 0)
+
+			text = chunk.content
+			if not text:
+				continue
+			if self.metrics.ttft is None:
+				self.metrics.ttft = time.perf_counter() - start
+			chunks += 1
+
+			# Se descarta el espacio inicial, igual que en generate_story
+			if not content:
+				text = text.lstrip()
+				if not text:
+					continue
+			content.append(text)
+			self._write(text)
+			yield text
+
+		self.story = _story_text(self.folktale, "".join(content))
+		self.metrics.tokens = usage_tokens or chunks
+		self.metrics.elapsed = time.perf_counter() - start
+		generation_time = self.metrics.elapsed - (self.metrics.ttft or 0.0)
+		self.metrics.tokens_per_second = self.metrics.tokens / generation_time if generation_time > 0 else 0.0
+
+		logger.debug(f"Story for '{self.folktale.title}' streamed: ttft={self.metrics.ttft or 0.0:.2f}s, {self.metrics.tokens} tokens, {self.metrics.tokens_per_second:.1f} tokens/s.")
+
+async def generate_stories(folktales: list[AnnotatedFolktale], examples: list[tuple[AnnotatedFolktale, str]], concurrency: int = 4, model: Optional[BaseChatModel] = None, max_retries: int = 3, backoff: float = 1.0, cache: Optional[StoryCache] = None) -> list[Optional[str]]:
+	"""
+	Genera las historias de varios cuentos de forma concurrente.
+
+	Se usa un único cliente y el prompt few-shot se construye una sola vez. Como mucho hay
+	`concurrency` peticiones en vuelo, y cada petición fallida se reintenta hasta `max_retries`
+	veces con espera exponencial.
+
+	Args:
+		folktales (list[AnnotatedFolktale]): Cuentos estructurados.
+		examples (list[tuple[AnnotatedFolktale, str]]): Ejemplos few-shot.
+		concurrency (int): Máximo de peticiones simultáneas.
+		model (Optional[BaseChatModel]): Modelo de chat. Por defecto, get_model(STORY_TEMPERATURE). Permite usar un modelo falso sin conexión.
+		max_retries (int): Reintentos por cuento.
+		backoff (float): Espera inicial en segundos entre reintentos; se duplica en cada uno.
+		cache (Optional[StoryCache]): Caché de historias. Los cuentos que ya estén en ella no llegan al modelo.
+
+	Returns:
+		list[Optional[str]]: Historias en el mismo orden que los cuentos (None si no se pudo generar).
+	"""
+	story_chain = build_story_prompt(examples) | (model or get_model(STORY_TEMPERATURE))
+	semaphore = asyncio.Semaphore(concurrency)
+
+	async def generate(folktale: AnnotatedFolktale):
+		if cache is not None:
+			key = story_cache_key(folktale, examples, model)
+			story = cache.get(key)
+			if story is not None:
+				return story
+
+		async with semaphore:
+			for attempt in range(max_retries + 1):
+				try:
+					ai_message = await story_chain.ainvoke(_story_input(folktale))
+					story = _story_text(folktale, ai_message.content)
+					if cache is not None:
+						cache.put(key, story)
+					return story
+				except Exception as e:
+					if attempt == max_retries:
+						logger.error(f"Story for '{folktale.title}' failed after {attempt + 1} attempts: {e}")
+						return None
+					delay = backoff * 2 ** attempt
+					logger.warning(f"Story for '{folktale.title}' failed ({e}). Retrying in {delay:.1f}s.")
+					await asyncio.sleep(delay)
+
+	return await asyncio.gather(*(generate(folktale) for folktale in folktales))
@@ -1,16 +1,33 @@
 from common.models.folktale import AnnotatedFolktale
-from common.utils.loader import save_structured_folktale
+from common.utils.loader import save_structured_folktale, load_json_folder, load_txt_folder, data_dir
 from loguru import logger
+from typing import TextIO
 import os
 
 out_dir = "./generation/out"
 
+def load_generation_examples(keys: list[str] = ["the_hare_and_the_tortoise"]) -> list[tuple[AnnotatedFolktale, str]]:
+	"""
+	Carga los ejemplos few-shot para generar historias: cuento anotado y texto (sin el título).
+	"""
+	raw_examples = load_txt_folder(f"{data_dir}/examples/raw")
+	examples = load_json_folder(f"{data_dir}/examples/annotated")
+
+	return [
+		(AnnotatedFolktale(**examples[key]), "\n".join(raw_examples[key].splitlines()[1:]))
+		for key in keys
+	]
+
 def save_annotated_folktale(folktale: AnnotatedFolktale, filename: str):	
 	annotated_dir = os.path.join(out_dir, "annotated")
 
 	save_structured_folktale(folktale, annotated_dir, filename)
 	
-def save_raw_folktale(folktale: str, filename: str):
+def open_raw_folktale(filename: str) -> TextIO:
+	"""
+	Abre para escritura el fichero de texto de un cuento en out/raw, por ejemplo para ir
+	escribiendo la historia a medida que se genera.
+	"""
 	raw_dir = os.path.join(out_dir, "raw")
 
 	os.makedirs(raw_dir, exist_ok=True)
@@ -18,7 +35,11 @@ def save_raw_folktale(folktale: str, filename: str):
 	output_file = filename + ".txt"
 	path = os.path.join(raw_dir, output_file)
 
-	with open(path, "w", encoding="utf-8") as f:
+	return open(path, "w", encoding="utf-8")
+
+def save_raw_folktale(folktale: str, filename: str):
+	with open_raw_folktale(filename) as f:
 		f.write(folktale)
+		path = f.name
 	
 	logger.debug(f"Raw folktale saved sucessfully. Filename: {os.path.basename(path)}.")
\ No newline at end of file
@@ -0,0 +1,89 @@
+from loguru import logger
+from typing import Optional
+import hashlib
+import json
+import os
+
+class StoryCache:
+	"""
+	Caché en disco de historias generadas, direccionada por contenido.
+
+	Cada historia se guarda en un fichero `<clave>.txt`, donde la clave es el hash SHA-256 de
+	todo lo que determina la petición al modelo (ver key). La fecha de modificación de cada
+	fichero hace de marca de último uso: al superar `max_bytes` se borran primero las historias
+	usadas hace más tiempo.
+	"""
+	folder: str
+	max_bytes: int
+	hits: int
+	misses: int
+
+	def __init__(self, folder: str = "./generation/out/cache", max_bytes: int = 64 * 1024 * 1024):
+		self.folder = folder
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(folder, exist_ok=True)
+
+	@staticmethod
+	def key(data) -> str:
+		"""
+		Clave de una petición: hash del JSON canónico (claves ordenadas, sin espacios) de `data`.
+		"""
+		canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+		return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+	def _path(self, key: str):
+		return os.path.join(self.folder, f"{key}.txt")
+
+	def get(self, key: str) -> Optional[str]:
+		path = self._path(key)
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				story = f.read()
+		except FileNotFoundError:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		# Se marca como usada recientemente para la expulsión
+		os.utime(path)
+		return story
+
+	def put(self, key: str, story: str):
+		path = self._path(key)
+		# Escritura atómica: otro proceso nunca ve una historia a medias
+		tmp_path = f"{path}.{os.getpid()}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			f.write(story)
+		os.replace(tmp_path, path)
+		self._evict()
+
+	def _evict(self):
+		entries = []
+		for entry in os.scandir(self.folder):
+			if entry.name.endswith(".txt"):
+				stat = entry.stat()
+				entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+		total = sum(size for _, size, _ in entries)
+		if total <= self.max_bytes:
+			return
+
+		entries.sort()
+		evicted = 0
+		for _, size, path in entries:
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			total -= size
+			evicted += 1
+		logger.debug(f"Story cache: {evicted} stories evicted ({total} bytes kept).")
+
+	@property
+	def hit_rate(self):
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
@@ -0,0 +1,31 @@
+from annotation.main import get_shard, parse_shard
+from pandas import DataFrame
+import argparse
+import unittest
+
+class ShardTest(unittest.TestCase):
+	"""
+	Los fragmentos de --shard i/N se reparten los cuentos del CSV: cada índice está en uno solo.
+	"""
+
+	def test_partition(self):
+		# Índices no consecutivos, como los de un CSV filtrado
+		folktales_df = DataFrame({"title": [f"tale {i}" for i in range(23)]}, index=[i * 3 + 1 for i in range(23)])
+		for n_shards in range(1, 8):
+			shards = [get_shard(folktales_df, shard, n_shards) for shard in range(n_shards)]
+			indexes = [idx for shard in shards for idx in shard.index]
+
+			self.assertEqual(sorted(indexes), list(folktales_df.index))
+			self.assertEqual(len(indexes), len(set(indexes)))
+			for shard in shards:
+				self.assertTrue((shard["title"] == folktales_df.loc[shard.index, "title"]).all())
+
+	def test_parse_shard(self):
+		self.assertEqual(parse_shard("0/1"), (0, 1))
+		self.assertEqual(parse_shard("2/4"), (2, 4))
+		for value in ("4/4", "-1/4", "0/0", "1", "a/b", "1/2/3"):
+			with self.assertRaises(argparse.ArgumentTypeError, msg=value):
+				parse_shard(value)
+
+if __name__ == "__main__":
+	unittest.main()
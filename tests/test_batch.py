@@ -0,0 +1,113 @@
+from generation.batch import generate_jsonl, create_worker_pool, release_worker_pool, submit_query, _completed_ids
+from generation.pipeline import GenerationResult
+from generation.adaptation.query import Query
+from common.utils.loader import load_json
+import tempfile
+import unittest
+import json
+import os
+
+class FakePipeline:
+	"""
+	Pipeline falso: devuelve un resultado con el título de la consulta y falla con las que
+	empiezan por "fail".
+	"""
+
+	def __init__(self):
+		self.titles = []
+
+	def warm_up(self):
+		pass
+
+	def run(self, query: Query) -> GenerationResult:
+		self.titles.append(query.title)
+		if query.title.startswith("fail"):
+			raise RuntimeError(f"Cannot generate '{query.title}'.")
+		return GenerationResult(title=query.title, events=query.events)
+
+class BatchTest(unittest.TestCase):
+	"""
+	Modo por lotes con JSONL: se retoma a partir de los resultados ya escritos, se descartan las
+	líneas ilegibles o a medias, y las consultas que fallan se reintentan en la siguiente ejecución.
+	"""
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.queries_path = os.path.join(self.tmp_dir.name, "queries.jsonl")
+		self.output_path = os.path.join(self.tmp_dir.name, "out", "results.jsonl")
+		self.query = load_json("./query.json")
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def _write_queries(self, lines: list[str]):
+		with open(self.queries_path, "w", encoding="utf-8") as f:
+			f.writelines(f"{line}\n" for line in lines)
+
+	def _query(self, title: str) -> str:
+		return json.dumps({**self.query, "title": title})
+
+	def _results(self) -> dict[int, str]:
+		with open(self.output_path, "r", encoding="utf-8") as f:
+			records = [json.loads(line) for line in f]
+		ids = [record["id"] for record in records]
+		self.assertEqual(len(ids), len(set(ids)))
+		return {record["id"]: record["title"] for record in records}
+
+	def test_completed_ids(self):
+		self.assertEqual(_completed_ids(self.output_path), set())
+
+		os.makedirs(os.path.dirname(self.output_path))
+		valid = '{"id": 0, "title": "a"}\nnot json\n{"title": "no id"}\n\n{"id": 4, "title": "b"}\n'
+		with open(self.output_path, "w", encoding="utf-8") as f:
+			f.write(valid + '{"id": 5, "tit')
+
+		self.assertEqual(_completed_ids(self.output_path), {0, 4})
+		# La última línea, a medias, se recorta
+		with open(self.output_path, "r", encoding="utf-8") as f:
+			self.assertEqual(f.read(), valid)
+
+	def test_resume(self):
+		self._write_queries([self._query("tale 0"), self._query("fail 1"), "{\"title\": \"invalid\"}", "", self._query("tale 4")])
+
+		pipeline = FakePipeline()
+		self.assertEqual(generate_jsonl(pipeline, self.queries_path, self.output_path), 2)
+		self.assertEqual(self._results(), {0: "tale 0", 4: "tale 4"})
+		self.assertEqual(pipeline.titles, ["tale 0", "fail 1", "tale 4"])
+
+		# Al retomar, solo se reintenta la consulta que falló
+		self._write_queries([self._query("tale 0"), self._query("tale 1"), "{\"title\": \"invalid\"}", "", self._query("tale 4")])
+		pipeline = FakePipeline()
+		self.assertEqual(generate_jsonl(pipeline, self.queries_path, self.output_path), 1)
+		self.assertEqual(self._results(), {0: "tale 0", 1: "tale 1", 4: "tale 4"})
+		self.assertEqual(pipeline.titles, ["tale 1"])
+
+	def test_resume_after_interruption(self):
+		self._write_queries([self._query(f"tale {i}") for i in range(3)])
+		os.makedirs(os.path.dirname(self.output_path))
+		with open(self.output_path, "w", encoding="utf-8") as f:
+			f.write(json.dumps({"id": 1, **GenerationResult(title="tale 1").model_dump(mode="json")}) + "\n{\"id\": 2, \"ti")
+
+		pipeline = FakePipeline()
+		self.assertEqual(generate_jsonl(pipeline, self.queries_path, self.output_path), 2)
+		self.assertEqual(self._results(), {0: "tale 0", 1: "tale 1", 2: "tale 2"})
+		self.assertEqual(pipeline.titles, ["tale 0", "tale 2"])
+
+	def test_workers(self):
+		self._write_queries([self._query(f"fail {i}" if i % 4 == 3 else f"tale {i}") for i in range(10)])
+		self.assertEqual(generate_jsonl(FakePipeline(), self.queries_path, self.output_path, workers=3), 8)
+		self.assertEqual(self._results(), {i: f"tale {i}" for i in range(10) if i % 4 != 3})
+
+	def test_submit_query(self):
+		executor = create_worker_pool(FakePipeline(), 2)
+		try:
+			futures = [submit_query(executor, Query.model_validate({**self.query, "title": f"tale {i}"})) for i in range(4)]
+			self.assertEqual([future.result().title for future in futures], [f"tale {i}" for i in range(4)])
+
+			with self.assertRaises(RuntimeError):
+				submit_query(executor, Query.model_validate({**self.query, "title": "fail"})).result()
+		finally:
+			release_worker_pool(executor)
+
+if __name__ == "__main__":
+	unittest.main()
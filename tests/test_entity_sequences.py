@@ -0,0 +1,92 @@
+from generation.ontology.entity_sequences import EntitySequenceIndex, EntitySequences, ENTITY_CLASS_PATTERNS
+from generation.ontology.folktale_graph import create_graph
+from generation.ontology.namespaces import ONT
+import generation.utils.sbc_tools as sbc
+from rdflib.namespace import RDF
+import unittest
+
+# Relación entre un evento y una entidad de cada tipo
+ENTITY_PROPERTIES = {
+	"agent": "ont:hasAgent",
+	"object": "ont:hasObject",
+	"place": "ont:hasPlace"
+}
+
+class EntitySequencesTest(unittest.TestCase):
+	"""
+	Secuencias concatenadas en un único array y delimitadas con offsets.
+	"""
+
+	def test_offsets(self):
+		sequences = EntitySequences(["a", "b", "c"], [[2, 0], [], [1, 1, 2]], ["x", "y", "z"])
+		self.assertEqual(len(sequences), 3)
+		self.assertEqual(sequences.offsets.tolist(), [0, 2, 2, 5])
+		self.assertEqual(sequences.codes_of(2).tolist(), [1, 1, 2])
+		self.assertEqual(list(sequences), [("a", ["z", "x"]), ("b", []), ("c", ["y", "y", "z"])])
+
+	def test_empty(self):
+		sequences = EntitySequences([], [], ["x"])
+		self.assertEqual(len(sequences), 0)
+		self.assertEqual(list(sequences), [])
+
+class EntitySequenceIndexTest(unittest.TestCase):
+	"""
+	Cada grupo del índice debe tener las entidades de su clase y género, con la misma secuencia
+	de tipos de evento que la consulta por entidad ordenada por ont:sequenceIndex.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		cls.graph = create_graph(folktales=[], filename="folktales.ttl", folder=sbc.data_path, build=False, render_html=False)
+		cls.index = EntitySequenceIndex(cls.graph)
+
+	def _entities(self, kind: str, class_id: str, genre: str) -> list[str]:
+		query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?entity
+		WHERE {{
+			?folktale a ont:Folktale ;
+					ont:hasGenre <{genre}> ;
+					ont:hasEvent ?event .
+			{ENTITY_CLASS_PATTERNS[kind]}
+			?event ont:sequenceIndex ?position .
+			FILTER(?class = ont:{class_id})
+		}}
+		"""
+		return sorted(str(row.entity) for row in self.index.execute_query(query))
+
+	def _event_types(self, kind: str, uri: str) -> list[str]:
+		query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?event ?eventType ?position
+		WHERE {{
+			?event {ENTITY_PROPERTIES[kind]} <{uri}> ;
+				rdf:type ?eventType ;
+				ont:sequenceIndex ?position .
+		}}
+		"""
+		rows = self.index.execute_query(query)
+		events = sorted((int(row.position), str(row.eventType).split("/")[-1]) for row in rows)
+		return [event_type for _, event_type in events]
+
+	def test_matches_queries(self):
+		for kind in ENTITY_PROPERTIES:
+			keys = sorted(key for key in self.index.groups if key[0] == kind)
+			self.assertGreater(len(keys), 0, msg=kind)
+			for key in keys[::max(1, len(keys) // 6)]:
+				group = self.index.get(*key)
+				self.assertEqual(group.uris, self._entities(*key), msg=key)
+				for uri, event_types in group:
+					self.assertEqual(event_types, self._event_types(kind, uri), msg=uri)
+
+	def test_missing_group(self):
+		group = self.index.get("agent", "NotAClass", "NotAGenre")
+		self.assertEqual(len(group), 0)
+		self.assertEqual(group.event_types, self.index.event_types)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,236 @@
+from annotation.tools.event_classifier import ClassificationState, VotingStats, hierarchical_event_classification, level_synchronous_classification, _is_decided, _next_batch, _pending_rounds
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from collections import Counter
+from typing import Optional
+import itertools
+import asyncio
+import unittest
+import re
+
+TAXONOMY = {
+	"event": {
+		"description": "Any event.",
+		"children": {
+			"a": {"description": "Event a.", "children": {}},
+			"b": {"description": "Event b.", "children": {}},
+			"c": {"description": "Event c.", "children": {"c1": {"description": "Event c1.", "children": {}}}}
+		}
+	}
+}
+
+# Evento al que debe llegar cada segmento y camino desde la raíz de TAXONOMY
+TARGETS = {"segment 0": "a", "segment 1": "c1", "segment 2": "c", "segment 3": "b"}
+PATHS = {"a": ["a"], "b": ["b"], "c": ["c"], "c1": ["c", "c1"]}
+
+class ScriptedClassifier(BaseChatModel):
+	"""
+	Modelo falso que en cada nivel elige la opción del camino hacia el evento de TARGETS de cada
+	segmento, tanto en llamadas de un segmento (Response) como por lotes (BatchResponse).
+	"""
+	calls: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return "scripted-classifier"
+
+	def bind_tools(self, tools, tool_choice: Optional[str] = None, **kwargs):
+		return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+	@staticmethod
+	def _choose(options: list[str], segment: str) -> int:
+		path = PATHS[TARGETS[segment]]
+		for event in reversed(path):
+			if event in options:
+				return options.index(event)
+		raise ValueError(f"No option for '{segment}' in {options}.")
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		raise NotImplementedError
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		self.calls += 1
+		options = re.findall(r"^(?:\"\"\")?\d+\. (\w+): ", str(messages[0].content), flags=re.MULTILINE)
+		segments = re.findall(r"\"\"\"(segment \d+)\"\"\"", str(messages[-1].content))
+
+		name = kwargs["tools"][0]["function"]["name"]
+		if name == "BatchResponse":
+			args = {"responses": [
+				{"segment": i, "thinking": f"Path of {segment}.", "response": self._choose(options, segment)}
+				for i, segment in enumerate(segments)
+			]}
+		else:
+			args = {"thinking": f"Path of {segments[0]}.", "response": self._choose(options, segments[0])}
+
+		message = AIMessage("", tool_calls=[{"name": name, "args": args, "id": str(self.calls)}])
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+def _most_frequent(votes: list[int]) -> set[int]:
+	counts = Counter(votes)
+	return {v for v, c in counts.items() if c == max(counts.values())}
+
+class VotingTest(unittest.TestCase):
+	"""
+	Votación por mayoría con parada temprana: cuántas rondas se piden y cuándo se da por decidida.
+	"""
+
+	def test_is_decided(self):
+		self.assertFalse(_is_decided([], 3))
+		self.assertTrue(_is_decided([0, 0], 1))
+		self.assertFalse(_is_decided([0, 1], 1))
+		self.assertFalse(_is_decided([0, 0], 2))
+		self.assertTrue(_is_decided([0, 0, 0], 2))
+		self.assertTrue(_is_decided([0, 1, 0], 0))
+		self.assertFalse(_is_decided([0, 1], 0))
+
+	def test_next_batch(self):
+		self.assertEqual(_next_batch([], 3), 2)
+		self.assertEqual(_next_batch([], 5), 3)
+		self.assertEqual(_next_batch([0, 1], 1), 1)
+		self.assertEqual(_next_batch([0], 4), 2)
+		self.assertEqual(_next_batch([0, 0, 1], 4), 2)
+
+	def test_pending_rounds(self):
+		# Primer lote: sin parada temprana todas las rondas; con ella, las justas para una mayoría
+		self.assertEqual(_pending_rounds([], 0, 3, early_stop=False), 3)
+		self.assertEqual(_pending_rounds([], 0, 3, early_stop=True), 2)
+		self.assertEqual(_pending_rounds([], 0, 4, early_stop=True), 3)
+
+		self.assertEqual(_pending_rounds([0, 0], 2, 3, early_stop=True), 0)
+		self.assertEqual(_pending_rounds([0, 0], 2, 3, early_stop=False), 1)
+		self.assertEqual(_pending_rounds([0, 1], 2, 3, early_stop=True), 1)
+		self.assertEqual(_pending_rounds([0, 1, 2], 3, 3, early_stop=True), 0)
+		self.assertEqual(_pending_rounds([0], 2, 5, early_stop=True), 2)
+		# Respuestas fuera de rango: no cuentan como voto, pero sí como ronda pedida
+		self.assertEqual(_pending_rounds([], 2, 3, early_stop=True), 1)
+
+	def _run(self, answers: tuple[int, ...], n_rounds: int, early_stop: bool):
+		"""
+		Recorre las respuestas en orden como _vote: pide los lotes que indica _pending_rounds y
+		descarta las respuestas inválidas (-1).
+		"""
+		votes = []
+		answered = 0
+		batch = _pending_rounds(votes, answered, n_rounds, early_stop)
+		while batch > 0:
+			self.assertLessEqual(answered + batch, n_rounds)
+			votes.extend(answer for answer in answers[answered:answered + batch] if answer >= 0)
+			answered += batch
+			batch = _pending_rounds(votes, answered, n_rounds, early_stop)
+		return votes, answered
+
+	def test_early_stop_keeps_the_majority(self):
+		# Para toda secuencia de respuestas, la parada temprana deja las mismas opciones empatadas
+		# en cabeza que la votación completa, y esta pide siempre todas las rondas
+		for n_rounds in range(1, 6):
+			for answers in itertools.product((0, 1, 2, -1), repeat=n_rounds):
+				full_votes, full_answered = self._run(answers, n_rounds, early_stop=False)
+				votes, answered = self._run(answers, n_rounds, early_stop=True)
+
+				self.assertEqual(full_answered, n_rounds)
+				self.assertLessEqual(answered, n_rounds)
+				self.assertEqual(full_votes, [answer for answer in answers if answer >= 0])
+				if full_votes:
+					self.assertEqual(_most_frequent(votes), _most_frequent(full_votes), msg=f"{answers}")
+				else:
+					self.assertEqual(votes, [])
+
+class ClassificationStateTest(unittest.TestCase):
+	"""
+	Decisión de un nivel de la taxonomía a partir de los votos y, si hay empate, del desempate.
+	"""
+
+	def test_tied_options(self):
+		state = ClassificationState("text", TAXONOMY)
+		self.assertEqual(state.tied_options([]), [])
+		self.assertEqual(state.tied_options([0, 0, 1]), [])
+		self.assertEqual(state.tied_options([0, 1]), [0, 1])
+		self.assertEqual(state.tied_options([2, 1, 1, 2, 0]), [2, 1])
+
+	def test_advance_with_tie_break(self):
+		state = ClassificationState("text", TAXONOMY)
+		state.advance([0, 1], ["thinking a", "thinking b"], stats=None, tie_break=1)
+		self.assertTrue(state.done)
+		self.assertEqual(state.result, "b")
+		self.assertEqual(state.final_thinking, ["thinking b"])
+
+	def test_advance_with_invalid_tie_break(self):
+		state = ClassificationState("text", TAXONOMY)
+		state.advance([0, 1], ["thinking a", "thinking b"], stats=None, tie_break=2)
+		self.assertTrue(state.done)
+		self.assertIsNone(state.result)
+
+	def test_advance_descends(self):
+		state = ClassificationState("text", TAXONOMY)
+		state.advance([2, 2, 0], ["thinking c", "thinking c", "thinking a"], stats=None)
+		self.assertFalse(state.done)
+		self.assertEqual(state.previous_event, "c")
+		self.assertEqual([option for option, _ in state.options_list], ["c1", "c"])
+
+		# Elegir el propio nodo termina la clasificación en él
+		state.advance([1], ["thinking c"], stats=None)
+		self.assertTrue(state.done)
+		self.assertEqual(state.result, "c")
+
+class LevelSynchronousClassificationTest(unittest.TestCase):
+	"""
+	La clasificación nivel a nivel por lotes debe llegar a los mismos eventos que la jerárquica
+	de cada segmento, con menos llamadas, y repartir las estadísticas entre los segmentos.
+	"""
+
+	def setUp(self):
+		self.segments = list(TARGETS)
+
+	def _hierarchical(self, early_stop: bool):
+		model = ScriptedClassifier()
+		stats = VotingStats()
+
+		async def run():
+			return await asyncio.gather(*(hierarchical_event_classification(model, segment, TAXONOMY, n_rounds=3, early_stop=early_stop, stats=stats) for segment in self.segments))
+
+		return asyncio.run(run()), stats, model.calls
+
+	def _level_synchronous(self, early_stop: bool, max_batch: int = 8):
+		model = ScriptedClassifier()
+		stats = VotingStats()
+		segment_stats = [VotingStats() for _ in self.segments]
+		results = asyncio.run(level_synchronous_classification(model, self.segments, TAXONOMY, n_rounds=3, early_stop=early_stop, max_batch=max_batch, stats=stats, segment_stats=segment_stats))
+		return results, stats, segment_stats, model.calls
+
+	def test_matches_hierarchical(self):
+		for early_stop in (False, True):
+			expected, expected_stats, expected_calls = self._hierarchical(early_stop)
+			results, stats, _, calls = self._level_synchronous(early_stop)
+
+			self.assertEqual([event for event, _ in expected], list(TARGETS.values()))
+			self.assertEqual(results, expected)
+			self.assertEqual(stats.segment_rounds, expected_stats.segment_rounds)
+			self.assertEqual(stats.saved_rounds, expected_stats.saved_rounds)
+
+			# Nivel 0: los cuatro segmentos en un lote; nivel 1: los dos que bajan a 'c'
+			rounds = 2 if early_stop else 3
+			self.assertEqual(expected_calls, 6 * rounds)
+			self.assertEqual(calls, 2 * rounds)
+			self.assertEqual(stats.calls, calls)
+
+	def test_max_batch(self):
+		_, _, expected_calls = self._hierarchical(early_stop=False)
+		_, _, _, calls = self._level_synchronous(early_stop=False, max_batch=1)
+		self.assertEqual(calls, expected_calls)
+
+		_, _, _, calls = self._level_synchronous(early_stop=False, max_batch=3)
+		self.assertEqual(calls, 3 * 2 + 3)
+
+	def test_segment_stats(self):
+		_, stats, segment_stats, _ = self._level_synchronous(early_stop=True)
+
+		self.assertEqual(sum(event_stats.segment_rounds for event_stats in segment_stats), stats.segment_rounds)
+		self.assertEqual(sum(event_stats.saved_rounds for event_stats in segment_stats), stats.saved_rounds)
+		# Los segmentos que bajan dos niveles votan el doble
+		self.assertEqual([event_stats.segment_rounds for event_stats in segment_stats], [2, 4, 4, 2])
+		self.assertEqual([event_stats.calls for event_stats in segment_stats], [2, 4, 4, 2])
+
+if __name__ == "__main__":
+	unittest.main()
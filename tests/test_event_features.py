@@ -0,0 +1,72 @@
+from generation.pipeline import GenerationPipeline
+from generation.adaptation.query import Query
+from generation.adaptation.node import Node
+from generation.adaptation.similarity import compute_event_similarity, compute_initial_similarities
+from generation.ontology.event_features import EventFeatureIndex
+from generation.ontology.folktale_graph import create_graph
+from generation.ontology.namespaces import ONT
+from common.utils.regex_utils import camel_to_snake
+from common.utils.loader import load_json
+import generation.utils.sbc_tools as sbc
+from rdflib.namespace import RDF
+from rdflib import URIRef
+import unittest
+
+class EventFeatureIndexTest(unittest.TestCase):
+	"""
+	Las características precalculadas de los eventos deben coincidir con las consultas de
+	EventRetriever que usa Node, y la puntuación en bloque de los candidatos iniciales con
+	compute_event_similarity de un nodo con un solo evento.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		cls.graph = graph = create_graph(folktales=[], filename="folktales.ttl", folder=sbc.data_path, build=False, render_html=False)
+		cls.pipeline = GenerationPipeline(graph)
+		cls.retriever = cls.pipeline.event_retriever
+		cls.features = EventFeatureIndex(graph)
+		cls.query = Query.model_validate(load_json("./query.json"))
+
+	def _sample(self, step: int) -> list[str]:
+		return sorted(self.features.events)[::step]
+
+	def test_matches_retriever(self):
+		self.assertEqual(set(self.retriever.get_all_event_instances()), set(self.features.events))
+
+		# Además de la muestra, los eventos con varios tipos, en los que hay que elegir uno
+		multiple_types = [
+			event for event in self.features.events
+			if sum(str(event_type).startswith(str(ONT)) for event_type in self.graph.objects(URIRef(event), RDF.type)) > 1
+		]
+		self.assertGreater(len(multiple_types), 0)
+
+		for event in self._sample(20) + multiple_types:
+			i = self.features.event_index[event]
+			self.assertEqual(self.features.types[i], self.retriever.get_type_name(event), msg=event)
+			self.assertEqual(self.features.places[i], self.retriever.get_place_class(event), msg=event)
+
+	def _assert_initial_similarities(self, query: Query, candidates: list[str]):
+		weights = self.pipeline.constructive_adaptation.weights
+		sim_calculator = self.pipeline.sim_calculator
+		similarities = compute_initial_similarities(candidates, query, weights, self.features, sim_calculator)
+
+		self.assertEqual(len(similarities), len(candidates))
+		for candidate, similarity in zip(candidates, similarities):
+			node = Node()
+			node.add_event(candidate, self.retriever)
+			expected = compute_event_similarity(node, query, weights, self.retriever, sim_calculator)
+			self.assertAlmostEqual(similarity, expected, places=9, msg=candidate)
+
+	def test_initial_similarities(self):
+		candidates = self.retriever.get_instances_of_class(self.query.events[0])
+		self.assertGreater(len(candidates), self.pipeline.constructive_adaptation.top_n)
+		self._assert_initial_similarities(self.query, candidates)
+
+	def test_initial_similarities_with_objects(self):
+		# La consulta de query.json no tiene objetos: se añaden algunos para cubrir ese término
+		objects = [camel_to_snake(object_class) for object_class in self.features.object_classes[::15]]
+		query = self.query.model_copy(update={"objects": objects})
+		self._assert_initial_similarities(query, self._sample(15))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,51 @@
+from generation.ontology.event_retriever import EventRetriever
+from generation.ontology.folktale_graph import create_graph
+from generation.ontology.namespaces import ONT
+import generation.utils.sbc_tools as sbc
+import unittest
+
+class DescribeResourcesTest(unittest.TestCase):
+	"""
+	describe_resources debe dar, para cada recurso, lo mismo que sus consultas individuales.
+	Se comprueba con una muestra fija de agentes, lugares, objetos y eventos del grafo real.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		cls.graph = create_graph(folktales=[], filename="folktales.ttl", folder=sbc.data_path, build=False, render_html=False)
+
+	def _sample(self, predicate, step: int):
+		return sorted({str(uri) for uri in self.graph.objects(None, predicate)})[::step]
+
+	def test_matches_individual_getters(self):
+		agents = self._sample(ONT.hasAgent, 10)
+		uris = agents + self._sample(ONT.hasPlace, 20) + self._sample(ONT.hasObject, 20) + self._sample(ONT.hasEvent, 40)
+		descriptions = EventRetriever(self.graph).describe_resources(uris)
+
+		# Un recuperador nuevo para no reutilizar nada de lo que haya calculado describe_resources
+		retriever = EventRetriever(self.graph)
+		self.assertEqual(list(descriptions), uris)
+		for uri in uris:
+			description = descriptions[uri]
+			self.assertEqual(description.label, retriever.get_label(uri), msg=uri)
+			self.assertEqual(description.type_name, retriever.get_type_name(uri), msg=uri)
+
+		traits = 0
+		for uri in agents:
+			description = descriptions[uri]
+			self.assertEqual(description.gender, retriever.get_gender(uri), msg=uri)
+			self.assertEqual(description.name, retriever.get_name(uri), msg=uri)
+			self.assertEqual(description.age_category, retriever.get_age_category(uri), msg=uri)
+			self.assertEqual(description.role_label, retriever.get_role_labels(uri), msg=uri)
+			self.assertEqual(description.personality_traits, retriever.get_personality_traits(uri), msg=uri)
+			self.assertEqual(description.personality_traits, sorted(description.personality_traits), msg=uri)
+			traits += len(description.personality_traits) > 1
+
+		# La muestra incluye agentes con varios rasgos, cuyo orden es lo que se comprueba
+		self.assertGreater(traits, 0)
+
+	def test_empty(self):
+		self.assertEqual(EventRetriever(self.graph).describe_resources([]), {})
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,91 @@
+from annotation.failures import FailedIndexes
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import threading
+import tempfile
+import unittest
+import time
+import os
+
+def _add_indexes(path: str, indexes: list[int]):
+	failed = FailedIndexes(path)
+	for idx in indexes:
+		failed.add(idx)
+
+class FailedIndexesTest(unittest.TestCase):
+	"""
+	Registro de índices fallidos compartido entre procesos: operaciones básicas, fichero de
+	bloqueo y escrituras simultáneas.
+	"""
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp_dir.name, "out", "failed.txt")
+		self.failed = FailedIndexes(self.path)
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def test_add_and_remove(self):
+		self.assertEqual(self.failed.read(), [])
+		for idx in (3, 1, 3, 7):
+			self.failed.add(idx)
+		self.assertEqual(self.failed.read(), [3, 1, 7])
+
+		self.failed.remove(1)
+		self.failed.remove(5)
+		self.assertEqual(self.failed.read(), [3, 7])
+		self.assertEqual(FailedIndexes(self.path).read(), [3, 7])
+		self.assertFalse(os.path.exists(f"{self.path}.lock"))
+
+	def test_waits_for_lock(self):
+		self.failed.add(1)
+		lock_path = f"{self.path}.lock"
+		open(lock_path, "w").close()
+
+		thread = threading.Thread(target=self.failed.add, args=(2,))
+		thread.start()
+		time.sleep(0.1)
+		# Mientras el bloqueo exista, el registro no cambia
+		self.assertTrue(thread.is_alive())
+		with open(self.path, "r", encoding="utf-8") as f:
+			self.assertEqual(f.read(), "1\n")
+
+		os.remove(lock_path)
+		thread.join(timeout=5)
+		self.assertFalse(thread.is_alive())
+		self.assertEqual(self.failed.read(), [1, 2])
+
+	def test_removes_stale_lock(self):
+		lock_path = f"{self.path}.lock"
+		os.makedirs(os.path.dirname(lock_path))
+		open(lock_path, "w").close()
+		old = time.time() - FailedIndexes.stale_lock - 1
+		os.utime(lock_path, (old, old))
+
+		start = time.perf_counter()
+		self.failed.add(4)
+		self.assertLess(time.perf_counter() - start, 1.0)
+		self.assertEqual(self.failed.read(), [4])
+		self.assertFalse(os.path.exists(lock_path))
+
+	def test_concurrent_threads(self):
+		with ThreadPoolExecutor(max_workers=8) as executor:
+			list(executor.map(lambda i: _add_indexes(self.path, range(i * 25, (i + 1) * 25)), range(8)))
+		self.assertEqual(sorted(self.failed.read()), list(range(200)))
+
+		with ThreadPoolExecutor(max_workers=8) as executor:
+			list(executor.map(self.failed.remove, range(0, 200, 2)))
+		self.assertEqual(sorted(self.failed.read()), list(range(1, 200, 2)))
+
+	def test_concurrent_processes(self):
+		processes = [multiprocessing.Process(target=_add_indexes, args=(self.path, range(i * 20, (i + 1) * 20))) for i in range(4)]
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join(timeout=30)
+			self.assertEqual(process.exitcode, 0)
+		self.assertEqual(sorted(self.failed.read()), list(range(80)))
+
+if __name__ == "__main__":
+	unittest.main()
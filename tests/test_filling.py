@@ -0,0 +1,132 @@
+from generation.pipeline import GenerationPipeline
+from generation.adaptation.query import Query
+from generation.adaptation.alignment import ItemContainer, process_events, process_roles, process_objects, process_places, build_unique_uri_dict
+from generation.adaptation.filling import fill_candidates
+from generation.adaptation.similarity import best_similarity
+from generation.adaptation.story_builder import story_builder
+from generation.ontology.folktale_graph import create_graph, FolktaleOntology
+from generation.ontology.namespaces import ONT
+from common.utils.regex_utils import snake_case_to_pascal_case, camel_to_snake
+from common.utils.loader import load_json
+import generation.utils.sbc_tools as sbc
+from rdflib.namespace import RDF
+from queue import PriorityQueue
+import unittest
+
+# Relación entre un evento y una entidad de cada tipo de contenedor
+ENTITY_PROPERTIES = {
+	"roles": "ont:hasAgent",
+	"objects": "ont:hasObject",
+	"places": "ont:hasPlace"
+}
+
+class FillCandidatesTest(unittest.TestCase):
+	"""
+	Rellenado de roles, objetos y lugares para la consulta de query.json sobre el grafo real.
+
+	La referencia es el recorrido secuencial original: los candidatos de cada clase se piden al
+	grafo, la secuencia de eventos de cada uno se consulta por separado, se puntúa con
+	best_similarity y path_similarity_class, y se conservan los n mejores en una PriorityQueue.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		graph = create_graph(folktales=[], filename="folktales.ttl", folder=sbc.data_path, build=False, render_html=False)
+		cls.pipeline = GenerationPipeline(graph)
+		cls.query = Query.model_validate(load_json("./query.json"))
+		cls.goal_node = cls.pipeline.constructive_adaptation.generate(cls.query, cls.query.max_events)
+
+	def _containers(self):
+		return process_events(self.goal_node.event_elements, self.pipeline.event_retriever)
+
+	def _candidate_uris(self, name: str, key: str) -> list[str]:
+		retriever = self.pipeline.event_retriever
+		getter = {
+			"roles": retriever.get_roles_by_type_and_genre,
+			"objects": retriever.get_objects_by_type_and_genre,
+			"places": retriever.get_place_by_type_and_genre
+		}[name]
+		genre = FolktaleOntology.GENRE_MAP[camel_to_snake(self.query.genre)]
+		return [uri for uri, _, _ in getter(snake_case_to_pascal_case(key), genre)]
+
+	def _event_types(self, name: str, uri: str) -> list[str]:
+		query = f"""
+		PREFIX rdf: <{RDF}>
+		PREFIX ont: <{ONT}>
+
+		SELECT DISTINCT ?event ?eventType ?position
+		WHERE {{
+			?event {ENTITY_PROPERTIES[name]} <{uri}> ;
+				rdf:type ?eventType ;
+				ont:sequenceIndex ?position .
+		}}
+		"""
+		rows = self.pipeline.event_retriever.execute_query(query)
+		events = sorted((int(row.position), str(row.eventType).split("/")[-1]) for row in rows)
+		return [event_type for _, event_type in events]
+
+	def _sequential_candidates(self, name: str, container_dict: dict[str, list[ItemContainer]]):
+		sim = self.pipeline.sim_calculator
+		result = {}
+		for key, container_list in container_dict.items():
+			queues = []
+			for container in container_list:
+				queue: PriorityQueue[tuple[float, str]] = PriorityQueue()
+				for entry in container.candidates.ascending():
+					queue.put(entry)
+				queues.append(queue)
+
+			for uri in sorted(set(self._candidate_uris(name, key))):
+				event_types = self._event_types(name, uri)
+				for container, queue in zip(container_list, queues):
+					score, _ = best_similarity(event_types, container.event_types, sim.path_similarity_class)
+					queue.put((score, uri))
+					if queue.qsize() > container.n:
+						queue.get()
+
+			result[key] = [sorted(queue.queue, key=lambda entry: (-entry[0], entry[1])) for queue in queues]
+		return result
+
+	def test_matches_sequential_scoring(self):
+		places, objects, roles = self._containers()
+		expected = {name: self._sequential_candidates(name, containers) for name, containers in [("roles", roles), ("objects", objects), ("places", places)]}
+
+		fill_candidates(self.query.genre, roles, objects, places, self.pipeline.sequence_index, self.pipeline.sim_table, workers=4)
+
+		for name, container_dict in [("roles", roles), ("objects", objects), ("places", places)]:
+			for key, container_list in container_dict.items():
+				for container, entries in zip(container_list, expected[name][key]):
+					actual = container.candidates.descending()
+					self.assertEqual([uri for _, uri in actual], [uri for _, uri in entries], msg=f"{name}/{key}")
+					for (score, _), (expected_score, _) in zip(actual, entries):
+						self.assertAlmostEqual(score, expected_score, places=9, msg=f"{name}/{key}")
+
+	def test_thread_pool_matches_sequential_filling(self):
+		genre = self.query.genre
+		index, table = self.pipeline.sequence_index, self.pipeline.sim_table
+
+		places, objects, roles = self._containers()
+		process_roles(genre, roles, index, table)
+		process_objects(genre, objects, index, table)
+		process_places(genre, places, index, table)
+		sequential = [build_unique_uri_dict(containers) for containers in (places, objects, roles)]
+
+		places, objects, roles = self._containers()
+		fill_candidates(genre, roles, objects, places, index, table, workers=4)
+		parallel = [build_unique_uri_dict(containers) for containers in (places, objects, roles)]
+
+		self.assertEqual(parallel, sequential)
+		self.assertEqual([list(uri_dict) for uri_dict in parallel], [list(uri_dict) for uri_dict in sequential])
+
+		retriever = self.pipeline.event_retriever
+		expected = story_builder(self.query.title, genre, self.goal_node.event_elements, *sequential, retriever)
+		actual = story_builder(self.query.title, genre, self.goal_node.event_elements, *parallel, retriever)
+		self.assertEqual(actual.model_dump_json(), expected.model_dump_json())
+
+	def test_event_elements_are_ordered(self):
+		for data in self.goal_node.event_elements.values():
+			self.assertEqual(list(data["roles"]), sorted(data["roles"]))
+			self.assertEqual(list(data["object"]), sorted(data["object"]))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,85 @@
+from generation.ontology.folktale_graph import create_graph, sequence_positions
+from generation.ontology.namespaces import ONT
+import generation.utils.sbc_tools as sbc
+from rdflib import Graph, URIRef
+import random
+import unittest
+
+EVENT = "https://example.org/event/"
+
+def _positions_by_query(graph: Graph, events: list[URIRef]) -> dict[URIRef, int]:
+	"""
+	Posiciones con la consulta con la que antes se calculaban al consultar el grafo.
+	"""
+	query = f"""
+	PREFIX ont: <{ONT}>
+
+	SELECT ?event (COUNT(?prev) AS ?order)
+	WHERE {{
+		VALUES ?event {{ {" ".join(f"<{event}>" for event in events)} }}
+		OPTIONAL {{ ?prev ont:postEvent+ ?event . }}
+	}}
+	GROUP BY ?event
+	"""
+	orders = {row.event: int(row.order) for row in graph.query(query)}
+	# rdflib no devuelve fila para los eventos sin predecesores
+	return {event: orders.get(event, 0) for event in events}
+
+class SequencePositionsTest(unittest.TestCase):
+	"""
+	ont:sequenceIndex debe ser el número de predecesores distintos por ont:postEvent+, lo mismo
+	que contaban las consultas de eventos ordenados.
+	"""
+
+	def _events(self, n: int) -> list[URIRef]:
+		return [URIRef(f"{EVENT}{i}") for i in range(n)]
+
+	def _assert_matches_query(self, sequence: list[tuple[URIRef, URIRef]], events: list[URIRef]):
+		graph = Graph()
+		for pre_event, event in sequence:
+			graph.add((pre_event, ONT.postEvent, event))
+		positions = sequence_positions(sequence)
+		expected = _positions_by_query(graph, events)
+		self.assertEqual({event: positions.get(event, 0) for event in events}, expected)
+
+	def test_chain(self):
+		events = self._events(4)
+		sequence = list(zip(events, events[1:]))
+		self.assertEqual(sequence_positions(sequence), {events[1]: 1, events[2]: 2, events[3]: 3})
+		self._assert_matches_query(sequence, events)
+
+	def test_repeated_event(self):
+		# Un cuento que vuelve a un evento ya contado forma un ciclo
+		a, b, c = self._events(3)
+		sequence = [(a, b), (b, a), (a, c)]
+		self.assertEqual(sequence_positions(sequence), {a: 2, b: 2, c: 2})
+		self._assert_matches_query(sequence, [a, b, c])
+
+	def test_random_sequences(self):
+		rng = random.Random(0)
+		events = self._events(8)
+		for _ in range(50):
+			walk = [rng.choice(events) for _ in range(rng.randint(1, 12))]
+			sequence = [(pre_event, event) for pre_event, event in zip(walk, walk[1:])]
+			self._assert_matches_query(sequence, sorted(set(walk)))
+
+class SequenceIndexTest(unittest.TestCase):
+	"""
+	En el grafo real, el índice guardado (o añadido al cargar un grafo antiguo) coincide con la
+	consulta por ont:postEvent+.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		cls.graph = create_graph(folktales=[], filename="folktales.ttl", folder=sbc.data_path, build=False, render_html=False)
+
+	def test_matches_query(self):
+		events = sorted(set(self.graph.objects(None, ONT.hasEvent)))
+		self.assertEqual(len(events), len(set(self.graph.subjects(ONT.sequenceIndex, None))))
+
+		sample = events[::25]
+		stored = {event: self.graph.value(event, ONT.sequenceIndex).toPython() for event in sample}
+		self.assertEqual(stored, _positions_by_query(self.graph, sample))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,259 @@
+from annotation.tools.llm import LLMCache, LLMClient, ModelPool, ainvoke
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+import tempfile
+import asyncio
+import unittest
+import os
+
+prompt = ChatPromptTemplate.from_messages([
+	("system", "You answer questions about {topic}."),
+	("human", "{question}")
+])
+
+class EchoModel(BaseChatModel):
+	"""
+	Modelo falso que repite la última pregunta tras `latency` segundos. Cuenta las llamadas y el
+	máximo de peticiones simultáneas. Con `failures`, las primeras llamadas fallan.
+	"""
+	model_name: str = "echo"
+	temperature: float = 0.0
+	latency: float = 0.01
+	failures: int = 0
+	calls: int = 0
+	in_flight: int = 0
+	peak_in_flight: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return "echo"
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		raise NotImplementedError
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		self.calls += 1
+		if self.calls <= self.failures:
+			raise ConnectionError(f"{self.model_name} unavailable.")
+		self.in_flight += 1
+		self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+		try:
+			await asyncio.sleep(self.latency)
+		finally:
+			self.in_flight -= 1
+		return ChatResult(generations=[ChatGeneration(message=AIMessage(f"{self.model_name}: {messages[-1].content}"))])
+
+async def _ask(model, n: int, topic: str = "folktales"):
+	return await asyncio.gather(*(ainvoke(model, prompt, {"topic": topic, "question": f"question {i}"}) for i in range(n)))
+
+class Genre(BaseModel):
+	genre: str
+
+class Place(BaseModel):
+	place: str
+
+class LLMClientTest(unittest.TestCase):
+	"""
+	El límite de peticiones en vuelo es el de cada cliente, no un estado global del módulo.
+	"""
+
+	def test_limit(self):
+		model = EchoModel()
+		responses = asyncio.run(_ask(LLMClient(model, max_requests=3), 10))
+		self.assertEqual([response.content for response in responses], [f"echo: question {i}" for i in range(10)])
+		self.assertEqual(model.calls, 10)
+		self.assertEqual(model.peak_in_flight, 3)
+
+	def test_without_limit(self):
+		model = EchoModel()
+		asyncio.run(_ask(LLMClient(model), 10))
+		self.assertEqual(model.peak_in_flight, 10)
+
+		model = EchoModel()
+		asyncio.run(_ask(model, 10))
+		self.assertEqual(model.peak_in_flight, 10)
+
+	def test_independent_clients(self):
+		slow, fast = EchoModel(), EchoModel()
+
+		async def run():
+			await asyncio.gather(_ask(LLMClient(slow, max_requests=1), 6), _ask(LLMClient(fast, max_requests=4), 6))
+
+		asyncio.run(run())
+		self.assertEqual(slow.peak_in_flight, 1)
+		self.assertEqual(fast.peak_in_flight, 4)
+
+	def test_reused_across_event_loops(self):
+		model = EchoModel()
+		client = LLMClient(model, max_requests=2)
+		for _ in range(2):
+			asyncio.run(_ask(client, 5))
+		self.assertEqual(model.calls, 10)
+		self.assertEqual(model.peak_in_flight, 2)
+
+class LLMCacheTest(unittest.TestCase):
+	"""
+	Una respuesta en caché evita la llamada al modelo, y la clave distingue el modelo, su
+	temperatura, todos los mensajes del prompt, el esquema y el número de muestra.
+	"""
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp_dir.name, "cache", "llm.sqlite")
+		self.cache = LLMCache(self.path)
+
+	def tearDown(self):
+		self.cache.close()
+		self.tmp_dir.cleanup()
+
+	def _ask(self, model: EchoModel, topic: str = "folktales", question: str = "question", sample: int = 0, stage: str = "genre"):
+		client = LLMClient(model, cache=self.cache)
+		return asyncio.run(ainvoke(client, prompt, {"topic": topic, "question": question}, stage=stage, sample=sample))
+
+	def test_hit_skips_model(self):
+		model = EchoModel()
+		first = self._ask(model)
+		second = self._ask(model)
+
+		self.assertEqual(model.calls, 1)
+		self.assertEqual(second.content, first.content)
+		self.assertEqual(self.cache.hits["genre"], 1)
+		self.assertEqual(self.cache.misses["genre"], 1)
+
+	def test_persists(self):
+		self._ask(EchoModel())
+		self.cache.close()
+
+		self.cache = LLMCache(self.path)
+		model = EchoModel()
+		self.assertEqual(self._ask(model).content, "echo: question")
+		self.assertEqual(model.calls, 0)
+
+	def test_key_includes_model(self):
+		self._ask(EchoModel(model_name="a"))
+
+		other_model = EchoModel(model_name="b")
+		self.assertEqual(self._ask(other_model).content, "b: question")
+		self.assertEqual(other_model.calls, 1)
+
+		other_temperature = EchoModel(model_name="a", temperature=0.5)
+		self._ask(other_temperature)
+		self.assertEqual(other_temperature.calls, 1)
+
+	def test_key_includes_all_messages(self):
+		model = EchoModel()
+		self._ask(model)
+		# Solo cambia el mensaje de sistema, no el último
+		self._ask(model, topic="legends")
+		self._ask(model, question="other question")
+		self.assertEqual(model.calls, 3)
+
+	def test_key_includes_sample(self):
+		model = EchoModel()
+		self._ask(model, sample=0)
+		self._ask(model, sample=1)
+		self._ask(model, sample=1)
+		self.assertEqual(model.calls, 2)
+
+	def test_key_includes_schema(self):
+		model = EchoModel()
+		messages = prompt.invoke({"topic": "folktales", "question": "question"}).to_messages()
+		keys = {
+			LLMCache.key(model, messages),
+			LLMCache.key(model, messages, schema=Genre),
+			LLMCache.key(model, messages, schema=Place),
+			LLMCache.key(model, messages, tools=[Genre])
+		}
+		self.assertEqual(len(keys), 4)
+		self.assertEqual(LLMCache.key(model, messages, schema=Genre), LLMCache.key(EchoModel(), messages, schema=Genre))
+
+	def test_invalidate(self):
+		model = EchoModel()
+		self._ask(model, stage="genre")
+		self._ask(model, question="places?", stage="places")
+
+		self.assertEqual(self.cache.invalidate(["genre"]), 1)
+		self._ask(model, stage="genre")
+		self._ask(model, question="places?", stage="places")
+		self.assertEqual(model.calls, 3)
+
+	def test_failures_are_not_cached(self):
+		model = EchoModel(failures=1)
+		with self.assertRaises(ConnectionError):
+			self._ask(model)
+		self.assertEqual(self._ask(model).content, "echo: question")
+		self.assertEqual(model.calls, 2)
+
+class ModelPoolTest(unittest.TestCase):
+	"""
+	Reparto de peticiones entre endpoints y reintento en otro endpoint cuando uno falla.
+	"""
+
+	def _pool(self, failures: list[int], cooldown: float = 30.0) -> ModelPool:
+		return ModelPool([EchoModel(model_name=f"m{i}", failures=n) for i, n in enumerate(failures)], cooldown=cooldown)
+
+	def test_least_loaded(self):
+		pool = self._pool([0, 0, 0])
+		asyncio.run(_ask(pool, 3))
+		self.assertEqual(pool.requests, [1, 1, 1])
+		self.assertEqual([model.peak_in_flight for model in pool.models], [1, 1, 1])
+
+		# Sin peticiones en vuelo, gana el endpoint con menos peticiones; a igualdad, el primero
+		pool = self._pool([0, 0, 0])
+		for i in range(5):
+			asyncio.run(_ask(pool, 1))
+		self.assertEqual(pool.requests, [2, 2, 1])
+		self.assertEqual(pool.in_flight, [0, 0, 0])
+
+	def test_failover_and_cooldown(self):
+		pool = self._pool([1, 0, 0])
+		response = asyncio.run(ainvoke(pool, prompt, {"topic": "folktales", "question": "question"}))
+		self.assertEqual(response.content, "m1: question")
+		self.assertEqual(pool.requests, [1, 1, 0])
+		self.assertEqual(pool.failures, [1, 0, 0])
+
+		# El endpoint que ha fallado no recibe peticiones mientras dura la espera
+		for _ in range(4):
+			asyncio.run(_ask(pool, 1))
+		self.assertEqual(pool.requests, [1, 3, 2])
+
+		# Sin espera, vuelve a recibir peticiones en cuanto es el menos cargado
+		pool = self._pool([1, 0], cooldown=0.0)
+		for _ in range(3):
+			asyncio.run(_ask(pool, 1))
+		self.assertEqual(pool.requests, [2, 2])
+		self.assertEqual(pool.failures, [1, 0])
+
+	def test_all_endpoints_fail(self):
+		pool = self._pool([1, 1])
+		with self.assertRaises(ConnectionError):
+			asyncio.run(_ask(pool, 1))
+		self.assertEqual(pool.requests, [1, 1])
+		self.assertEqual(pool.failures, [1, 1])
+
+		# Si todos están en espera, se prueba igualmente con alguno
+		self.assertEqual(asyncio.run(_ask(pool, 1))[0].content, "m0: question 0")
+
+	def test_format_errors_are_not_retried(self):
+		for error in (OutputParserException("bad output"), ValidationError.from_exception_data("Genre", [])):
+			pool = self._pool([0, 0])
+
+			async def call(model):
+				raise error
+
+			with self.assertRaises(type(error)):
+				asyncio.run(pool.run(call))
+			self.assertEqual(pool.requests, [1, 0])
+			self.assertEqual(pool.failures, [0, 0])
+
+	def test_empty(self):
+		with self.assertRaises(ValueError):
+			ModelPool([])
+
+if __name__ == "__main__":
+	unittest.main()
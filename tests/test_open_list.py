@@ -0,0 +1,99 @@
+from generation.adaptation.open_list import BoundedOpenList
+import bisect
+import random
+import unittest
+
+class SortedOpenList:
+	"""
+	Referencia: la misma lista abierta sobre una lista ordenada.
+	"""
+
+	def __init__(self, max_size=None):
+		self.max_size = max_size
+		self.entries = []
+		self.evicted = 0
+
+	def push(self, entry) -> bool:
+		if self.max_size is not None and len(self.entries) >= self.max_size:
+			self.evicted += 1
+			if entry >= self.entries[-1]:
+				return False
+			self.entries.pop()
+		bisect.insort(self.entries, entry)
+		return True
+
+	def pop(self):
+		return self.entries.pop(0)
+
+	def pop_max(self):
+		return self.entries.pop()
+
+class BoundedOpenListTest(unittest.TestCase):
+	"""
+	El min-max heap debe comportarse como una lista ordenada: mismo orden de extracción y
+	mismas entradas conservadas al descartar, también con empates en f.
+	"""
+
+	def _check_heap(self, open_list: BoundedOpenList):
+		# Cada nodo de un nivel mínimo (máximo) es menor (mayor) o igual que sus descendientes
+		heap = open_list.heap
+		for index in range(len(heap)):
+			children = [child for child in (2 * index + 1, 2 * index + 2) if child < len(heap)]
+			descendants = children + [grandchild for child in children for grandchild in (2 * child + 1, 2 * child + 2) if grandchild < len(heap)]
+			for descendant in descendants:
+				if open_list._is_min_level(index):
+					self.assertLessEqual(heap[index], heap[descendant])
+				else:
+					self.assertGreaterEqual(heap[index], heap[descendant])
+
+	def _run(self, seed: int, max_size, n_operations: int = 400, n_values: int = 6):
+		rng = random.Random(seed)
+		open_list = BoundedOpenList(max_size)
+		reference = SortedOpenList(max_size)
+		counter = 0
+		peak_size = 0
+
+		for _ in range(n_operations):
+			operation = rng.random()
+			if operation < 0.6 or not reference.entries:
+				# Pocos valores de f para que haya muchos empates; el contador los desempata
+				entry = (float(rng.randrange(n_values)), counter, object())
+				counter += 1
+				self.assertEqual(open_list.push(entry), reference.push(entry))
+				peak_size = max(peak_size, len(reference.entries))
+			elif operation < 0.9:
+				self.assertIs(open_list.pop(), reference.pop())
+			else:
+				self.assertIs(open_list.pop_max(), reference.pop_max())
+
+			self.assertEqual(len(open_list), len(reference.entries))
+			self.assertEqual(sorted(open_list.heap), reference.entries)
+			self._check_heap(open_list)
+
+		self.assertEqual(open_list.evicted, reference.evicted)
+		self.assertEqual(open_list.peak_size, peak_size)
+
+		# Lo que queda sale en el mismo orden
+		while reference.entries:
+			self.assertIs(open_list.pop(), reference.pop())
+		self.assertFalse(open_list)
+
+	def test_unbounded(self):
+		for seed in range(20):
+			self._run(seed, max_size=None)
+
+	def test_bounded(self):
+		for seed in range(20):
+			for max_size in (1, 2, 3, 5, 8, 13):
+				self._run(seed, max_size)
+
+	def test_all_ties(self):
+		for seed in range(10):
+			self._run(seed, max_size=7, n_values=1)
+
+	def test_invalid_size(self):
+		with self.assertRaises(ValueError):
+			BoundedOpenList(0)
+
+if __name__ == "__main__":
+	unittest.main()
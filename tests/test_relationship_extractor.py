@@ -0,0 +1,150 @@
+from annotation.tools.relationship_extractor import extract_relationships, extract_relationships_matrix
+from common.models.agent import Agent, Relationship
+from common.models.folktale import AnnotatedFolktale
+from common.utils.loader import load_json, out_dir
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from typing import Optional
+import asyncio
+import re
+import unittest
+
+def load_agents(n: int) -> list[Agent]:
+	agent = AnnotatedFolktale(**load_json(f"{out_dir}/11_father_frost.json")).agents[0]
+	return [agent.model_copy(update={"instance_name": f"agent_{i}"}) for i in range(n)]
+
+def scripted_relationship(i: int, j: int) -> str:
+	return ["knows", "friend", "enemy", "family_member", "none"][(i + 2 * j) % 5]
+
+class PairwiseModel(BaseChatModel):
+	"""
+	Modelo falso para el modo por parejas: responde con scripted_relationship de la pareja del
+	prompt. Las parejas con índices más bajos tardan más, así que terminan en otro orden.
+	"""
+	latency: float = 0.002
+	calls: int = 0
+	in_flight: int = 0
+	peak_in_flight: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return "pairwise"
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		raise NotImplementedError
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		i, j = (int(index) for index in re.search(r"between 'agent_(\d+)' and 'agent_(\d+)'", str(messages[-1].content)).groups())
+		self.calls += 1
+		self.in_flight += 1
+		self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+		try:
+			await asyncio.sleep(self.latency * (20 - i - j))
+		finally:
+			self.in_flight -= 1
+		return ChatResult(generations=[ChatGeneration(message=AIMessage(f"They meet. Therefore, their relationship is: {scripted_relationship(i, j)}."))])
+
+class PairwiseRelationshipsTest(unittest.TestCase):
+	"""
+	Las parejas se consultan a la vez, pero el resultado sigue el orden de las parejas y omite
+	las que no tienen relación.
+	"""
+
+	def test_order_and_concurrency(self):
+		agents = load_agents(6)
+		model = PairwiseModel()
+		relationships = asyncio.run(extract_relationships(model, "A folktale.", agents))
+
+		expected = [
+			Relationship(agent=i, other=j, relationship=scripted_relationship(i, j))
+			for i in range(6) for j in range(i + 1, 6)
+			if scripted_relationship(i, j) != "none"
+		]
+		self.assertEqual(relationships, expected)
+		self.assertEqual(model.calls, 15)
+		self.assertEqual(model.peak_in_flight, 15)
+
+	def test_fewer_than_two_agents(self):
+		model = PairwiseModel()
+		self.assertEqual(asyncio.run(extract_relationships(model, "A folktale.", load_agents(1))), [])
+		self.assertEqual(model.calls, 0)
+
+class MatrixModel(BaseChatModel):
+	"""
+	Modelo falso para el modo estructurado: devuelve todas las parejas de los personajes del
+	prompt con scripted_relationship y, además, respuestas que hay que descartar: las parejas
+	con relación repetidas al revés, un personaje consigo mismo, un índice fuera de rango y una pareja con el
+	último personaje del cuento, que solo pertenece a la llamada de su grupo.
+	"""
+	n_agents: int
+	calls: int = 0
+	characters: list[list[int]] = []
+
+	@property
+	def _llm_type(self) -> str:
+		return "matrix"
+
+	def bind_tools(self, tools, tool_choice: Optional[str] = None, **kwargs):
+		return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		raise NotImplementedError
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		self.calls += 1
+		indices = [int(i) for i in re.findall(r"^- (\d+)\. ", str(messages[-1].content), flags=re.MULTILINE)]
+		self.characters.append(indices)
+
+		pairs = [(agent, other) for n, agent in enumerate(indices) for other in indices[n + 1:]]
+		entries = [{"agent": agent, "other": other, "relationship": scripted_relationship(agent, other)} for agent, other in pairs]
+		entries += [{"agent": other, "other": agent, "relationship": "knows"} for agent, other in pairs if scripted_relationship(agent, other) != "none"]
+		entries += [
+			{"agent": indices[0], "other": indices[0], "relationship": "friend"},
+			{"agent": indices[0], "other": self.n_agents, "relationship": "friend"},
+			{"agent": indices[0], "other": self.n_agents - 1, "relationship": "enemy"}
+		]
+
+		name = kwargs["tools"][0]["function"]["name"]
+		message = AIMessage("", tool_calls=[{"name": name, "args": {"relationships": entries}, "id": str(self.calls)}])
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+class MatrixRelationshipsTest(unittest.TestCase):
+	"""
+	El modo estructurado pregunta cada pareja una sola vez, aunque los personajes se dividan en
+	grupos, y descarta las respuestas inválidas o que no corresponden a la llamada.
+	"""
+
+	def _expected(self, n_agents: int) -> list[Relationship]:
+		expected = []
+		for i in range(n_agents):
+			for j in range(i + 1, n_agents):
+				relationship = scripted_relationship(i, j)
+				if relationship != "none":
+					expected.append(Relationship(agent=i, other=j, relationship=relationship))
+		return expected
+
+	def test_single_call(self):
+		model = MatrixModel(n_agents=5)
+		relationships = asyncio.run(extract_relationships_matrix(model, "A folktale.", load_agents(5), group_size=12))
+
+		self.assertEqual(model.calls, 1)
+		self.assertEqual(relationships, self._expected(5))
+
+	def test_groups(self):
+		model = MatrixModel(n_agents=5)
+		relationships = asyncio.run(extract_relationships_matrix(model, "A folktale.", load_agents(5), group_size=2))
+
+		# Grupos [0, 1], [2, 3] y [4]: una llamada por cada par de grupos
+		self.assertEqual(model.calls, 6)
+		self.assertEqual(sorted(model.characters), [[0, 1], [0, 1, 2, 3], [0, 1, 4], [2, 3], [2, 3, 4], [4]])
+		self.assertEqual(relationships, self._expected(5))
+
+	def test_fewer_than_two_agents(self):
+		model = MatrixModel(n_agents=1)
+		self.assertEqual(asyncio.run(extract_relationships_matrix(model, "A folktale.", load_agents(1))), [])
+		self.assertEqual(model.calls, 0)
+
+if __name__ == "__main__":
+	unittest.main()
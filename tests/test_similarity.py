@@ -0,0 +1,35 @@
+from generation.adaptation.similarity import batch_best_similarity, best_similarity
+import numpy as np
+import unittest
+
+class BatchBestSimilarityTest(unittest.TestCase):
+	"""
+	batch_best_similarity debe dar, para cada par de secuencias, el mismo score que best_similarity.
+	"""
+
+	def setUp(self):
+		self.rng = np.random.default_rng(0)
+		self.table = self.rng.random((12, 12))
+
+	def _sequences(self, count: int, max_length: int):
+		return [self.rng.integers(0, len(self.table), size=self.rng.integers(0, max_length + 1)) for _ in range(count)]
+
+	def _assert_matches(self, A: list[np.ndarray], B: list[np.ndarray]):
+		scores = batch_best_similarity(A, B, self.table)
+		self.assertEqual(scores.shape, (len(A), len(B)))
+		for k, a in enumerate(A):
+			for c, b in enumerate(B):
+				expected, _ = best_similarity(list(a), list(b), lambda x, y: self.table[x, y])
+				self.assertAlmostEqual(scores[k, c], expected, places=9, msg=f"A[{k}]={a.tolist()} B[{c}]={b.tolist()}")
+
+	def test_random_sequences(self):
+		for _ in range(5):
+			self._assert_matches(self._sequences(8, 7), self._sequences(6, 7))
+
+	def test_empty_and_single_sequences(self):
+		A = [np.array([], dtype=np.intp), np.array([3]), np.array([1, 2, 3])]
+		B = [np.array([], dtype=np.intp), np.array([3]), np.array([2, 2, 1, 3])]
+		self._assert_matches(A, B)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,185 @@
+from annotation.stages import Stage, StageCheckpoints, run_stages, critical_path
+from annotation.pipeline import AnnotationOptions, annotation_fingerprint
+import tempfile
+import asyncio
+import time
+import unittest
+import os
+
+class RunStagesTest(unittest.TestCase):
+	"""
+	Grafo de etapas: cada etapa empieza cuando terminan sus dependencias y las independientes
+	se ejecutan a la vez.
+	"""
+
+	def _stages(self, durations: dict[str, float], deps: dict[str, list[str]], log: list[tuple[str, str]]):
+		def stage(name: str):
+			async def func(*values):
+				log.append(("start", name))
+				await asyncio.sleep(durations[name])
+				log.append(("end", name))
+				return (name, values)
+			return Stage(func, deps.get(name))
+		return {name: stage(name) for name in durations}
+
+	def test_dependency_order(self):
+		log = []
+		deps = {"agents": ["places"], "relationships": ["agents"], "elements": ["segments", "agents"], "events": ["segments", "elements"]}
+		durations = {"events": 0.0, "elements": 0.01, "relationships": 0.02, "agents": 0.01, "places": 0.02, "segments": 0.03, "genre": 0.01}
+		results, timings = asyncio.run(run_stages(self._stages(durations, deps, log)))
+
+		self.assertEqual(set(results), set(durations))
+		self.assertEqual(set(timings), set(durations))
+		for name, stage_deps in deps.items():
+			start = log.index(("start", name))
+			for dep in stage_deps:
+				self.assertLess(log.index(("end", dep)), start, msg=f"{dep} -> {name}")
+
+		# Cada etapa recibe los resultados de sus dependencias en el orden de `deps`
+		self.assertEqual(results["elements"], ("elements", (results["segments"], results["agents"])))
+		self.assertEqual(results["genre"], ("genre", ()))
+
+	def test_independent_stages_overlap(self):
+		log = []
+		durations = {name: 0.1 for name in ("genre", "objects", "places", "segments")}
+		start = time.perf_counter()
+		asyncio.run(run_stages(self._stages(durations, {}, log)))
+		elapsed = time.perf_counter() - start
+
+		self.assertLess(elapsed, 0.3)
+		self.assertEqual([event for event, _ in log[:4]], ["start"] * 4)
+
+	def test_cycle(self):
+		log = []
+		stages = self._stages({"a": 0.0, "b": 0.0}, {"a": ["b"], "b": ["a"]}, log)
+		with self.assertRaises(ValueError):
+			asyncio.run(run_stages(stages))
+
+	def test_failure_cancels_running_stages(self):
+		cancelled = []
+
+		async def slow():
+			try:
+				await asyncio.sleep(10)
+			except asyncio.CancelledError:
+				cancelled.append("slow")
+				raise
+
+		async def failing():
+			await asyncio.sleep(0.01)
+			raise RuntimeError("stage failed")
+
+		async def after(value):
+			return value
+
+		stages = {"slow": Stage(slow), "failing": Stage(failing), "after": Stage(after, ["slow"])}
+		start = time.perf_counter()
+		with self.assertRaises(RuntimeError):
+			asyncio.run(run_stages(stages))
+
+		self.assertLess(time.perf_counter() - start, 1.0)
+		self.assertEqual(cancelled, ["slow"])
+
+class CriticalPathTest(unittest.TestCase):
+	"""
+	critical_path debe dar la duración del camino más largo del grafo según las duraciones medidas.
+	"""
+
+	def setUp(self):
+		async def noop(*values):
+			return None
+		deps = {"b": ["a"], "c": ["b"], "e": ["a", "d"]}
+		self.stages = {name: Stage(noop, deps.get(name)) for name in "abcde"}
+
+	def test_longest_path(self):
+		timings = {"a": 1.0, "b": 2.0, "c": 1.0, "d": 3.0, "e": 0.5}
+		# a -> b -> c = 4, d -> e = 3.5, a -> e = 1.5
+		self.assertEqual(critical_path(self.stages, timings), 4.0)
+
+		timings["d"] = 4.0
+		self.assertEqual(critical_path(self.stages, timings), 4.5)
+
+	def test_missing_timings(self):
+		# Las etapas sin duración (por ejemplo, restauradas de un checkpoint) no suman
+		self.assertEqual(critical_path(self.stages, {"c": 2.0}), 2.0)
+		self.assertEqual(critical_path(self.stages, {}), 0.0)
+		self.assertEqual(critical_path({}, {}), 0.0)
+
+class StageCheckpointsTest(unittest.TestCase):
+	"""
+	Al reanudar una anotación con la misma huella, las etapas guardadas no se repiten; con otra
+	huella, se descartan.
+	"""
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.folder = os.path.join(self.tmp_dir.name, "checkpoints", "tale")
+		self.calls = {"segments": 0, "events": 0}
+		self.fail_events = False
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def _run(self, fingerprint: str):
+		async def segments():
+			self.calls["segments"] += 1
+			return ["segment 0", "segment 1"]
+
+		async def events(values):
+			self.calls["events"] += 1
+			if self.fail_events:
+				raise RuntimeError("stage failed")
+			return [value.upper() for value in values]
+
+		checkpoints = StageCheckpoints(self.folder, fingerprint)
+		stages = {
+			"segments": checkpoints.wrap("segments", Stage(segments), list[str]),
+			"events": checkpoints.wrap("events", Stage(events, ["segments"]), list[str])
+		}
+		results, _ = asyncio.run(run_stages(stages))
+		return results
+
+	def test_resume_skips_completed_stages(self):
+		self.fail_events = True
+		with self.assertRaises(RuntimeError):
+			self._run("a")
+		self.assertEqual(self.calls, {"segments": 1, "events": 1})
+
+		# Solo se repite la etapa que falló, con el resultado guardado de su dependencia
+		self.fail_events = False
+		results = self._run("a")
+		self.assertEqual(results["events"], ["SEGMENT 0", "SEGMENT 1"])
+		self.assertEqual(self.calls, {"segments": 1, "events": 2})
+
+		self.assertEqual(self._run("a"), results)
+		self.assertEqual(self.calls, {"segments": 1, "events": 2})
+
+	def test_fingerprint_invalidates(self):
+		self._run("a")
+		self._run("b")
+		self.assertEqual(self.calls, {"segments": 2, "events": 2})
+
+		# La huella nueva sustituye a la anterior
+		self._run("b")
+		self.assertEqual(self.calls, {"segments": 2, "events": 2})
+		self._run("a")
+		self.assertEqual(self.calls, {"segments": 3, "events": 3})
+
+	def test_clear(self):
+		self._run("a")
+		StageCheckpoints(self.folder, "a").clear()
+		self.assertFalse(os.path.exists(self.folder))
+		self._run("a")
+		self.assertEqual(self.calls, {"segments": 2, "events": 2})
+
+	def test_annotation_fingerprint(self):
+		options = AnnotationOptions()
+		fingerprint = annotation_fingerprint("A folktale.", options)
+
+		self.assertEqual(fingerprint, annotation_fingerprint("A folktale.", AnnotationOptions()))
+		self.assertNotEqual(fingerprint, annotation_fingerprint("Another folktale.", options))
+		self.assertNotEqual(fingerprint, annotation_fingerprint("A folktale.", AnnotationOptions(n_rounds=5)))
+		self.assertNotEqual(fingerprint, annotation_fingerprint("A folktale.", AnnotationOptions(relationship_mode="matrix")))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,119 @@
+from generation.story_generator import StoryStream, generate_stories, generate_story
+from generation.utils.loader import load_generation_examples
+from generation.utils.story_cache import StoryCache
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from typing import Optional
+import tempfile
+import asyncio
+import io
+import re
+import unittest
+
+class TitleEchoModel(BaseChatModel):
+	"""
+	Modelo falso que responde con el título del último cuento del prompt, tras `latency` segundos.
+	Registra el máximo de peticiones simultáneas y falla las `failures` primeras llamadas.
+	"""
+	latency: float = 0.01
+	failures: int = 0
+	calls: int = 0
+	in_flight: int = 0
+	peak_in_flight: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return "title-echo"
+
+	def _response(self, messages: list[BaseMessage]) -> ChatResult:
+		title = re.findall(r'"title": "([^"]*)"', str(messages[-1].content))[-1]
+		return ChatResult(generations=[ChatGeneration(message=AIMessage(f" Story of {title}. "))])
+
+	def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		return self._response(messages)
+
+	async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+		self.calls += 1
+		if self.calls <= self.failures:
+			raise ConnectionError("Model unavailable.")
+		self.in_flight += 1
+		self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+		try:
+			await asyncio.sleep(self.latency)
+		finally:
+			self.in_flight -= 1
+		return self._response(messages)
+
+class GenerateStoriesTest(unittest.TestCase):
+	"""
+	generate_stories debe dar las mismas historias que generate_story, en el orden de los cuentos,
+	con como mucho `concurrency` peticiones en vuelo.
+	"""
+
+	def setUp(self):
+		self.examples = load_generation_examples()
+		folktale = self.examples[0][0]
+		self.folktales = [folktale.model_copy(update={"title": f"Folktale {i}"}) for i in range(8)]
+
+	def test_matches_sequential_generation(self):
+		model = TitleEchoModel()
+		stories = asyncio.run(generate_stories(self.folktales, self.examples, concurrency=3, model=model))
+
+		expected = [generate_story(folktale, self.examples, model=model) for folktale in self.folktales]
+		self.assertEqual(stories, expected)
+		self.assertEqual(stories[0], "Folktale 0\nStory of Folktale 0.")
+
+	def test_concurrency_limit(self):
+		model = TitleEchoModel(latency=0.05)
+		asyncio.run(generate_stories(self.folktales, self.examples, concurrency=3, model=model))
+		self.assertEqual(model.peak_in_flight, 3)
+
+	def test_retries(self):
+		model = TitleEchoModel(failures=2)
+		stories = asyncio.run(generate_stories(self.folktales[:1], self.examples, model=model, max_retries=2, backoff=0.0))
+		self.assertEqual(stories, ["Folktale 0\nStory of Folktale 0."])
+
+		model = TitleEchoModel(failures=3)
+		stories = asyncio.run(generate_stories(self.folktales[:1], self.examples, model=model, max_retries=2, backoff=0.0))
+		self.assertEqual(stories, [None])
+
+	def test_cache(self):
+		with tempfile.TemporaryDirectory() as cache_dir:
+			cache = StoryCache(cache_dir)
+			model = TitleEchoModel()
+			first = asyncio.run(generate_stories(self.folktales, self.examples, model=model, cache=cache))
+			calls = model.calls
+			second = asyncio.run(generate_stories(self.folktales, self.examples, model=model, cache=cache))
+
+			self.assertEqual(first, second)
+			self.assertEqual(model.calls, calls)
+
+class StoryStreamTest(unittest.TestCase):
+	"""
+	La historia en streaming debe coincidir con la de generate_story y escribirse entera en el fichero.
+	"""
+
+	def test_matches_generate_story(self):
+		examples = load_generation_examples()
+		folktale = examples[0][0]
+		content = "  Once upon a time, a hare boasted of its speed.\n\nThe tortoise won the race."
+
+		expected = generate_story(folktale, examples, model=FakeListChatModel(responses=[content]))
+
+		model_chunks = [chunk for chunk in GenericFakeChatModel(messages=iter([AIMessage(content)])).stream("") if chunk.content]
+
+		file = io.StringIO()
+		stream = StoryStream(folktale, examples, model=GenericFakeChatModel(messages=iter([AIMessage(content)])), file=file)
+		chunks = list(stream)
+
+		self.assertGreater(len(chunks), 1)
+		self.assertEqual(stream.story, expected)
+		self.assertEqual(file.getvalue(), expected)
+		# Sin uso de tokens informado, cada fragmento no vacío del modelo cuenta como un token
+		self.assertEqual(stream.metrics.tokens, len(model_chunks))
+		self.assertIsNotNone(stream.metrics.ttft)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,59 @@
+from generation.adaptation.top_n import TopN
+from queue import PriorityQueue
+import random
+import unittest
+
+class TopNTest(unittest.TestCase):
+	"""
+	TopN debe conservar las mismas entradas que la PriorityQueue acotada que sustituye en
+	ItemContainer: se inserta cada entrada y se descarta la menor si hay más de n.
+	"""
+
+	def _priority_queue_top(self, entries: list[tuple[float, str]], n: int):
+		queue: PriorityQueue[tuple[float, str]] = PriorityQueue()
+		for entry in entries:
+			queue.put(entry)
+			if queue.qsize() > n:
+				queue.get()
+		return sorted(queue.queue)
+
+	def test_matches_priority_queue(self):
+		rng = random.Random(0)
+		for _ in range(200):
+			n = rng.randint(1, 5)
+			# Pocos scores y URIs distintos para forzar empates y entradas repetidas
+			entries = [(rng.choice([0.0, 0.25, 0.5, 1.0]), f"uri_{rng.randint(0, 6)}") for _ in range(rng.randint(0, 20))]
+
+			top = TopN(n)
+			for entry in entries:
+				top.push(entry)
+
+			self.assertEqual(top.ascending(), self._priority_queue_top(entries, n))
+
+	def test_descending_order(self):
+		top = TopN(3)
+		for entry in [(0.5, "b"), (1.0, "c"), (0.5, "a"), (0.1, "d")]:
+			top.push(entry)
+		# Score descendente y, a igual score, URI ascendente
+		self.assertEqual(top.descending(), [(1.0, "c"), (0.5, "a"), (0.5, "b")])
+
+	def test_heap(self):
+		rng = random.Random(1)
+		top = TopN(8)
+		for _ in range(500):
+			top.push((rng.choice([0.0, 0.25, 0.5, 1.0]), f"uri_{rng.randint(0, 30)}"))
+			entries = top.entries
+			self.assertLessEqual(len(entries), 8)
+			# La peor entrada está en la raíz y cada nodo es menor o igual que sus hijos
+			self.assertEqual(entries[0], min(entries))
+			for i in range(1, len(entries)):
+				self.assertLessEqual(entries[(i - 1) // 2], entries[i])
+
+	def test_empty(self):
+		top = TopN(0)
+		top.push((1.0, "a"))
+		self.assertEqual(len(top), 0)
+		self.assertEqual(top.descending(), [])
+
+if __name__ == "__main__":
+	unittest.main()